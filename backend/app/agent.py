@@ -1,8 +1,15 @@
 import json
 import os
+import logging
+import threading
 import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from pydantic import BaseModel, Field
+from .llm import generate, generate_stream, get_client
+from .metrics import timed, CLASSIFIER_LATENCY
+from .logs import sampled
+
+logger = logging.getLogger(__name__)
 
 class Email:
     def __init__(self, subject: str, sender: str, received_time: str, body_preview: str, body: str = None):
@@ -33,41 +40,14 @@ class EmailAnalysis(BaseModel):
 class MailAgent:
     def __init__(self, prompt_path: str = "prompt.txt"):
         self.prompt_path = prompt_path
-        from google import genai
-        
-        # Configure Gemini Client
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            print("WARNING: GEMINI_API_KEY not found in env")
-            self.client = None
-        else:
-            self.client = genai.Client(api_key=api_key)
-            
         self.model_name = "gemini-2.5-flash"
-
-        # Load Local Spam Model
-        import joblib
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        models_dir = os.path.join(current_dir, "models")
-        
-        try:
-            self.spam_classifier = joblib.load(os.path.join(models_dir, "spam_classifier.pkl"))
-            self.vectorizer = joblib.load(os.path.join(models_dir, "tfidf_vectorizer.pkl"))
-            print("✅ Local Spam Filter Loaded")
-        except Exception as e:
-            print(f"⚠️ Could not load local spam model: {e}")
-            self.spam_classifier = None
-            self.vectorizer = None
-
-        # Load Intent Classifier (Multi-Label)
-        try:
-            self.intent_pipeline = joblib.load(os.path.join(models_dir, "intent_pipeline.pkl"))
-            self.intent_mlb = joblib.load(os.path.join(models_dir, "intent_mlb.pkl"))
-            print("✅ Intent Classifier Loaded")
-        except Exception as e:
-             print(f"⚠️ Could not load intent model: {e}")
-             self.intent_pipeline = None
-             self.intent_mlb = None
+        # Local models are loaded on first use (or by warm_up); see load_models
+        self.spam_classifier = None
+        self.vectorizer = None
+        self.intent_pipeline = None
+        self.intent_mlb = None
+        self._models_loaded = False
+        self._models_lock = threading.Lock()
 
         self.system_prompt = """
 
@@ -86,62 +66,156 @@ class MailAgent:
         10. **tone**: "Formal", "Casual", "Urgent", "Friendly".
         """
 
-    def analyze_email(self, email: Email) -> Dict[str, Any]:
+    @property
+    def client(self):
+        return get_client()
+
+    def load_models(self):
         """
-        Analyzes the email using Hybrid Approach: Local Model -> Real Gemini API.
+        Loads the scikit-learn spam and intent models once. Importing joblib/scikit-learn is most
+        of the app's import cost, so this happens on the first analysis rather than at startup.
         """
-        # 1. Local Guard Layer
-        if self.spam_classifier and self.vectorizer:
+        if self._models_loaded:
+            return
+        with self._models_lock:
+            if self._models_loaded:
+                return
+            import joblib
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            models_dir = os.path.join(current_dir, "models")
+
+            # Load Local Spam Model
             try:
-                email_text = f"{email.subject} {email.body or email.body_preview}"
-                vec = self.vectorizer.transform([email_text])
-                prediction = self.spam_classifier.predict(vec)[0]
-                proba = self.spam_classifier.predict_proba(vec)[0]
-                spam_conf = proba[1]
-                
-                print(f"🔍 Local Filter Analysis: {'Spam' if prediction==1 else 'Ham'} (Prob: {spam_conf:.2f})")
-
-                # If highly confident it's spam (>80%), block it locally
-                if prediction == 1 and spam_conf > 0.8:
-                    return {
-                        "intent": "Spam",
-                        "urgency_score": 1,
-                        "risk_level": "High",
-                        "priority": "P4",
-                        "requires_action": False,
-                        "suggested_actions": ["Delete", "Block Sender"],
-                        "summary": "Flagged as high-confidence spam by local AI.",
-                        "suggested_reply": None,
-                        "sentiment": "Negative",
-                        "tone": "Urgent"
-                    }
+                self.spam_classifier = joblib.load(os.path.join(models_dir, "spam_classifier.pkl"))
+                self.vectorizer = joblib.load(os.path.join(models_dir, "tfidf_vectorizer.pkl"))
+                logger.info("✅ Local Spam Filter Loaded")
             except Exception as e:
-                print(f"⚠️ Local classification failed: {e}")
+                logger.warning("⚠️ Could not load local spam model: %s", e)
+
+            # Load Intent Classifier (Multi-Label)
+            try:
+                self.intent_pipeline = joblib.load(os.path.join(models_dir, "intent_pipeline.pkl"))
+                self.intent_mlb = joblib.load(os.path.join(models_dir, "intent_mlb.pkl"))
+                logger.info("✅ Intent Classifier Loaded")
+            except Exception as e:
+                logger.warning("⚠️ Could not load intent model: %s", e)
+            self._models_loaded = True
+
+    def warm_up(self):
+        """
+        Loads everything lazy up front: local models and the Gemini client.
+        """
+        self.load_models()
+        get_client()
+
+    def analyze_email(self, email: Email, thread_summary: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analyzes the email using Hybrid Approach: Local Model -> Real Gemini API.
+        If thread_summary is given (rolling summary of earlier messages in the same thread),
+        the result also carries an updated 'thread_summary' folded forward with this email.
+        """
+        is_spam, detected_intents = self.classify_batch([email])[0]
+        if is_spam:
+            return self.spam_result()
+        return self.analyze_with_llm(email, detected_intents, thread_summary)
+
+    def spam_result(self) -> Dict[str, Any]:
+        return {
+            "intent": "Spam",
+            "urgency_score": 1,
+            "risk_level": "High",
+            "priority": "P4",
+            "requires_action": False,
+            "suggested_actions": ["Delete", "Block Sender"],
+            "summary": "Flagged as high-confidence spam by local AI.",
+            "suggested_reply": None,
+            "sentiment": "Negative",
+            "tone": "Urgent"
+        }
+
+    def classify_batch(self, emails: List[Email]) -> List[Tuple[bool, List[str]]]:
+        """
+        Local layers for several emails in one vectorizer/model pass each.
+        Returns (blocked as spam, detected intents) per email; intents are only predicted for
+        emails that weren't blocked.
+        """
+        return [(score["blocked"], score["intents"]) for score in self.score_batch(emails)]
 
+    def score_batch(self, emails: List[Email], intents_for_blocked: bool = False) -> List[Dict[str, Any]]:
+        """
+        Local labels with confidences, one dict per email:
+            spam, spam_confidence   spam model verdict and P(spam) (None without the model)
+            blocked                 confident enough (>80%) to skip Gemini
+            intents                 detected intent labels
+            intent_confidences      P(label) for the detected labels
+        Each model runs once over the whole batch, and only predict_proba: the labels are derived
+        from it the way predict would (argmax for the spam model, > 0.5 per label for the
+        one-vs-rest intent model).
+        """
+        self.load_models()
+        texts = [f"{email.subject} {email.body or email.body_preview}" for email in emails]
+        scores = [{"spam": False, "spam_confidence": None, "blocked": False, "intents": [], "intent_confidences": {}}
+                  for _ in emails]
+
+        # 1. Local Guard Layer
+        if self.spam_classifier and self.vectorizer and texts:
+            try:
+                with timed(CLASSIFIER_LATENCY, stage="classifier", model="spam"):
+                    vec = self.vectorizer.transform(texts)
+                    probas = self.spam_classifier.predict_proba(vec)
+                classes = self.spam_classifier.classes_
+                for score, proba in zip(scores, probas):
+                    prediction = classes[proba.argmax()]
+                    spam_conf = float(proba[1])
+                    logger.debug("🔍 Local Filter Analysis: %s (Prob: %.2f)", "Spam" if prediction == 1 else "Ham", spam_conf, extra=sampled())
+                    score["spam"] = bool(prediction == 1)
+                    score["spam_confidence"] = round(spam_conf, 4)
+                    # If highly confident it's spam (>80%), block it locally
+                    score["blocked"] = bool(prediction == 1 and spam_conf > 0.8)
             except Exception as e:
-                print(f"⚠️ Local classification failed: {e}")
+                logger.warning("⚠️ Local classification failed: %s", e)
 
         # 2. Intent Recognition Layer (If not Spam)
-        detected_intents = []
-        if self.intent_pipeline and self.intent_mlb:
-             try:
-                email_text = f"{email.subject} {email.body or email.body_preview}"
+        remaining = [i for i, score in enumerate(scores) if intents_for_blocked or not score["blocked"]]
+        if self.intent_pipeline and self.intent_mlb and remaining:
+            try:
+                batch = [texts[i] for i in remaining]
+                labels = self.intent_mlb.classes_
                 # Pipeline handles vectorization internally
-                pred_matrix = self.intent_pipeline.predict([email_text])
-                detected_labels = self.intent_mlb.inverse_transform(pred_matrix)
-                
-                if detected_labels and detected_labels[0]:
-                    detected_intents = list(detected_labels[0])
-                    print(f"🏷️ Detected Intents: {detected_intents}")
-             except Exception as e:
-                 print(f"⚠️ Intent classification failed: {e}")
+                with timed(CLASSIFIER_LATENCY, stage="classifier", model="intent"):
+                    if hasattr(self.intent_pipeline, "predict_proba"):
+                        matrix = self.intent_pipeline.predict_proba(batch)
+                    else:
+                        matrix = self.intent_pipeline.predict(batch)
+                for i, row in zip(remaining, matrix):
+                    detected = {label: round(float(p), 4) for label, p in zip(labels, row) if p > 0.5}
+                    if detected:
+                        scores[i]["intents"] = list(detected)
+                        scores[i]["intent_confidences"] = detected
+                        logger.debug("🏷️ Detected Intents: %s", scores[i]["intents"], extra=sampled())
+            except Exception as e:
+                logger.warning("⚠️ Intent classification failed: %s", e)
 
+        return scores
+
+    def analyze_with_llm(self, email: Email, detected_intents: List[str], thread_summary: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Gemini layer for an email the local layers didn't block (see classify_batch).
+        """
         # 3. Gemini Smart Layer (Fallback/Deep Analysis)
         intent_context = ""
         if detected_intents:
             intent_context = f"\n\n🤖 PRE-ANALYSIS INSIGHT: This email likely belongs to categories: {', '.join(detected_intents)}. Use this to guide your 'intent' and 'urgency' fields."
 
-        prompt = f"{self.system_prompt}{intent_context}\n\n📌 INPUT EMAIL\n\n{email.to_string()}\n\n📌 OUTPUT JSON"
+        thread_context = ""
+        if thread_summary:
+            thread_context = (
+                f"\n\n🧵 THREAD SO FAR (summary of earlier messages in this conversation): {thread_summary}"
+                "\nAlso return **thread_summary**: the thread summary updated with this email, MAX 40 WORDS."
+            )
+
+        # The static system prompt is served from the prompt cache; only this part varies per email
+        contents = f"{intent_context}{thread_context}\n\n📌 INPUT EMAIL\n\n{email.to_string()}\n\n📌 OUTPUT JSON".lstrip()
         
         import time
         retries = 3
@@ -152,23 +226,22 @@ class MailAgent:
                 if not self.client:
                      return self._mock_llm_response(email)
                     
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt,
-                    config={'response_mime_type': 'application/json'}
+                response = generate(
+                    self.client, self.model_name, self.system_prompt, contents,
+                    config={'response_mime_type': 'application/json'}, agent="mail"
                 )
                 return self._validate_and_parse(response.text)
             except Exception as e:
                  error_str = str(e)
                  if "429" in error_str or "quota" in error_str.lower():
-                     print(f"⚠️ Gemini Quota Handler: Hit 429. Waiting {delay}s (Attempt {attempt+1}/{retries})...")
+                     logger.warning("⚠️ Gemini Quota Handler: Hit 429. Waiting %ss (Attempt %d/%d)...", delay, attempt + 1, retries)
                      time.sleep(delay)
                      delay *= 2 # 10s, 20s, 40s
                  else:
-                     print(f"Gemini Error: {e}")
+                     logger.error("Gemini Error: %s", e)
                      return self._mock_llm_response(email)
         
-        print("❌ Gemini Quota Retries Exhausted.")
+        logger.error("❌ Gemini Quota Retries Exhausted.")
         return self._mock_llm_response(email)
 
     def _validate_and_parse(self, response_text: str) -> Dict[str, Any]:
@@ -177,7 +250,7 @@ class MailAgent:
             cleaned = response_text.replace("```json", "").replace("```", "").strip()
             return json.loads(cleaned)
         except json.JSONDecodeError:
-            print(f"Failed to parse JSON: {response_text}")
+            logger.warning("Failed to parse JSON: %s", response_text)
             return self._mock_llm_response(None)
 
     def _mock_llm_response(self, email: Optional[Email]) -> Dict[str, Any]:
@@ -194,58 +267,100 @@ class MailAgent:
             "tone": "Neutral"
         }
 
-    def rewrite_email(self, text: str, style: str) -> str:
-        """
-        Rewrites the given email text based on the requested style.
-        Possible styles: 'formal', 'casual', 'shorten', 'fix_grammar'.
-        """
-        prompt = f"""
-        You are an elite AI Editor. Rewrite the following email draft.
-        
-        GOAL: Make it {style}.
+    REWRITE_SYSTEM_PROMPT = """
+        You are an elite AI Editor. Rewrite the email draft you are given in the requested style.
         
         RULES:
         - Keep the core meaning.
         - Return ONLY the rewritten text. No "Here is the rewritten email:" prefix.
         - If 'fix_grammar', just correct errors.
         - If 'shorten', concise it significantly.
+        """
+
+    def _rewrite_prompt(self, text: str, style: str) -> str:
+        return f"""
+        GOAL: Make it {style}.
 
         DRAFT:
         {text}
         
         REWRITTEN:
         """
+
+    def _rewrite_fallback(self, text: str, style: str) -> str:
+        # Fallback mock for demonstration when API is down
+        if style == "formal":
+            return f"Subject: Regarding your recent inquiry\n\nDear recipient,\n\n{text}\n\nSincerely,\n[Your Name]"
+        elif style == "shorten":
+            return f"(TL;DR Version): {text[:50]}..."
+        elif style == "casual":
+            return f"Hey!\n\n{text}\n\nCheers!"
+        else:
+            return f"[Fixed Grammar]: {text}"
+
+    def rewrite_email(self, text: str, style: str) -> str:
+        """
+        Rewrites the given email text based on the requested style.
+        Possible styles: 'formal', 'casual', 'shorten', 'fix_grammar'.
+        """
+        prompt = self._rewrite_prompt(text, style)
         
         try:
              # Use a simple generation config for plain text
             if not self.client:
                 raise Exception("Client not initialized")
                 
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config={"response_mime_type": "text/plain"}
+            response = generate(
+                self.client, self.model_name, self.REWRITE_SYSTEM_PROMPT, prompt,
+                config={"response_mime_type": "text/plain"}, agent="rewrite"
             )
             return response.text.strip()
         except Exception as e:
             error_msg = str(e)
             if "429" in error_msg or "quota" in error_msg.lower():
-                print(f"Gemini Quota Exceeded. Using Mock Fallback.")
-                # Fallback mock for demonstration when API is down
-                if style == "formal":
-                    return f"Subject: Regarding your recent inquiry\n\nDear recipient,\n\n{text}\n\nSincerely,\n[Your Name]"
-                elif style == "shorten":
-                    return f"(TL;DR Version): {text[:50]}..."
-                elif style == "casual":
-                    return f"Hey!\n\n{text}\n\nCheers!"
-                else:
-                    return f"[Fixed Grammar]: {text}"
+                logger.warning("Gemini Quota Exceeded. Using Mock Fallback.")
+                return self._rewrite_fallback(text, style)
             
-            print(f"Gemini Rewrite Error: {e}")
+            logger.error("Gemini Rewrite Error: %s", e)
             return f"[Error generating rewrite: {str(e)}]"
 
-            print(f"Gemini Rewrite Error: {e}")
-            return f"[Error generating rewrite: {str(e)}]"
+    def rewrite_email_stream(self, text: str, style: str) -> Iterator[str]:
+        """
+        Streaming variant of rewrite_email. Yields text chunks as Gemini produces them.
+        Falls back to the same mock/error text as rewrite_email, emitted as a single chunk.
+        """
+        prompt = self._rewrite_prompt(text, style)
+        emitted = False
+        
+        try:
+            if not self.client:
+                raise Exception("Client not initialized")
+                
+            stream = generate_stream(
+                self.client, self.model_name, self.REWRITE_SYSTEM_PROMPT, prompt,
+                config={"response_mime_type": "text/plain"}, agent="rewrite"
+            )
+            for chunk in stream:
+                if chunk.text:
+                    # Drop leading whitespace so the joined result matches rewrite_email's strip()
+                    piece = chunk.text if emitted else chunk.text.lstrip()
+                    if piece:
+                        emitted = True
+                        yield piece
+        except Exception as e:
+            if emitted:
+                # Mid-stream failure: keep what the user already has, flag the truncation
+                logger.error("Gemini Rewrite Stream Error: %s", e)
+                yield "\n[Rewrite interrupted]"
+                return
+            error_msg = str(e)
+            if "429" in error_msg or "quota" in error_msg.lower():
+                logger.warning("Gemini Quota Exceeded. Using Mock Fallback.")
+                yield self._rewrite_fallback(text, style)
+                return
+            
+            logger.error("Gemini Rewrite Error: %s", e)
+            yield f"[Error generating rewrite: {str(e)}]"
 
     def _validate_and_parse(self, json_str: str) -> Dict[str, Any]:
         try:
@@ -264,8 +379,8 @@ class MailAgent:
             if "suggested_reply" not in data: data["suggested_reply"] = None
             return data
         except json.JSONDecodeError as e:
-            print(f"JSON Parse Error: {e}")
-            print(f"Raw Output: {json_str}")
+            logger.warning("JSON Parse Error: %s", e)
+            logger.debug("Raw Output: %s", json_str)
             return {"error": "Failed to parse JSON"}
         except ValueError as e:
             return {"error": str(e)}
@@ -0,0 +1,153 @@
+import time
+import logging
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+import jwt
+from sqlmodel import Session
+from .database import get_safe_env, env_int
+from .models import User, GoogleCredential
+
+logger = logging.getLogger(__name__)
+
+# JWT Configuration
+SECRET_KEY = get_safe_env("SECRET_KEY", "secret")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_DAYS = 7
+
+# Per-process auth caches. Decoded tokens map to a user id; user rows are cached separately so a
+# profile update invalidates every token of that user at once.
+AUTH_CACHE_TTL = env_int("AUTH_CACHE_TTL", 300)
+AUTH_CACHE_MAX_TOKENS = 10000
+
+_fernet = None
+
+def get_fernet():
+    """
+    Built on first use (login / Gmail calls), which also defers importing cryptography.
+    """
+    global _fernet
+    if _fernet is None:
+        from cryptography.fernet import Fernet
+        key = get_safe_env("TOKEN_ENCRYPTION_KEY")
+        if not key:
+            logger.warning("⚠️ TOKEN_ENCRYPTION_KEY not set; deriving the Google token encryption key from SECRET_KEY")
+            key = base64.urlsafe_b64encode(hashlib.sha256(f"google-token:{SECRET_KEY}".encode()).digest())
+        _fernet = Fernet(key)
+    return _fernet
+
+def create_access_token(user_id: int) -> str:
+    expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
+    return jwt.encode({"sub": str(user_id), "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+
+_token_cache: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+_user_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+_cache_lock = threading.Lock()
+
+def user_claims(user: User) -> Dict[str, Any]:
+    """
+    The user_data dict handed to endpoints (same keys the old fat JWT carried, plus 'id').
+    """
+    return {"sub": str(user.id), "id": user.id, "email": user.email, "name": user.name, "picture": user.avatar_url}
+
+def get_user_data(session: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _user_cache.get(user_id)
+        if cached and now - cached[0] < AUTH_CACHE_TTL:
+            return cached[1]
+    user = session.get(User, user_id)
+    if not user:
+        return None
+    data = user_claims(user)
+    with _cache_lock:
+        _user_cache[user_id] = (now, data)
+    return data
+
+def invalidate_user(user_id: int):
+    with _cache_lock:
+        _user_cache.pop(user_id, None)
+
+def resolve_token(session: Session, token: str) -> Optional[Dict[str, Any]]:
+    """
+    Bearer token -> user_data, or None if the token is invalid or the user is gone.
+    Cache hits cost two dict lookups; misses decode the JWT and may load the user.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _token_cache.get(token)
+        if hit and hit[0] > now:
+            _token_cache.move_to_end(token)
+            user_id = hit[1]
+        else:
+            hit = None
+            _token_cache.pop(token, None)
+
+    if hit is None:
+        claims = verify_token(token)
+        if not claims:
+            return None
+        try:
+            user_id = int(claims["sub"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        # Tokens issued before Google tokens moved server-side still embed them: adopt once
+        if isinstance(claims.get("google_token"), dict) and session.get(GoogleCredential, user_id) is None:
+            store_google_token(session, user_id, claims["google_token"])
+
+        # Never cache past the token's own expiry
+        ttl = min(AUTH_CACHE_TTL, claims.get("exp", 0) - time.time()) if "exp" in claims else AUTH_CACHE_TTL
+        with _cache_lock:
+            _token_cache[token] = (now + ttl, user_id)
+            while len(_token_cache) > AUTH_CACHE_MAX_TOKENS:
+                _token_cache.popitem(last=False)
+
+    return get_user_data(session, user_id)
+
+def store_google_token(session: Session, user_id: int, token: Dict[str, Any]):
+    """
+    Upserts the user's Google tokens. A response without a refresh_token keeps the stored one.
+    """
+    cred = session.get(GoogleCredential, user_id) or GoogleCredential(user_id=user_id)
+    if token.get("access_token"):
+        cred.access_token = token["access_token"]
+        expires_at = token.get("expires_at")
+        cred.access_token_expires_at = datetime.utcfromtimestamp(expires_at) if expires_at else None
+    if token.get("refresh_token"):
+        cred.refresh_token_encrypted = get_fernet().encrypt(token["refresh_token"].encode()).decode()
+    if token.get("scope"):
+        cred.scope = token["scope"]
+    cred.updated_at = datetime.utcnow()
+    session.add(cred)
+    session.commit()
+
+def load_google_token(session: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Stored tokens in the shape GmailService expects, or None if the user never granted access.
+    """
+    cred = session.get(GoogleCredential, user_id)
+    if not cred or not cred.access_token:
+        return None
+
+    refresh_token = None
+    if cred.refresh_token_encrypted:
+        from cryptography.fernet import InvalidToken
+        try:
+            refresh_token = get_fernet().decrypt(cred.refresh_token_encrypted.encode()).decode()
+        except InvalidToken:
+            logger.warning("⚠️ Stored refresh token for user %s could not be decrypted (key changed?)", user_id)
+
+    token = {"access_token": cred.access_token, "refresh_token": refresh_token}
+    if cred.access_token_expires_at:
+        token["expires_at"] = (cred.access_token_expires_at - datetime(1970, 1, 1)).total_seconds()
+    return token
@@ -0,0 +1,167 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
+from .agent import MailAgent, Email
+from .database import env_int
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# Bulk analysis of an NDJSON stream (POST /api/analyze/bulk).
+#
+# Input lines are read as they arrive and grouped into batches; each batch goes through the local
+# classifiers in one pass, then the emails that still need Gemini are submitted to a process-wide
+# pool, so concurrent Gemini calls per worker stay bounded however many bulk requests are open.
+# Results are written in input order, one line each:
+#     {"index": 0, "result": {...}}          analysis (same shape as /api/analyze)
+#     {"index": 1, "error": "..."}            unparseable or invalid line
+#     {"progress": {"received": ..., "done": ..., "elapsed_s": ...}}   every BULK_PROGRESS_EVERY results
+#     {"summary": {"received": ..., "done": ..., "spam": ..., "llm": ..., "errors": ..., "elapsed_s": ...}}
+# The number of results in flight is capped (BULK_WINDOW), so a slow Gemini backs pressure up
+# into reading the request body instead of buffering it.
+BULK_BATCH_SIZE = env_int("BULK_BATCH_SIZE", 64) # Emails per local classifier pass
+BULK_LLM_CONCURRENCY = env_int("BULK_LLM_CONCURRENCY", 4) # Gemini calls in flight per worker
+BULK_WINDOW = env_int("BULK_WINDOW", 256) # Results in flight per request
+BULK_MAX_EMAILS = env_int("BULK_MAX_EMAILS", 100_000)
+BULK_MAX_LINE_BYTES = env_int("BULK_MAX_LINE_BYTES", 1_000_000)
+BULK_PROGRESS_EVERY = env_int("BULK_PROGRESS_EVERY", 100)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, BULK_LLM_CONCURRENCY), thread_name_prefix="bulk-llm")
+    return _executor
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Splits a streamed body into lines without waiting for the whole body.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" not in buffer:
+            if len(buffer) > BULK_MAX_LINE_BYTES:
+                raise ValueError(f"Line exceeds {BULK_MAX_LINE_BYTES} bytes")
+            continue
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+def parse_line(line: bytes, schema: Type[BaseModel]) -> Tuple[Optional[Email], Optional[str]]:
+    try:
+        request = schema.model_validate_json(line)
+    except ValidationError as e:
+        errors = e.errors()
+        detail = "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}" for err in errors[:3])
+        return None, detail or "Invalid email"
+    return Email(
+        subject=request.subject,
+        sender=request.sender,
+        received_time=request.received_time,
+        body_preview=request.body_preview,
+        body=request.body,
+    ), None
+
+def _line(payload: Dict[str, Any]) -> bytes:
+    return dumps(payload) + b"\n"
+
+async def analyze_ndjson(agent: MailAgent, chunks: AsyncIterator[bytes], schema: Type[BaseModel]) -> AsyncIterator[bytes]:
+    """
+    Yields NDJSON result lines for an NDJSON stream of emails (see module comment).
+    """
+    started = time.perf_counter()
+    executor = get_executor()
+    pending: Deque[Any] = deque() # Result dicts or futures, in input order
+    counts = {"received": 0, "done": 0, "spam": 0, "llm": 0, "errors": 0}
+    batch: List[Tuple[int, Optional[Email], Optional[str]]] = [] # Invalid lines wait here too, to keep order
+
+    def progress() -> bytes:
+        return _line({"progress": {"received": counts["received"], "done": counts["done"],
+                                   "elapsed_s": round(time.perf_counter() - started, 2)}})
+
+    async def classify(items: List[Tuple[int, Optional[Email], Optional[str]]]):
+        emails = [email for _, email, _ in items if email is not None]
+        verdicts = iter(await run_in_threadpool(agent.classify_batch, emails) if emails else [])
+        for index, email, error in items:
+            if email is None:
+                pending.append({"index": index, "error": error})
+                continue
+            is_spam, intents = next(verdicts)
+            if is_spam:
+                counts["spam"] += 1
+                pending.append({"index": index, "result": agent.spam_result()})
+            else:
+                counts["llm"] += 1
+                # Each call gets its own copy of the request context (metrics stages)
+                future = executor.submit(contextvars.copy_context().run, agent.analyze_with_llm, email, intents)
+                pending.append((index, future))
+
+    async def pop() -> bytes:
+        item = pending.popleft()
+        if isinstance(item, tuple):
+            index, future = item
+            try:
+                item = {"index": index, "result": await asyncio.wrap_future(future)}
+            except Exception as e:
+                logger.warning("Bulk analysis failed for line %d: %s", index, e)
+                counts["errors"] += 1
+                item = {"index": index, "error": str(e)}
+        counts["done"] += 1
+        if BULK_PROGRESS_EVERY > 0 and counts["done"] % BULK_PROGRESS_EVERY == 0:
+            return _line(item) + progress()
+        return _line(item)
+
+    def head_ready() -> bool:
+        head = pending[0]
+        return not isinstance(head, tuple) or head[1].done()
+
+    try:
+        try:
+            async for line in read_lines(chunks):
+                if not line.strip():
+                    continue
+                index = counts["received"]
+                if index >= BULK_MAX_EMAILS:
+                    counts["errors"] += 1
+                    batch.append((index, None, f"Too many emails (max {BULK_MAX_EMAILS}); the rest of the stream was ignored"))
+                    break
+                counts["received"] += 1
+                email, error = parse_line(line, schema)
+                if error:
+                    counts["errors"] += 1
+                batch.append((index, email, error))
+                if len(batch) >= BULK_BATCH_SIZE:
+                    await classify(batch)
+                    batch = []
+                    # Write what's finished; wait only when the window is full
+                    while pending and head_ready():
+                        yield await pop()
+                    while len(pending) > BULK_WINDOW:
+                        yield await pop()
+        except ValueError as e: # Oversized line: finish what was read, report and stop
+            counts["errors"] += 1
+            batch.append((counts["received"], None, str(e)))
+        if batch:
+            await classify(batch)
+        while pending:
+            yield await pop()
+        yield _line({"summary": {**counts, "elapsed_s": round(time.perf_counter() - started, 2)}})
+    finally:
+        # Client went away (or the body was bad): don't spend Gemini quota on unread results
+        for item in pending:
+            if isinstance(item, tuple):
+                item[1].cancel()
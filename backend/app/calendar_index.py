@@ -0,0 +1,162 @@
+import bisect
+import threading
+import time
+import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlmodel import Session, select
+from .meeting_models import Meeting
+from .recurrence import Series, load_series
+from .events import publish
+from .versions import bump_version
+
+# Per-process cache lifetime. Writes in this process invalidate immediately; the TTL bounds
+# how long a write made by another worker can go unseen.
+INDEX_TTL = 30
+# The cached index holds meetings overlapping [now - LOOKBACK, now + HORIZON); windows outside
+# it (old history, far future) are answered by a direct range query instead
+INDEX_LOOKBACK_DAYS = 1
+INDEX_HORIZON_DAYS = 366
+MAX_MEETING_WINDOW_DAYS = 366 # Longest window a calendar query or slot search may span
+MAX_FREE_SLOTS = 50
+SLOT_ALIGN_MINUTES = 15
+WORKDAY_START_HOUR = 9
+WORKDAY_END_HOUR = 18
+
+class Interval(NamedTuple):
+    start: datetime.datetime
+    end: datetime.datetime
+    meeting_id: Optional[int]
+    title: str
+
+class IntervalIndex:
+    """
+    Scheduled meetings of one user sorted by start time. Overlap queries bisect on start
+    and only scan meetings that begin within max_duration before the window.
+    Recurring series are kept as rules and expanded only inside the queried window.
+    Single meetings are only complete inside [window_start, window_end), when given.
+    """
+    def __init__(self, intervals: List[Interval], series: List[Series] = (),
+                 window_start: Optional[datetime.datetime] = None, window_end: Optional[datetime.datetime] = None):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.items = sorted(intervals, key=lambda i: (i.start, i.end))
+        self.starts = [i.start for i in self.items]
+        self.max_duration = max((i.end - i.start for i in self.items), default=datetime.timedelta(0))
+        self.series = list(series)
+
+    def covers(self, start: datetime.datetime, end: datetime.datetime) -> bool:
+        return ((self.window_start is None or start >= self.window_start)
+                and (self.window_end is None or end <= self.window_end))
+
+    def overlapping(self, start: datetime.datetime, end: datetime.datetime) -> List[Interval]:
+        # Overlap if: (StartA < EndB) and (EndA > StartB)
+        lo = bisect.bisect_left(self.starts, start - self.max_duration)
+        hi = bisect.bisect_left(self.starts, end)
+        found = [i for i in self.items[lo:hi] if i.end > start]
+        if self.series:
+            for s in self.series:
+                found.extend(Interval(o.start, o.end, o.meeting_id, o.title) for o in s.overlapping(start, end))
+            found.sort(key=lambda i: (i.start, i.end))
+        return found
+
+    def busy(self, start: datetime.datetime, end: datetime.datetime) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Merged busy periods clipped to [start, end).
+        """
+        merged = []
+        for i in self.overlapping(start, end):
+            s, e = max(i.start, start), min(i.end, end)
+            if merged and s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        return merged
+
+def _align(dt: datetime.datetime) -> datetime.datetime:
+    dt = dt.replace(second=0, microsecond=0)
+    overflow = dt.minute % SLOT_ALIGN_MINUTES
+    return dt + datetime.timedelta(minutes=SLOT_ALIGN_MINUTES - overflow) if overflow else dt
+
+def _working_windows(start: datetime.datetime, end: datetime.datetime):
+    day = start.date()
+    while day <= end.date():
+        ws = max(start, datetime.datetime.combine(day, datetime.time(WORKDAY_START_HOUR)))
+        we = min(end, datetime.datetime.combine(day, datetime.time(WORKDAY_END_HOUR)))
+        if ws < we:
+            yield ws, we
+        day += datetime.timedelta(days=1)
+
+def find_free_slots(index: IntervalIndex, start: datetime.datetime, end: datetime.datetime,
+                    duration: datetime.timedelta, count: int = 3, working_hours: bool = True) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    First `count` back-to-back free slots of `duration` between start and end,
+    aligned to SLOT_ALIGN_MINUTES and (optionally) restricted to working hours.
+    At most MAX_FREE_SLOTS, searched over at most MAX_MEETING_WINDOW_DAYS.
+    """
+    count = min(count, MAX_FREE_SLOTS)
+    end = min(end, start + datetime.timedelta(days=MAX_MEETING_WINDOW_DAYS))
+    slots = []
+    windows = _working_windows(start, end) if working_hours else [(start, end)]
+    # One overlap query for the whole range; each window then walks its part of the sorted list
+    busy = index.busy(start, end)
+    first = 0
+    for ws, we in windows:
+        while first < len(busy) and busy[first][1] <= ws:
+            first += 1
+        in_window = []
+        for busy_start, busy_end in busy[first:]:
+            if busy_start >= we:
+                break
+            in_window.append((max(busy_start, ws), min(busy_end, we)))
+        cursor = _align(ws)
+        for busy_start, busy_end in in_window + [(we, we)]:
+            while cursor + duration <= busy_start:
+                slots.append((cursor, cursor + duration))
+                if len(slots) >= count:
+                    return slots
+                cursor += duration
+            cursor = max(cursor, _align(busy_end))
+    return slots
+
+_cache: Dict[str, Tuple[float, IntervalIndex]] = {}
+_cache_lock = threading.Lock()
+
+def load_index(session: Session, user_email: str, start: datetime.datetime, end: datetime.datetime) -> IntervalIndex:
+    """
+    Index of the user's meetings overlapping [start, end), read through the
+    (user_email, status, start_time) index.
+    """
+    stmt = select(Meeting.start_time, Meeting.end_time, Meeting.id, Meeting.title).where(
+        Meeting.user_email == user_email, Meeting.status == "scheduled", Meeting.recurrence_rule == None,
+        Meeting.start_time < end, Meeting.end_time > start
+    )
+    intervals = [Interval(*row) for row in session.exec(stmt).all()]
+    return IntervalIndex(intervals, load_series(session, user_email), start, end)
+
+def get_index(session: Session, user_email: str, start: datetime.datetime, end: datetime.datetime) -> IntervalIndex:
+    """
+    Index for queries inside [start, end): the cached one around now when it covers the
+    window, otherwise an uncached index loaded for just that window.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(user_email)
+    if not (cached and now - cached[0] < INDEX_TTL):
+        today = datetime.datetime.now()
+        cached = (now, load_index(session, user_email, today - datetime.timedelta(days=INDEX_LOOKBACK_DAYS),
+                                  today + datetime.timedelta(days=INDEX_HORIZON_DAYS)))
+        with _cache_lock:
+            _cache[user_email] = cached
+    index = cached[1]
+    if not index.covers(start, end):
+        return load_index(session, user_email, start, end)
+    return index
+
+def invalidate(user_email: Optional[str]):
+    """
+    Called after every calendar write; also tells the user's open clients to refetch.
+    """
+    with _cache_lock:
+        _cache.pop(user_email, None)
+    bump_version("meetings", user_email)
+    publish(user_email, "meetings.changed")
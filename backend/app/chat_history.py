@@ -0,0 +1,337 @@
+import os
+import time
+import logging
+import datetime
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import and_, delete, or_
+from sqlmodel import Session, select
+from .models import ChatHistory, ChatSummary
+from .pagination import encode_cursor, before_cursor, clamp_limit
+from .events import job_event
+from .versions import bump_version, get_version
+from .metrics import llm_call
+from .llm import get_client
+
+logger = logging.getLogger(__name__)
+
+# Retention policy: turns older than CHAT_RETENTION_DAYS are folded into ChatSummary and deleted,
+# but the newest CHAT_RETENTION_KEEP turns are always kept verbatim.
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "30"))
+CHAT_RETENTION_KEEP = int(os.getenv("CHAT_RETENTION_KEEP", "200"))
+COMPACTION_BATCH = 500
+COMPACTION_INTERVAL = 3600 # Seconds between compaction attempts per user (per process)
+MAX_SUMMARY_CHARS = 1500
+
+# Conversation memory for prompts: the newest MEMORY_RECENT_TURNS turns verbatim plus the rolling
+# summary. Older turns are folded MEMORY_FOLD_BATCH at a time, so at most
+# MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH unfolded turns ever reach a prompt.
+MEMORY_RECENT_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "6"))
+MEMORY_FOLD_BATCH = 10
+# Cached memories are tagged with the "chat" data version they were loaded at and reloaded as
+# soon as it moves, so turns written by another worker are never missed; the TTL only bounds
+# how long an idle user's memory stays cached
+MEMORY_TTL = 300
+
+_last_compaction: Dict[str, float] = {}
+_last_compaction_lock = threading.Lock()
+
+def clear_history(session: Session, user_email: str):
+    """
+    Deletes all turns and the stored summary with two set-based DELETEs.
+    """
+    session.exec(delete(ChatHistory).where(ChatHistory.user_email == user_email))
+    session.exec(delete(ChatSummary).where(ChatSummary.user_email == user_email))
+    session.commit()
+    forget_memory(user_email)
+    bump_version("chat", user_email)
+
+def get_summary(session: Session, user_email: str) -> Optional[ChatSummary]:
+    return session.exec(select(ChatSummary).where(ChatSummary.user_email == user_email)).first()
+
+def get_history_page(session: Session, user_email: str, cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+    """
+    Newest page first; items inside a page are chronological for display.
+    next_cursor points at older turns. Raises ValueError on a malformed cursor.
+    """
+    limit = clamp_limit(limit)
+    stmt = select(ChatHistory).where(ChatHistory.user_email == user_email)
+    if cursor:
+        stmt = stmt.where(before_cursor(ChatHistory.timestamp, ChatHistory.id, cursor))
+    stmt = stmt.order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc()).limit(limit + 1)
+    rows = session.exec(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+    summary = get_summary(session, user_email)
+    return {
+        "items": list(reversed(rows)),
+        "next_cursor": next_cursor,
+        "summary": summary.summary if summary else None,
+    }
+
+def fold_turns(previous: Optional[str], turns: List[ChatHistory], client=None, model_name: str = "gemini-2.5-flash") -> str:
+    """
+    Folds chat turns into a running summary. Uses Gemini when a client is given, else a trimmed transcript.
+    """
+    transcript = "\n".join(f"{'User' if t.sender == 'user' else 'Assistant'}: {t.text}" for t in turns)
+    if client:
+        prompt = f"""
+        You maintain the long-term memory of a personal assistant chat.
+        Update the running summary with the new conversation turns.
+
+        RULES:
+        - MAX 150 WORDS.
+        - Keep facts, decisions, scheduled/cancelled meetings, names and user preferences. Drop small talk.
+        - No preamble.
+
+        CURRENT SUMMARY:
+        {previous or "(empty)"}
+
+        NEW TURNS:
+        {transcript}
+
+        UPDATED SUMMARY:
+        """
+        try:
+            with llm_call("chat_memory") as call:
+                response = client.models.generate_content(model=model_name, contents=prompt)
+                call.usage(response)
+            if response.text:
+                return response.text.strip()[:MAX_SUMMARY_CHARS]
+        except Exception as e:
+            logger.warning("⚠️ Chat summary generation failed: %s", e)
+
+    folded = f"{previous}\n{transcript}" if previous else transcript
+    if len(folded) > MAX_SUMMARY_CHARS:
+        folded = "…" + folded[-(MAX_SUMMARY_CHARS - 1):]
+    return folded
+
+def unfolded_clause(summary: Optional[ChatSummary]):
+    """
+    WHERE clause for turns after the summary's fold boundary in (timestamp, id) order; None when
+    nothing has been folded. Boundaries stored before the id was tracked compare timestamps only.
+    """
+    if summary is None or summary.compacted_through is None:
+        return None
+    ts, row_id = summary.compacted_through, summary.compacted_through_id
+    if row_id is None:
+        return ChatHistory.timestamp > ts
+    return or_(ChatHistory.timestamp > ts, and_(ChatHistory.timestamp == ts, ChatHistory.id > row_id))
+
+def is_folded(turn: ChatHistory, summary: ChatSummary) -> bool:
+    """
+    Python-side twin of unfolded_clause: True when the turn is already in the summary.
+    """
+    if summary.compacted_through is None:
+        return False
+    if summary.compacted_through_id is None:
+        return turn.timestamp <= summary.compacted_through
+    return (turn.timestamp, turn.id) <= (summary.compacted_through, summary.compacted_through_id)
+
+def compact_history(session: Session, user_email: str, client=None) -> int:
+    """
+    Applies the retention policy for one user. Returns the number of turns compacted.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=CHAT_RETENTION_DAYS)
+
+    # Timestamp of the oldest turn inside the always-kept window
+    keep_from = session.exec(
+        select(ChatHistory.timestamp)
+        .where(ChatHistory.user_email == user_email)
+        .order_by(ChatHistory.timestamp.desc())
+        .offset(CHAT_RETENTION_KEEP - 1)
+        .limit(1)
+    ).first()
+    if keep_from is None:
+        return 0 # Fewer turns than the keep window
+    cutoff = min(cutoff, keep_from)
+
+    turns = session.exec(
+        select(ChatHistory)
+        .where(ChatHistory.user_email == user_email, ChatHistory.timestamp < cutoff)
+        .order_by(ChatHistory.timestamp, ChatHistory.id)
+        .limit(COMPACTION_BATCH)
+    ).all()
+    if not turns:
+        return 0
+
+    summary = get_summary(session, user_email) or ChatSummary(user_email=user_email)
+    # Turns up to the fold boundary are already represented in the summary
+    new_turns = [t for t in turns if not is_folded(t, summary)]
+    if new_turns:
+        summary.summary = fold_turns(summary.summary, new_turns, client)
+        summary.turn_count += len(new_turns)
+        summary.compacted_through = new_turns[-1].timestamp
+        summary.compacted_through_id = new_turns[-1].id
+    summary.updated_at = datetime.datetime.utcnow()
+    session.add(summary)
+
+    session.exec(delete(ChatHistory).where(ChatHistory.id.in_([t.id for t in turns])))
+    session.commit()
+    bump_version("chat", user_email)
+    return len(turns)
+
+def should_compact(user_email: str) -> bool:
+    """
+    Per-process throttle so chat endpoints only schedule compaction occasionally.
+    """
+    now = time.monotonic()
+    with _last_compaction_lock:
+        last = _last_compaction.get(user_email)
+        if last is not None and now - last < COMPACTION_INTERVAL:
+            return False
+        _last_compaction[user_email] = now
+        return True
+
+def compact_history_job(user_email: str):
+    """
+    Background task entry point.
+    """
+    from .database import engine
+
+    client = get_client()
+
+    try:
+        with Session(engine) as session:
+            count = compact_history(session, user_email, client)
+            if count:
+                logger.info("🗜️ Compacted %d chat turns for %s", count, user_email)
+                job_event(user_email, "chat_compaction", "finished", count=count)
+    except Exception as e:
+        logger.warning("⚠️ Chat compaction failed for %s: %s", user_email, e)
+
+class ConversationMemory:
+    """
+    Prompt-side view of a user's chat: rolling summary plus the turns not folded into it yet.
+    """
+    def __init__(self, summary: Optional[str], compacted_through: Optional[datetime.datetime], turns: List[Tuple[str, str, datetime.datetime]]):
+        self.summary = summary
+        self.compacted_through = compacted_through
+        self.turns = turns[-(MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH):]
+
+    def needs_fold(self) -> bool:
+        return len(self.turns) >= MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH
+
+    def render(self) -> str:
+        text = f"Conversation summary: {self.summary}\n" if self.summary else ""
+        for sender, message, _ in self.turns:
+            text += f"{'User' if sender == 'user' else 'Assistant'}: {message}\n"
+        return text
+
+_memory: Dict[str, Tuple[float, ConversationMemory, int]] = {} # (loaded at, memory, chat version)
+_memory_lock = threading.Lock()
+_folding = set()
+
+def load_memory(session: Session, user_email: str) -> ConversationMemory:
+    summary = get_summary(session, user_email)
+    through = summary.compacted_through if summary else None
+    stmt = select(ChatHistory.sender, ChatHistory.text, ChatHistory.timestamp).where(ChatHistory.user_email == user_email)
+    unfolded = unfolded_clause(summary)
+    if unfolded is not None:
+        stmt = stmt.where(unfolded)
+    stmt = stmt.order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc()).limit(MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH)
+    turns = list(reversed(session.exec(stmt).all()))
+    return ConversationMemory(summary.summary if summary else None, through, [tuple(t) for t in turns])
+
+def get_memory(session: Session, user_email: str) -> ConversationMemory:
+    """
+    Cached memory, reloaded when any worker has written to the user's chat since it was loaded.
+    """
+    now = time.monotonic()
+    # Read before loading: a write racing the load moves the version and forces the next reload
+    version = get_version("chat", user_email, fresh=True)
+    with _memory_lock:
+        cached = _memory.get(user_email)
+        if cached and cached[2] == version and now - cached[0] < MEMORY_TTL:
+            return cached[1]
+    memory = load_memory(session, user_email)
+    with _memory_lock:
+        _memory[user_email] = (now, memory, version)
+    return memory
+
+def remember_turns(user_email: str, turns: List[Tuple[str, str, datetime.datetime]]):
+    """
+    Write-through for turns that were just persisted, so the next prompt needs no reload.
+    Only applied when this write is the sole change since the memory was loaded; otherwise
+    the cached memory is dropped.
+    """
+    bump_version("chat", user_email)
+    with _memory_lock:
+        if user_email not in _memory:
+            return
+    version = get_version("chat", user_email, fresh=True)
+    with _memory_lock:
+        cached = _memory.get(user_email)
+        if not cached:
+            return
+        loaded_at, memory, seen = cached
+        if version == seen + 1:
+            memory.turns = (memory.turns + turns)[-(MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH):]
+            _memory[user_email] = (loaded_at, memory, version)
+        else:
+            del _memory[user_email]
+
+def forget_memory(user_email: str):
+    with _memory_lock:
+        _memory.pop(user_email, None)
+
+def should_fold(user_email: str) -> bool:
+    """
+    True when the cached memory is full and no fold is already running for the user in this process.
+    """
+    with _memory_lock:
+        cached = _memory.get(user_email)
+        if not cached or not cached[1].needs_fold() or user_email in _folding:
+            return False
+        _folding.add(user_email)
+        return True
+
+def fold_memory(session: Session, user_email: str, client=None) -> int:
+    """
+    Folds all unfolded turns except the newest MEMORY_RECENT_TURNS into the rolling summary.
+    Turns stay in ChatHistory; retention compaction deletes them later. Returns turns folded.
+    """
+    summary = get_summary(session, user_email) or ChatSummary(user_email=user_email)
+    stmt = select(ChatHistory).where(ChatHistory.user_email == user_email)
+    unfolded = unfolded_clause(summary)
+    if unfolded is not None:
+        stmt = stmt.where(unfolded)
+    turns = session.exec(stmt.order_by(ChatHistory.timestamp, ChatHistory.id).limit(COMPACTION_BATCH)).all()
+    to_fold = turns[:-MEMORY_RECENT_TURNS] if len(turns) > MEMORY_RECENT_TURNS else []
+    if not to_fold:
+        return 0
+
+    summary.summary = fold_turns(summary.summary, to_fold, client)
+    summary.turn_count += len(to_fold)
+    summary.compacted_through = to_fold[-1].timestamp
+    summary.compacted_through_id = to_fold[-1].id
+    summary.updated_at = datetime.datetime.utcnow()
+    session.add(summary)
+    session.commit()
+    bump_version("chat", user_email) # The history page carries the summary
+    return len(to_fold)
+
+def fold_memory_job(user_email: str):
+    """
+    Background task entry point.
+    """
+    from .database import engine
+
+    client = get_client()
+
+    try:
+        with Session(engine) as session:
+            count = fold_memory(session, user_email, client)
+            if count:
+                logger.info("🧠 Folded %d chat turns into memory for %s", count, user_email)
+                job_event(user_email, "chat_memory", "finished", count=count)
+    except Exception as e:
+        logger.warning("⚠️ Memory fold failed for %s: %s", user_email, e)
+    finally:
+        forget_memory(user_email)
+        with _memory_lock:
+            _folding.discard(user_email)
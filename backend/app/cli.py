@@ -1,21 +1,53 @@
 import argparse
 import json
+import sys
 import datetime
-from agent import MailAgent, Email
+from .agent import MailAgent, Email
+
+# Run from backend/: python -m app.cli --subject ... --sender ... --body ...
+# Batch triage of an archive (NDJSON out, see app/triage.py):
+#   python -m app.cli --batch archive.mbox --local-only > labels.ndjson
+#   python -m app.cli --batch export.jsonl maildir/ --workers 8 --output labels.ndjson
+
+def run_batch(args):
+    from .triage import run_batch as triage, FORMATS
+    if args.format and args.format not in FORMATS:
+        sys.exit(f"--format must be one of {', '.join(FORMATS)}")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        triage(args.batch, out, fmt=args.format, workers=args.workers, chunk_size=args.chunk_size,
+               local_only=args.local_only)
+    finally:
+        if args.output:
+            out.close()
 
 def main():
     parser = argparse.ArgumentParser(description="AI Mail Intelligence Agent CLI")
-    parser.add_argument("--subject", required=True, help="Email subject line")
-    parser.add_argument("--sender", required=True, help="Sender email address")
-    parser.add_argument("--body", required=True, help="Email body content")
+    parser.add_argument("--subject", help="Email subject line")
+    parser.add_argument("--sender", help="Sender email address")
+    parser.add_argument("--body", help="Email body content")
     parser.add_argument("--prompt-path", default="prompt.txt", help="Path to the system prompt file")
 
+    batch = parser.add_argument_group("batch triage")
+    batch.add_argument("--batch", nargs="+", metavar="PATH", help="mbox files, .eml directories or .jsonl files")
+    batch.add_argument("--format", help="mbox, eml or jsonl (default: from each path)")
+    batch.add_argument("--local-only", action="store_true", help="Local spam/intent models only; never call Gemini")
+    batch.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    batch.add_argument("--chunk-size", type=int, default=500, help="Messages per worker task")
+    batch.add_argument("--output", help="Write NDJSON here instead of stdout")
+
     args = parser.parse_args()
 
+    if args.batch:
+        run_batch(args)
+        return
+    if not (args.subject and args.sender and args.body):
+        parser.error("--subject, --sender and --body are required (or use --batch)")
+
     # Create Email object
     # For this CLI, we assume 'now' as received time, or could be added as arg
     received_time = datetime.datetime.now().isoformat()
-    
+
     email = Email(
         subject=args.subject,
         sender=args.sender,
@@ -1,58 +1,173 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from dotenv import load_dotenv
 import os
+import logging
+import threading
+import time
 
 load_dotenv()
-from sqlmodel import SQLModel, create_engine, Session
 
-# Default to SQLite if DB_HOST not set, but prefer MySQL
+logger = logging.getLogger(__name__)
+
+# Single shared engine for the whole app (users, emails, meetings and chat live in the same MySQL DB)
 db_host = os.getenv("DB_HOST", "localhost")
 db_port = os.getenv("DB_PORT", "3306")
 db_user = os.getenv("DB_USER", "root")
 db_password = os.getenv("DB_PASSWORD", "")
-db_name = os.getenv("DB_NAME", "users_db")
+db_name = os.getenv("DB_NAME", "agent_db")
 
 mysql_url = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
+# Helper to strip quotes from Azure/Env vars
+def get_safe_env(key, default=None):
+    val = os.getenv(key, default)
+    if val:
+        return val.strip('"').strip("'")
+    return val
+
+def env_int(key, default):
+    val = os.getenv(key)
+    return int(val) if val not in (None, "") else default
+
+def env_bool(key, default):
+    val = os.getenv(key)
+    if val in (None, ""):
+        return default
+    return val.strip().lower() in ("1", "true", "yes", "on")
+
+# Pool Configuration
+DB_POOL_SIZE = env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", 30) # Seconds to wait for a free connection
+DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 1800) # Recycle before the server drops idle connections
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+DB_ECHO = env_bool("DB_ECHO", False) # SQL statement logging, off unless asked for
+# Statements go through the app's log queue (app/logs.py) instead of echo=True's synchronous stdout handler
+if DB_ECHO:
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+DB_USE_PURE = env_bool("DB_USE_PURE", False) # Pure-Python connector; only needed if the C extension breaks SSL
+
 # SSL Configuration
-connect_args = {"use_pure": True} # Force pure Python to avoid C-ext SSL errors
+connect_args = {"use_pure": DB_USE_PURE}
 ssl_ca = os.getenv("SSL_CA")
 
-print(f"DEBUG: Current CWD: {os.getcwd()}")
-print(f"DEBUG: __file__: {__file__}")
-print(f"DEBUG: App Dir contents: {os.listdir(os.path.dirname(__file__))}")
-try:
-    parent_dir = os.path.dirname(os.path.dirname(__file__))
-    print(f"DEBUG: Parent Dir ({parent_dir}) contents: {os.listdir(parent_dir)}")
-except Exception as e:
-    print(f"DEBUG: Error listing parent dir: {e}")
-
-# Fallback: Try to find cert relative to this file if env var path fails
-if ssl_ca:
-    if not os.path.exists(ssl_ca):
-        print(f"DEBUG: SSL_CA path '{ssl_ca}' does not exist. Trying fallback.")
-        # Check parent directory (backend root)
-        candidate = os.path.join(os.path.dirname(__file__), "..", os.path.basename(ssl_ca))
-        print(f"DEBUG: Checking candidate: {candidate}")
-        if os.path.exists(candidate):
-            print("DEBUG: Candidate found!")
-            ssl_ca = candidate
-        else:
-            print("DEBUG: Candidate NOT found.")
+# Fallback: the configured path may be relative to somewhere else; try the backend root
+if ssl_ca and not os.path.exists(ssl_ca):
+    candidate = os.path.join(os.path.dirname(__file__), "..", os.path.basename(ssl_ca))
+    if os.path.exists(candidate):
+        ssl_ca = candidate
     else:
-        print(f"DEBUG: SSL_CA path '{ssl_ca}' exists!")
+        logger.warning("⚠️ SSL_CA '%s' not found (also tried %s)", ssl_ca, candidate)
 
 if ssl_ca:
     connect_args["ssl_ca"] = ssl_ca
     connect_args["ssl_verify_cert"] = True
 
-# Use MySQL if env var is set or default string is valid, else fallback
-# For this migration, we assume user will provide DB
-engine = create_engine(mysql_url, echo=True, connect_args=connect_args)
+class PoolStats:
+    """
+    Connection checkout wait times, recorded by TimedQueuePool.
+    """
+    BUCKETS = (0.001, 0.01, 0.1, 1.0) # Upper bounds in seconds; last bucket is '+Inf'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.wait_buckets = [0] * (len(self.BUCKETS) + 1)
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+
+    def snapshot(self, pool) -> dict:
+        capacity = DB_POOL_SIZE + DB_MAX_OVERFLOW
+        with self.lock:
+            checked_out = pool.checkedout()
+            labels = [f"<={b}s" for b in self.BUCKETS] + [f">{self.BUCKETS[-1]}s"]
+            return {
+                "pool_size": pool.size(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "checked_out": checked_out,
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "utilization": round(checked_out / capacity, 3) if capacity else None,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "wait_histogram": dict(zip(labels, self.wait_buckets)),
+            }
+
+pool_stats = PoolStats()
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long each checkout waited for a connection.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - start)
+        return conn
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """
+    The shared engine, created on first use: create_engine imports the MySQL driver, which
+    processes that never touch the database (CLI --help, cold-start probes) should not pay for.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    mysql_url,
+                    connect_args=connect_args,
+                    poolclass=TimedQueuePool,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                )
+    return _engine
+
+def engine_created() -> bool:
+    return _engine is not None
+
+def __getattr__(name):
+    # `from .database import engine` keeps working, creating the engine at that point
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_pool_stats() -> dict:
+    return pool_stats.snapshot(get_engine().pool)
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         yield session
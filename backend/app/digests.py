@@ -0,0 +1,335 @@
+import re
+import logging
+import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import func, or_
+from sqlmodel import Session, select
+from .models import Email, Digest
+from .metrics import llm_call
+from .llm import get_client
+
+logger = logging.getLogger(__name__)
+
+# Bounds that keep rollup and Q&A prompt size independent of mailbox size / time range
+MAX_LINES_PER_DAY = 200
+MAX_DIGEST_CHARS = 800
+MAX_DIGESTS_IN_PROMPT = 14
+MAX_DRILLDOWN_EMAILS = 8
+DAILY_RANGE_LIMIT_DAYS = 14 # Longer ranges are answered from weekly digests
+WEEKLY_RANGE_LIMIT_DAYS = 7 * MAX_DIGESTS_IN_PROMPT # ...and ranges longer than that from monthly ones
+PERIOD_LABELS = {"day": "daily", "week": "weekly", "month": "monthly"}
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+
+STOPWORDS = {
+    "what", "when", "where", "which", "who", "whom", "whose", "why", "how", "happened", "happen",
+    "with", "about", "from", "this", "that", "these", "those", "there", "their", "have", "were",
+    "emails", "email", "mail", "inbox", "anything", "everything", "tell", "show", "give", "summary",
+    "summarize", "week", "weeks", "month", "months", "days", "today", "yesterday", "last", "past",
+    "since", "during", "been", "going", "updates", "update", "news", "any", "the", "and", "for",
+} | set(MONTHS)
+
+def day_start(dt: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(dt.year, dt.month, dt.day)
+
+def week_start(dt: datetime.datetime) -> datetime.datetime:
+    return day_start(dt) - datetime.timedelta(days=dt.weekday())
+
+def month_start(dt: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(dt.year, dt.month, 1)
+
+def period_starts(dt: datetime.datetime) -> List[Tuple[str, datetime.datetime]]:
+    dt = dt.replace(tzinfo=None)
+    return [("day", day_start(dt)), ("week", week_start(dt)), ("month", month_start(dt))]
+
+def period_end(period: str, start: datetime.datetime) -> datetime.datetime:
+    if period == "day":
+        return start + datetime.timedelta(days=1)
+    if period == "week":
+        return start + datetime.timedelta(days=7)
+    return datetime.datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+
+def parse_time_range(query: str, now: datetime.datetime) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Detects broad time windows ("this month", "last 3 weeks", "in march") in a question.
+    Returns (start, end) or None if the question has no explicit time range.
+    """
+    q = query.lower()
+    today = day_start(now)
+
+    if "yesterday" in q:
+        return today - datetime.timedelta(days=1), today
+    if "today" in q:
+        return today, now
+    if "this week" in q:
+        return week_start(now), now
+    if "last week" in q:
+        return week_start(now) - datetime.timedelta(days=7), week_start(now)
+    if "this month" in q:
+        return today.replace(day=1), now
+    if "last month" in q:
+        end = today.replace(day=1)
+        return (end - datetime.timedelta(days=1)).replace(day=1), end
+
+    m = re.search(r"(?:past|last|previous)\s+(\d+)\s+(day|week|month)s?", q)
+    if m:
+        n, unit = int(m.group(1)), m.group(2)
+        days = {"day": 1, "week": 7, "month": 30}[unit] * n
+        return now - datetime.timedelta(days=days), now
+
+    m = re.search(r"\b(?:in|during|since)\s+(" + "|".join(MONTHS) + r")\b", q)
+    if m:
+        month = MONTHS.index(m.group(1)) + 1
+        year = now.year if month <= now.month else now.year - 1
+        start = datetime.datetime(year, month, 1)
+        if q[m.start():].startswith("since"):
+            return start, now
+        end = datetime.datetime(year + (month == 12), month % 12 + 1, 1)
+        return start, min(end, now)
+
+    return None
+
+def query_keywords(query: str, limit: int = 5) -> List[str]:
+    words = re.findall(r"[a-zA-Z0-9][\w\-]{2,}", query.lower())
+    keywords = []
+    for w in words:
+        if w not in STOPWORDS and w not in keywords:
+            keywords.append(w)
+    return keywords[:limit]
+
+class DigestBuilder:
+    """
+    Maintains per-user daily, weekly and monthly digests. Periods are flagged stale when new
+    mail arrives and only stale periods are rebuilt.
+    """
+    def __init__(self, session: Session, client=None, model_name: str = "gemini-2.5-flash"):
+        self.session = session
+        self.client = client
+        self.model_name = model_name
+
+    def mark_stale(self, user_id: int, received_times: Iterable[datetime.datetime]):
+        periods = set()
+        for t in received_times:
+            periods.update(period_starts(t))
+
+        for period, start in periods:
+            stmt = select(Digest).where(Digest.user_id == user_id, Digest.period == period, Digest.period_start == start)
+            digest = self.session.exec(stmt).first()
+            if digest is None:
+                digest = Digest(user_id=user_id, period=period, period_start=start)
+            digest.stale = True
+            self.session.add(digest)
+        self.session.commit()
+
+    def backfill(self, user_id: int) -> int:
+        """
+        Flags every day, week and month that has stored mail but no digest yet (mail synced before
+        digests existed), so the next rebuild_stale rolls it up. Existing digests are left alone.
+        Returns the number of periods added.
+        """
+        periods = set()
+        for t in self.session.exec(select(Email.received_time).where(Email.user_id == user_id)):
+            periods.update(period_starts(t))
+
+        stmt = select(Digest.period, Digest.period_start).where(Digest.user_id == user_id)
+        existing = {(period, start) for period, start in self.session.exec(stmt).all()}
+        missing = sorted(periods - existing)
+        self.session.add_all(Digest(user_id=user_id, period=period, period_start=start) for period, start in missing)
+        self.session.commit()
+        return len(missing)
+
+    def rebuild_stale(self, user_id: int) -> int:
+        """
+        Rebuilds stale day digests first, then the stale weeks and months that roll them up.
+        Returns the number of digests rebuilt.
+        """
+        rebuilt = 0
+        for period in ("day", "week", "month"):
+            stmt = select(Digest).where(Digest.user_id == user_id, Digest.period == period, Digest.stale == True)
+            for digest in self.session.exec(stmt).all():
+                if period == "day":
+                    count, lines = self._day_lines(user_id, digest.period_start)
+                else:
+                    count, lines = self._rollup_lines(user_id, digest.period_start, period_end(period, digest.period_start))
+                digest.email_count = count
+                digest.summary = self._summarize(period, digest.period_start, lines)
+                digest.stale = False
+                digest.updated_at = datetime.datetime.utcnow()
+                self.session.add(digest)
+                self.session.commit()
+                rebuilt += 1
+        return rebuilt
+
+    def _day_lines(self, user_id: int, start: datetime.datetime) -> Tuple[int, List[str]]:
+        end = start + datetime.timedelta(days=1)
+        stmt = (
+            select(Email.sender, Email.subject, Email.summary)
+            .where(Email.user_id == user_id, Email.received_time >= start, Email.received_time < end)
+            .order_by(Email.received_time)
+        )
+        rows = self.session.exec(stmt).all()
+        lines = [f"- {sender} | {subject}: {summary or ''}" for sender, subject, summary in rows[:MAX_LINES_PER_DAY]]
+        return len(rows), lines
+
+    def _rollup_lines(self, user_id: int, start: datetime.datetime, end: datetime.datetime) -> Tuple[int, List[str]]:
+        """
+        Week and month digests are built from the day digests inside them.
+        """
+        stmt = (
+            select(Digest)
+            .where(Digest.user_id == user_id, Digest.period == "day", Digest.period_start >= start, Digest.period_start < end)
+            .order_by(Digest.period_start)
+        )
+        days = self.session.exec(stmt).all()
+        lines = [f"- {d.period_start.strftime('%A %Y-%m-%d')} ({d.email_count} emails): {d.summary or ''}" for d in days]
+        return sum(d.email_count for d in days), lines
+
+    def _summarize(self, period: str, start: datetime.datetime, lines: List[str]) -> str:
+        if not lines:
+            return "No emails."
+        label = {"day": f"the day {start.date()}", "week": f"the week of {start.date()}",
+                 "month": f"the month of {start.strftime('%B %Y')}"}[period]
+        prompt = f"""
+        You are an Inbox Historian. Write a digest of {label} from the email notes below.
+
+        RULES:
+        - MAX 100 WORDS.
+        - Group by project/topic and name the key senders, decisions, deadlines and open questions.
+        - No preamble.
+
+        NOTES:
+        {chr(10).join(lines)}
+
+        DIGEST:
+        """
+        if self.client:
+            try:
+                with llm_call("digests") as call:
+                    response = self.client.models.generate_content(model=self.model_name, contents=prompt)
+                    call.usage(response)
+                if response.text:
+                    return response.text.strip()[:MAX_DIGEST_CHARS]
+            except Exception as e:
+                logger.warning("⚠️ Digest generation failed (%s %s): %s", period, start.date(), e)
+        # Local fallback: the notes themselves, trimmed
+        return "\n".join(lines)[:MAX_DIGEST_CHARS]
+
+    def context_for_range(self, user_id: int, query: str, start: datetime.datetime, end: datetime.datetime) -> Optional[str]:
+        """
+        Builds a bounded prompt context for a time-range question: up to MAX_DIGESTS_IN_PROMPT
+        digests (daily for short ranges, weekly for up to MAX_DIGESTS_IN_PROMPT weeks, monthly
+        beyond) plus a few matching raw emails. Returns None (the caller answers from raw mail)
+        unless the digests account for every email in the periods they span. If the range still
+        has more periods than fit, the newest are kept and the header names the span covered.
+        """
+        days = (end - start).days
+        if days <= DAILY_RANGE_LIMIT_DAYS:
+            period, range_start = "day", day_start(start)
+        elif days <= WEEKLY_RANGE_LIMIT_DAYS:
+            period, range_start = "week", week_start(start)
+        else:
+            period, range_start = "month", month_start(start)
+
+        stmt = (
+            select(Digest)
+            .where(Digest.user_id == user_id, Digest.period == period, Digest.period_start >= range_start, Digest.period_start < end)
+            .order_by(Digest.period_start.desc())
+            .limit(MAX_DIGESTS_IN_PROMPT + 1) # One extra tells whether older periods were cut off
+        )
+        digests = list(reversed(self.session.exec(stmt).all()))
+        if not digests:
+            return None
+        truncated = len(digests) > MAX_DIGESTS_IN_PROMPT
+        digests = digests[-MAX_DIGESTS_IN_PROMPT:]
+
+        # Periods with no digest (mail stored before digests existed) or a stale one would be
+        # silently left out; compare against the mail actually stored. When the limit cut off
+        # older periods, only the span of the digests shown is checked.
+        covered_from = digests[0].period_start if truncated else range_start
+        stmt = select(func.count()).select_from(Email).where(
+            Email.user_id == user_id,
+            Email.received_time >= covered_from,
+            Email.received_time < period_end(period, digests[-1].period_start),
+        )
+        if sum(d.email_count for d in digests if not d.stale) < self.session.exec(stmt).one():
+            return None
+
+        if truncated:
+            context = (f"PERIOD DIGESTS ({PERIOD_LABELS[period]}, {covered_from.date()} to {end.date()} only; "
+                       f"earlier parts of the requested range from {start.date()} are not included):\n")
+        else:
+            context = f"PERIOD DIGESTS ({PERIOD_LABELS[period]}, {start.date()} to {end.date()}):\n"
+        for d in digests:
+            label = {"day": d.period_start.strftime('%Y-%m-%d'), "week": f"Week of {d.period_start.strftime('%Y-%m-%d')}",
+                     "month": d.period_start.strftime('%B %Y')}[period]
+            context += f"--- {label} ({d.email_count} emails) ---\n{d.summary}\n\n"
+
+        # Drill into raw emails only when the question names something specific
+        keywords = query_keywords(query)
+        if keywords:
+            match = or_(*[or_(Email.subject.ilike(f"%{k}%"), Email.summary.ilike(f"%{k}%")) for k in keywords])
+            stmt = (
+                select(Email.id, Email.sender, Email.received_time, Email.subject, Email.summary)
+                .where(Email.user_id == user_id, Email.received_time >= start, Email.received_time < end, match)
+                .order_by(Email.received_time.desc())
+                .limit(MAX_DRILLDOWN_EMAILS)
+            )
+            rows = self.session.exec(stmt).all()
+            if rows:
+                context += "MATCHING EMAILS:\n"
+                for email_id, sender, received, subject, summary in rows:
+                    context += f"--- EMAIL ID {email_id} ---\nFrom: {sender}\nDate: {received}\nSubject: {subject}\nSummary: {summary}\n\n"
+        return context
+
+def rebuild_digests(user_id: int, user_email: Optional[str] = None, backfill: bool = False) -> Optional[int]:
+    """
+    Background job run after a sync: rebuilds only the periods that received new mail.
+    With backfill, periods of already-stored mail that have no digest yet are rolled up too.
+    Progress is pushed to the user's event stream when user_email is given.
+    Returns the number of digests rebuilt, None on failure.
+    """
+    from .database import engine
+    from .events import job_event
+
+    client = get_client()
+
+    job_event(user_email, "digests", "started")
+    try:
+        with Session(engine) as session:
+            builder = DigestBuilder(session, client)
+            if backfill:
+                builder.backfill(user_id)
+            count = builder.rebuild_stale(user_id)
+            logger.info("🗂️ Rebuilt %d digests for user %s", count, user_id)
+        job_event(user_email, "digests", "finished", count=count)
+        return count
+    except Exception as e:
+        logger.warning("⚠️ Digest rollup failed for user %s: %s", user_id, e)
+        job_event(user_email, "digests", "failed")
+        return None
+
+if __name__ == "__main__":
+    # One-off backfill for mail stored before digests existed; safe to re-run.
+    #   python -m app.digests --all
+    #   python -m app.digests --user someone@example.com
+    import argparse
+    from .database import engine
+    from .models import User
+
+    parser = argparse.ArgumentParser(description="Roll stored mail up into daily/weekly digests")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Every user")
+    target.add_argument("--user", help="One user, by email")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        stmt = select(User.id, User.email)
+        if args.user:
+            stmt = stmt.where(User.email == args.user)
+        users = session.exec(stmt).all()
+    if not users:
+        print("No matching users.")
+    for user_id, email in users:
+        count = rebuild_digests(user_id, backfill=True)
+        print(f"{email}: " + ("failed (see log)" if count is None else f"{count} digests rebuilt"))
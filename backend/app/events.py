@@ -0,0 +1,164 @@
+import os
+import json
+import socket
+import logging
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Per-user push channel. Publishers are sync code (endpoints in the threadpool, background
+# tasks); subscribers are SSE streams on the event loop, so delivery hops threads with
+# call_soon_threadsafe.
+#
+# With several workers on one host (gunicorn.conf.py), every worker binds a unix datagram socket
+# in EVENT_RELAY_DIR and publish() also sends the event to every other worker's socket.
+# Without EVENT_RELAY_DIR (single process) events stay in-process.
+HEARTBEAT_SECONDS = 25
+QUEUE_SIZE = 100
+RELAY_MAX_BYTES = 200_000 # Stay under the default unix datagram buffer size
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue(QUEUE_SIZE)
+        # Set when events were dropped; the stream then tells the client to refetch
+        self.overflowed = False
+
+    def deliver(self, event: Tuple[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key: str) -> Subscriber:
+        """
+        Must be called from the event loop that will consume the subscriber's queue.
+        """
+        sub = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, key: str, sub: Subscriber):
+        with self._lock:
+            subs = self._subscribers.get(key)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[key]
+
+    def publish(self, key: str, event: str, data: Any = None):
+        """
+        Delivers to this process's subscribers only; see publish() below for the relayed version.
+        """
+        with self._lock:
+            subs = list(self._subscribers.get(key, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.deliver, (event, data))
+            except RuntimeError:
+                # Loop already closed (worker shutting down)
+                self.unsubscribe(key, sub)
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+class EventRelay:
+    """
+    Fans events out to the other workers on this host over unix datagram sockets.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}.sock")
+        self.sock: Optional[socket.socket] = None
+        self.out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.out.setblocking(False)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+        loop.add_reader(self.sock.fileno(), self._receive)
+
+    def stop(self, loop: asyncio.AbstractEventLoop):
+        if self.sock:
+            loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _receive(self):
+        while self.sock:
+            try:
+                message = self.sock.recv(RELAY_MAX_BYTES)
+            except BlockingIOError:
+                return
+            key, event, data = json.loads(message)
+            broker.publish(key, event, data)
+
+    def send(self, key: str, event: str, data: Any):
+        message = json.dumps([key, event, data]).encode()
+        if len(message) > RELAY_MAX_BYTES:
+            # Too big for one datagram: tell the other workers' clients to refetch instead
+            message = json.dumps([key, "resync", {}]).encode()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self.out.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a worker that died without cleaning up
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning("⚠️ Event relay to %s dropped (%s): receiver is backlogged", name, event)
+
+broker = EventBroker()
+relay: Optional[EventRelay] = None
+
+def start_relay():
+    """
+    Called from the app's startup hook, inside the worker's event loop.
+    """
+    global relay
+    directory = os.getenv("EVENT_RELAY_DIR")
+    if not directory or relay:
+        return
+    relay = EventRelay(directory)
+    relay.start(asyncio.get_running_loop())
+
+def stop_relay():
+    global relay
+    if relay:
+        relay.stop(asyncio.get_running_loop())
+        relay = None
+
+def publish(user_email: Optional[str], event: str, data: Any = None):
+    """
+    Fire-and-forget push to every open event stream of a user, in every worker. Never raises.
+    """
+    if not user_email:
+        return
+    try:
+        broker.publish(user_email, event, data)
+        if relay:
+            relay.send(user_email, event, data)
+    except Exception as e:
+        logger.warning("⚠️ Event publish failed (%s): %s", event, e)
+
+def job_event(user_email: Optional[str], job: str, status: str, **detail):
+    publish(user_email, "job", {"job": job, "status": status, **detail})
@@ -0,0 +1,251 @@
+import os
+import time
+import logging
+import hashlib
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+from .metrics import llm_call
+
+logger = logging.getLogger(__name__)
+
+# Explicit prompt-prefix caching. Static system prompts are registered once as provider-side
+# cached content and referenced by handle; only the per-request part is sent each call.
+#   provider - Gemini context caching (default)
+#   local    - in-process emulation with the same hit/miss/refresh bookkeeping; prompts are sent
+#              inline, so caching behaviour can be exercised offline
+#   off      - always send the prefix inline
+PROMPT_CACHE_MODE = os.getenv("PROMPT_CACHE_MODE", "provider").lower()
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "3600"))
+PROMPT_CACHE_REFRESH_MARGIN = 300 # Extend a handle when it has less than this many seconds left
+PROMPT_CACHE_RETRY_AFTER = 3600 # After a failed create (e.g. prefix below the provider minimum), stay inline this long
+
+_client = None
+_client_ready = False
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Process-wide Gemini client, created on first use so google.genai is only imported when needed.
+    None when GEMINI_API_KEY is not set.
+    """
+    global _client, _client_ready
+    if _client_ready:
+        return _client
+    with _client_lock:
+        if not _client_ready:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if api_key:
+                from google import genai
+                _client = genai.Client(api_key=api_key)
+            else:
+                logger.warning("GEMINI_API_KEY not found in env")
+            _client_ready = True
+    return _client
+
+def reset_client():
+    """
+    Drops the client so the next call builds a new one (after fork: never share its connections).
+    """
+    global _client, _client_ready
+    with _client_lock:
+        _client, _client_ready = None, False
+
+class GeminiCacheBackend:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, model: str, prefix: str, ttl: int) -> str:
+        cache = self.client.caches.create(
+            model=model,
+            config={
+                "system_instruction": prefix,
+                "ttl": f"{ttl}s",
+                "display_name": f"prefix-{hashlib.sha256(prefix.encode()).hexdigest()[:12]}",
+            },
+        )
+        return cache.name
+
+    def refresh(self, name: str, ttl: int):
+        self.client.caches.update(name=name, config={"ttl": f"{ttl}s"})
+
+class LocalCacheBackend:
+    """
+    Offline stand-in for the provider cache: hands out handles and tracks which prefix each one holds.
+    """
+    def __init__(self):
+        self.contents: Dict[str, str] = {}
+        self.creates = 0
+
+    def create(self, model: str, prefix: str, ttl: int) -> str:
+        self.creates += 1
+        name = f"localCachedContents/{hashlib.sha256((model + prefix).encode()).hexdigest()[:16]}-{self.creates}"
+        self.contents[name] = prefix
+        return name
+
+    def refresh(self, name: str, ttl: int):
+        if name not in self.contents:
+            raise KeyError(f"Cached content {name} not found")
+
+class _Entry:
+    __slots__ = ("handle", "expires_at", "failed_until")
+
+    def __init__(self, handle: Optional[str] = None, expires_at: float = 0.0, failed_until: float = 0.0):
+        self.handle = handle
+        self.expires_at = expires_at
+        self.failed_until = failed_until
+
+class PromptCache:
+    """
+    Process-wide registry of cached prefixes keyed by (model, sha256(prefix)).
+    Agents are created per request, so handles live here rather than on the agent.
+    """
+    def __init__(self, mode: str = PROMPT_CACHE_MODE, ttl: int = PROMPT_CACHE_TTL,
+                 refresh_margin: int = PROMPT_CACHE_REFRESH_MARGIN, retry_after: int = PROMPT_CACHE_RETRY_AFTER,
+                 clock=time.monotonic):
+        self.mode = mode
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self.clock = clock
+        self.local = LocalCacheBackend()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "refreshes": 0, "failures": 0, "bypassed": 0, "invalidations": 0}
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _backend(self, client):
+        return self.local if self.mode == "local" else GeminiCacheBackend(client)
+
+    def handle(self, client, model: str, prefix: str) -> Optional[str]:
+        """
+        Cached-content handle for prefix, creating or refreshing it as needed.
+        None means the prefix must be sent inline.
+        """
+        if self.mode == "off" or (self.mode == "provider" and client is None):
+            self._count("bypassed")
+            return None
+
+        key = (model, hashlib.sha256(prefix.encode()).hexdigest())
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One create/refresh per prefix at a time; other prefixes are not blocked
+        with key_lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry and entry.failed_until > now:
+                self._count("bypassed")
+                return None
+            if entry and entry.handle and entry.expires_at - self.refresh_margin > now:
+                self._count("hits")
+                return entry.handle
+
+            backend = self._backend(client)
+            if entry and entry.handle and entry.expires_at > now:
+                try:
+                    backend.refresh(entry.handle, self.ttl)
+                    entry.expires_at = now + self.ttl
+                    self._count("refreshes")
+                    self._count("hits")
+                    return entry.handle
+                except Exception as e:
+                    logger.warning("⚠️ Prompt cache refresh failed, recreating: %s", e)
+
+            self._count("misses")
+            try:
+                name = backend.create(model, prefix, self.ttl)
+            except Exception as e:
+                self._count("failures")
+                self._entries[key] = _Entry(failed_until=now + self.retry_after)
+                logger.warning("⚠️ Prompt cache create failed, sending prefix inline for %ss: %s", self.retry_after, e)
+                return None
+            self._entries[key] = _Entry(handle=name, expires_at=now + self.ttl)
+            return name
+
+    def invalidate(self, handle: str):
+        """
+        Drops a handle the provider no longer recognises; the next call recreates it.
+        """
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.handle == handle:
+                    del self._entries[key]
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = sum(1 for e in self._entries.values() if e.handle)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        stats["mode"] = self.mode
+        return stats
+
+PROMPT_CACHE = PromptCache()
+
+def _is_cache_error(e: Exception) -> bool:
+    text = str(e).lower()
+    return "cachedcontent" in text or "cached content" in text or "cached_content" in text
+
+def _cached_config(config: Optional[Dict[str, Any]], prefix: str, handle: Optional[str]) -> Dict[str, Any]:
+    config = dict(config or {})
+    if handle and PROMPT_CACHE.mode == "provider":
+        config["cached_content"] = handle
+    else:
+        config["system_instruction"] = prefix
+    return config
+
+def generate(client, model: str, prefix: str, contents: Any, config: Optional[Dict[str, Any]] = None, agent: str = "default"):
+    """
+    client.models.generate_content with `prefix` as the system instruction, served from the
+    prompt cache when possible. Quota and other errors propagate to the caller's retry logic.
+    `agent` labels the call's latency and token metrics.
+    """
+    with llm_call(agent) as call:
+        response = _generate(client, model, prefix, contents, config)
+        call.usage(response)
+        return response
+
+def generate_stream(client, model: str, prefix: str, contents: Any, config: Optional[Dict[str, Any]] = None, agent: str = "default") -> Iterator[Any]:
+    """
+    Streaming counterpart of generate. A stale handle is only retried inline before the first chunk.
+    """
+    with llm_call(agent) as call:
+        chunk = None
+        for chunk in _generate_stream(client, model, prefix, contents, config):
+            yield chunk
+        if chunk is not None:
+            call.usage(chunk) # The final chunk carries the usage totals
+
+def _generate(client, model: str, prefix: str, contents: Any, config: Optional[Dict[str, Any]]):
+    handle = PROMPT_CACHE.handle(client, model, prefix)
+    if handle and PROMPT_CACHE.mode == "provider":
+        try:
+            return client.models.generate_content(model=model, contents=contents, config=_cached_config(config, prefix, handle))
+        except Exception as e:
+            if not _is_cache_error(e):
+                raise
+            PROMPT_CACHE.invalidate(handle)
+    return client.models.generate_content(model=model, contents=contents, config=_cached_config(config, prefix, None))
+
+def _generate_stream(client, model: str, prefix: str, contents: Any, config: Optional[Dict[str, Any]]) -> Iterator[Any]:
+    handle = PROMPT_CACHE.handle(client, model, prefix)
+    if handle and PROMPT_CACHE.mode == "provider":
+        try:
+            stream = iter(client.models.generate_content_stream(model=model, contents=contents, config=_cached_config(config, prefix, handle)))
+            first = next(stream)
+        except StopIteration:
+            return
+        except Exception as e:
+            if not _is_cache_error(e):
+                raise
+            PROMPT_CACHE.invalidate(handle)
+        else:
+            yield first
+            yield from stream
+            return
+    yield from client.models.generate_content_stream(model=model, contents=contents, config=_cached_config(config, prefix, None))
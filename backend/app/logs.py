@@ -0,0 +1,188 @@
+"""
+Logging setup: modules log through the standard `logging` API and the records are handed to a
+background writer thread through a bounded queue, so a request never waits on stdout.
+
+    LOG_LEVEL=INFO                                   root level
+    LOG_LEVELS=app.services=DEBUG,app.agent=WARNING  per-module overrides (sqlalchemy.engine=INFO for SQL)
+    LOG_FORMAT=text|json                             json: one object per line with the extra fields
+    LOG_SAMPLE_EVERY=100                             high-volume messages (extra=sampled()) keep 1 in N
+    LOG_QUEUE_SIZE=10000                             records beyond this are dropped and counted
+"""
+import os
+import json
+import queue
+import atexit
+import logging
+import datetime
+import threading
+import logging.handlers
+from typing import Dict, Optional
+
+# Attributes every LogRecord has; anything else on a record came from extra= and is a field
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+def sampled(every: Optional[int] = None) -> dict:
+    """
+    extra= for per-email / per-response messages: only the first and then every Nth record
+    of the same call site are kept (counted per logger and message template). N defaults
+    to LOG_SAMPLE_EVERY.
+    """
+    return {"sample_every": every}
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._counts: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "sample_every"):
+            return True
+        every = record.sample_every or self.every
+        if every <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % every:
+            return False
+        record.sampled = f"1/{every}"
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Does the minimum in the calling thread (merge args, render a traceback) and never blocks:
+    when the writer falls behind, records are dropped and the loss is logged once it catches up.
+    """
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Args may be mutated after the call returns, so render the message now; the
+        # formatter runs on the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None # Don't keep the frames alive in the queue
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            note = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                     "⚠️ %d log records dropped (writer queue full)", (dropped,), None)
+            note.msg, note.args = note.getMessage(), None
+            try:
+                self.queue.put_nowait(note)
+            except queue.Full:
+                self.dropped += dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class WriterThread(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # The stop marker must get in even if the queue is full; the writer is draining it
+        try:
+            self.queue.put(self._sentinel, timeout=5)
+        except queue.Full:
+            pass
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            **_extra_fields(record),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS and k != "sample_every"}
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return {name: level for name, level in levels.items() if isinstance(level, int)}
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[WriterThread] = None
+_writer: Optional[logging.Handler] = None
+_queue_size = 10000
+_lock = threading.Lock()
+
+def _start_listener():
+    global _listener
+    q = queue.Queue(maxsize=_queue_size)
+    _handler.queue = q
+    _listener = WriterThread(q, _writer)
+    _listener.start()
+
+def _restart_after_fork():
+    # The writer thread doesn't survive fork (gunicorn workers); give the child its own
+    # queue and thread. A fresh queue also avoids inheriting a lock held mid-put.
+    global _lock
+    _lock = threading.Lock()
+    if _handler is not None:
+        _handler.dropped = 0
+        _start_listener()
+
+def stop_logging():
+    """
+    Flushes queued records and stops the writer thread (registered atexit).
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def setup_logging():
+    """
+    Routes the root logger through the queue. Idempotent; call after the environment is loaded.
+    """
+    global _handler, _writer, _queue_size
+    with _lock:
+        if _handler is not None:
+            return
+        _queue_size = max(100, int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        _writer = logging.StreamHandler() # stderr, so CLI output on stdout stays parseable
+        _writer.setFormatter(JSONFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter())
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=_queue_size))
+        _handler.addFilter(SamplingFilter(max(1, int(os.getenv("LOG_SAMPLE_EVERY", "100")))))
+
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        level = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").strip().upper())
+        root.setLevel(level if isinstance(level, int) else logging.INFO)
+        for name, module_level in parse_levels(os.getenv("LOG_LEVELS", "")).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _start_listener()
+        atexit.register(stop_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_after_fork)
@@ -1,65 +1,63 @@
 from fastapi import FastAPI, HTTPException, Request, Depends
 from dotenv import load_dotenv
 import os
+import json
+import logging
+import asyncio
+import hmac
+import time
 from pathlib import Path
 
-import jwt
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Request, Depends, status
+from fastapi import FastAPI, HTTPException, Request, Depends, status, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.encoders import jsonable_encoder
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.responses import RedirectResponse
-from authlib.integrations.starlette_client import OAuth
+from starlette.responses import RedirectResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
+from sqlalchemy import delete
+from sqlalchemy.orm import selectinload
 from typing import Optional
 
 from .agent import MailAgent, Email
-from .database import create_db_and_tables, get_session, engine
+from .database import get_session, get_engine, get_pool_stats, get_safe_env, env_bool
+from .auth import create_access_token, resolve_token, invalidate_user, store_google_token, load_google_token
+from .llm import PROMPT_CACHE
+from .migrations import ensure_schema
 from .models import User, ChatHistory
-from .meeting_database import create_meeting_db_and_tables, get_meeting_session
+from .meeting_database import get_meeting_session
 from .meeting_agent import MeetingAgent
-from .meeting_models import Meeting
+from .meeting_models import Meeting, MeetingException
+from .recurrence import occurrences_between, cancel_occurrence
+from .calendar_index import get_index as get_calendar_index, invalidate as invalidate_calendar, find_free_slots, MAX_FREE_SLOTS, MAX_MEETING_WINDOW_DAYS
+from .events import broker, publish, start_relay, stop_relay, HEARTBEAT_SECONDS
+from .versions import bump_version, data_etag
+from .responses import not_modified, json_response
+from .metrics import MetricsMiddleware, instrument_sql, render_metrics, record_sync
+from .profiling import ProfilingMiddleware, install as install_profiler
+from .logs import setup_logging
+from .bulk import analyze_ndjson
 
 # Load env before importing DB modules
 load_dotenv()
+setup_logging()
 
-# Helper to strip quotes from Azure/Env vars
-def get_safe_env(key, default=None):
-    val = os.getenv(key, default)
-    if val:
-        return val.strip('"').strip("'")
-    return val
-
-# JWT Configuration
-SECRET_KEY = get_safe_env("SECRET_KEY", "secret")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_DAYS = 7
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+logger = logging.getLogger(__name__)
 
-def verify_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.PyJWTError:
-        return None
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Auth Dependency
 def get_current_user_token(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
-    payload = verify_token(token)
-    if not payload:
+    # The session only touches the DB on an auth cache miss
+    user_data = resolve_token(session, token)
+    if not user_data:
          raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return payload # Returns dict with user info
+    return user_data # Returns dict with user info (sub, id, email, name, picture)
 
 
 app = FastAPI(title="AI Personal Assistant API")
@@ -84,6 +82,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware) # No-op unless PROFILE_SECRET or PROFILE_SAMPLE_RATE is set
+instrument_sql()
 app.add_middleware(
     SessionMiddleware, 
     secret_key=get_safe_env("SECRET_KEY", "secret"), 
@@ -93,91 +94,67 @@ app.add_middleware(
 
 # Database
 @app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
-    create_meeting_db_and_tables()
-    
-    # Auto-Migration for user_email (since local script failed)
-    # This is a safe, idempotent operation to ensure columns exist
-    try:
-        from sqlmodel import text
-        with Session(engine) as session:
-            # 1. Add user_email to meeting if missing
-            try:
-                session.exec(text("ALTER TABLE meeting ADD COLUMN user_email VARCHAR(255);"))
-                session.commit()
-                print("Migration: Added user_email to meeting table.")
-            except Exception as e:
-                # Ignore if column exists (MySQL error 1060: Duplicate column name)
-                print(f"Migration Note (Meeting): {e}")
-
-            # 2. Add user_email to chathistory if missing
-            try:
-                session.exec(text("ALTER TABLE chathistory ADD COLUMN user_email VARCHAR(255);"))
-                session.commit()
-                print("Migration: Added user_email to chathistory table.")
-            except Exception as e:
-                print(f"Migration Note (ChatHistory): {e}")
-    except Exception as e:
-        print(f"Migration Failed: {e}")
-
-    # Auto-Migration for gmail_id (Deduplication)
-    try:
-        from sqlmodel import text
-        with Session(engine) as session:
-            try:
-                # Check if we need to purge duplicates first (Optional, but safer to just allow the column add to fail if needed, or we rely on the reset endpoint)
-                # But to enforce uniqueness, we often need to empty the table if it has bad data.
-                pass 
-                
-                # Add Column
-                session.exec(text("ALTER TABLE email ADD COLUMN gmail_id VARCHAR(255);"))
-                # Add Unique Index
-                session.exec(text("CREATE UNIQUE INDEX ix_email_gmail_id ON email (gmail_id);"))
-                
-                session.commit()
-                print("Migration: Added gmail_id to email table.")
-            except Exception as e:
-                print(f"Migration Note (Email gmail_id): {e}")
-
-            # 3. FIX BODY LENGTH (Data too long error)
-            try:
-                # Force column to be LONGTEXT to hold large emails
-                session.exec(text("ALTER TABLE email MODIFY COLUMN body LONGTEXT;"))
-                session.exec(text("ALTER TABLE email MODIFY COLUMN snippet TEXT;")) # Also snippet just in case
-                session.exec(text("ALTER TABLE email MODIFY COLUMN suggested_reply TEXT;")) # Fix for AI replies exceeding 255 chars
-                session.commit()
-                print("Migration: Updated email body/reply to LONGTEXT.")
-            except Exception as e:
-                print(f"Migration Note (Body Fix): {e}")
-
-    except Exception as e:
-        print(f"Email Migration Failed: {e}")
-
-# OAuth Setup
-oauth = OAuth()
-oauth.register(
-    name='google',
-    client_id=get_safe_env("GOOGLE_CLIENT_ID"),
-    client_secret=get_safe_env("GOOGLE_CLIENT_SECRET"),
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-    client_kwargs={
-        'scope': 'openid email profile https://www.googleapis.com/auth/gmail.readonly https://www.googleapis.com/auth/gmail.send',
-        'prompt': 'consent', # Force consent to get refresh token
-        'access_type': 'offline'
-    }
-)
+async def on_startup():
+    # One version check when the schema is current; DDL only runs when migrations are pending
+    await run_in_threadpool(ensure_schema, get_engine())
+    # Push events between workers when running under gunicorn
+    start_relay()
+    if APP_WARMUP:
+        await run_in_threadpool(warm_up)
+    # All routes exist by now; lets profiled requests find the threads running their endpoint
+    install_profiler(app)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    stop_relay()
+
+# OAuth Setup (authlib is only imported once someone logs in)
+_oauth = None
+
+def get_oauth():
+    global _oauth
+    if _oauth is None:
+        from authlib.integrations.starlette_client import OAuth
+        oauth = OAuth()
+        oauth.register(
+            name='google',
+            client_id=get_safe_env("GOOGLE_CLIENT_ID"),
+            client_secret=get_safe_env("GOOGLE_CLIENT_SECRET"),
+            server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+            client_kwargs={
+                'scope': 'openid email profile https://www.googleapis.com/auth/gmail.readonly https://www.googleapis.com/auth/gmail.send',
+                'prompt': 'consent', # Force consent to get refresh token
+                'access_type': 'offline'
+            }
+        )
+        _oauth = oauth
+    return _oauth
 
 # Initialize Agent
 current_dir = os.path.dirname(os.path.abspath(__file__))
 prompt_path = os.path.join(current_dir, "prompt.txt")
 
 try:
-    agent = MailAgent(prompt_path=prompt_path)
+    agent = MailAgent(prompt_path=prompt_path) # Cheap: models and the Gemini client load on first use
 except FileNotFoundError:
-    print(f"Warning: Prompt file not found at {prompt_path}")
+    logger.warning("Prompt file not found at %s", prompt_path)
     agent = None
 
+# Set APP_WARMUP to load everything lazy at startup instead of on the first request that needs it
+APP_WARMUP = env_bool("APP_WARMUP", False)
+
+def warm_up():
+    """
+    Loads the deferred dependencies: ML models, Gemini client, Google API client and OAuth.
+    Also run by gunicorn.conf.py in the master before forking, so workers share the result.
+    """
+    started = time.perf_counter()
+    if agent:
+        agent.warm_up()
+    get_oauth()
+    import googleapiclient.discovery # noqa: F401
+    logger.info("🔥 Warm-up done in %.2fs", time.perf_counter() - started)
+
 @app.get("/")
 def read_root():
     return {"message": "AI Personal Assistant API is running"}
@@ -194,10 +171,14 @@ async def login(request: Request):
             redirect_uri = redirect_uri.replace("http://", "https://")
             
     # Force offline access and consent to ensure we receive a refresh_token
-    return await oauth.google.authorize_redirect(request, redirect_uri, access_type='offline', prompt='consent')
+    return await get_oauth().google.authorize_redirect(request, redirect_uri, access_type='offline', prompt='consent')
 
 from .services import GmailService
 from .models import Email as EmailModel
+from .threads import latest_per_thread
+from .digests import rebuild_digests
+from .pagination import encode_cursor, before_cursor, clamp_limit
+from .chat_history import get_history_page, clear_history, should_compact, compact_history_job, remember_turns, should_fold, fold_memory_job
 
 @app.get("/auth/callback")
 async def auth(request: Request, session: Session = Depends(get_session)):
@@ -209,12 +190,11 @@ async def auth(request: Request, session: Session = Depends(get_session)):
             if "azurewebsites.net" in redirect_uri and redirect_uri.startswith("http://"):
                 redirect_uri = redirect_uri.replace("http://", "https://")
         
-        print(f"Debug - Callback Request URL: {request.url}")
-        print(f"Debug - Redirect URI used: {redirect_uri}")
+        logger.debug("Callback request URL: %s, redirect URI: %s", request.url, redirect_uri)
         
-        token = await oauth.google.authorize_access_token(request)
+        token = await get_oauth().google.authorize_access_token(request)
     except Exception as e:
-        print(f"Auth Error: {e}") # Debug print
+        logger.warning("Auth Error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
         
     user_info = token.get('userinfo')
@@ -234,16 +214,16 @@ async def auth(request: Request, session: Session = Depends(get_session)):
             session.add(user)
             session.commit()
             session.refresh(user)
-            
-        # GENERATE JWT
-        token_data = {
-            "sub": str(user.id),
-            "email": user.email,
-            "name": user.name,
-            "picture": user.avatar_url,
-            "google_token": token # Store Google Token inside JWT payload (or partial)
-        }
-        access_token = create_access_token(token_data)
+        elif (user.name, user.avatar_url) != (user_info['name'], user_info.get('picture')):
+            user.name = user_info['name']
+            user.avatar_url = user_info.get('picture')
+            session.add(user)
+            session.commit()
+            invalidate_user(user.id)
+
+        # Google tokens stay server-side; the JWT only identifies the user
+        store_google_token(session, user.id, token)
+        access_token = create_access_token(user.id)
     
         # Redirect to frontend with Token
         target_url = get_safe_env("FRONTEND_URL", "http://localhost:5173")
@@ -278,14 +258,33 @@ def analyze_email(request: EmailRequest):
     )
     return agent.analyze_email(email)
 
+@app.post("/api/analyze/bulk")
+async def analyze_bulk(request: Request, token: str = Depends(oauth2_scheme)):
+    """
+    Analyzes an NDJSON body of EmailRequest objects, one per line, streamed in and out: results come
+    back as NDJSON in input order, with progress lines and a final summary (see app/bulk.py).
+    """
+    # Like /api/events: authenticate up front so a long upload does not pin a DB connection
+    def authenticate():
+        with Session(get_engine()) as session:
+            return get_current_user_token(token, session)
+    await run_in_threadpool(authenticate)
+    if not agent:
+        raise HTTPException(status_code=500, detail="Agent not initialized (prompt file missing)")
+    return StreamingResponse(
+        analyze_ndjson(agent, request.stream(), EmailRequest),
+        media_type="application/x-ndjson",
+        headers=SSE_HEADERS,
+    )
+
 @app.post("/api/sync")
-def sync_emails(request: Request, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
-    google_token = user_data.get('google_token')
+def sync_emails(request: Request, background_tasks: BackgroundTasks, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
+    google_token = load_google_token(session, user_data['id'])
     if not google_token:
-        raise HTTPException(status_code=401, detail="No Google credentials in token")
+        raise HTTPException(status_code=401, detail="No Google credentials stored, please sign in again")
     
     # Get User DB object
-    user = session.exec(select(User).where(User.email == user_data['email'])).first()
+    user = session.get(User, user_data['id'])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -293,21 +292,84 @@ def sync_emails(request: Request, user_data: dict = Depends(get_current_user_tok
         raise HTTPException(status_code=500, detail="Agent not initialized")
 
     service = GmailService(session, agent)
+    started = time.perf_counter()
     count = service.fetch_recent_emails(user, google_token)
+    record_sync(count, time.perf_counter() - started)
+
+    if count:
+        bump_version("emails", user.email)
+
+        # Open tabs merge the new inbox rows instead of refetching the list
+        stmt = latest_per_thread(user.id, *EMAIL_LIST_COLUMNS).where(EmailModel.id.in_(service.new_email_ids))
+        items = [email_list_item(row) for row in session.exec(stmt).all()]
+        publish(user.email, "emails.new", {"items": jsonable_encoder(items)})
+
+        # Roll new mail up into daily/weekly digests after the response is sent
+        background_tasks.add_task(rebuild_digests, user.id, user.email)
     
     return {"message": f"Synced {count} new emails", "count": count}
 
+# Columns needed by the inbox list; body and suggested_reply are loaded on demand via /api/emails/{id}
+EMAIL_LIST_COLUMNS = (
+    EmailModel.id, EmailModel.thread_id, EmailModel.subject, EmailModel.sender, EmailModel.snippet,
+    EmailModel.received_time, EmailModel.summary, EmailModel.intent, EmailModel.urgency_score,
+    EmailModel.risk_level, EmailModel.priority, EmailModel.requires_action, EmailModel.is_read,
+    EmailModel.sentiment, EmailModel.tone,
+    (EmailModel.suggested_reply != None).label("has_suggested_reply"),
+)
+
+def email_list_item(row) -> dict:
+    item = dict(row._mapping)
+    item["thread_count"] = item["thread_count"] or 1
+    return item
+
 @app.get("/api/emails")
-def get_emails(user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
-    email = user_data['email']
-    user = session.exec(select(User).where(User.email == email)).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def get_emails(request: Request, cursor: Optional[str] = None, limit: int = 50, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
+    """
+    Inbox list, one row per thread, newest first. Pass the returned next_cursor to get the following page.
+    Conditional: unchanged pages return 304 without querying the email tables.
+    """
+    limit = clamp_limit(limit)
+    etag = data_etag("emails", user_data['email'], f"{cursor}|{limit}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    stmt = latest_per_thread(user_data['id'], *EMAIL_LIST_COLUMNS)
+    if cursor:
+        try:
+            stmt = stmt.where(before_cursor(EmailModel.received_time, EmailModel.id, cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-    # Fetch recent emails from DB
-    stmt = select(EmailModel).where(EmailModel.user_id == user.id).order_by(EmailModel.received_time.desc()).limit(50)
-    emails = session.exec(stmt).all()
-    return emails
+    # Fetch one extra row to know whether another page exists
+    stmt = stmt.order_by(EmailModel.received_time.desc(), EmailModel.id.desc()).limit(limit + 1)
+    rows = session.exec(stmt).all()
+
+    items = [email_list_item(row) for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.received_time, last.id)
+    return json_response(request, {"items": items, "next_cursor": next_cursor}, etag)
+
+@app.get("/api/emails/{email_id}")
+def get_email_detail(email_id: int, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
+    email = session.get(EmailModel, email_id)
+    if not email or email.user_id != user_data['id']:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return {**email.model_dump(), "body": email.body}
+
+@app.get("/api/threads/{thread_id}/emails")
+def get_thread_emails(thread_id: str, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
+    stmt = (
+        select(EmailModel)
+        .where(EmailModel.user_id == user_data['id'], EmailModel.thread_id == thread_id)
+        .order_by(EmailModel.received_time)
+        .options(selectinload(EmailModel.body_record))
+    )
+    return [{**e.model_dump(), "body": e.body} for e in session.exec(stmt).all()]
 
 class EmailSendRequest(BaseModel):
     to: str
@@ -316,11 +378,11 @@ class EmailSendRequest(BaseModel):
 
 @app.post("/api/send-email")
 def send_email_endpoint(email_request: EmailSendRequest, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
-    google_token = user_data.get('google_token')
+    google_token = load_google_token(session, user_data['id'])
     if not google_token:
-        raise HTTPException(status_code=401, detail="No Google credentials")
+        raise HTTPException(status_code=401, detail="No Google credentials stored, please sign in again")
 
-    user = session.exec(select(User).where(User.email == user_data['email'])).first()
+    user = session.get(User, user_data['id'])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -335,8 +397,7 @@ def send_email_endpoint(email_request: EmailSendRequest, user_data: dict = Depen
         raise HTTPException(status_code=500, detail=str(e))
 
 class ChatRequest(BaseModel):
-    message: str
-    conversation_history: Optional[list] = []
+    message: str # Conversation context is kept server-side (see chat_history.get_memory)
 
 # --- AI Agent Endpoints ---
 
@@ -355,73 +416,252 @@ async def rewrite_email(req: RewriteRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Server-Sent Events (streaming variants) ---
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Stop proxies from buffering the stream
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/api/events")
+async def event_stream_endpoint(request: Request, token: str = Depends(oauth2_scheme)):
+    """
+    Long-lived push channel for the signed-in user. Events:
+      ready            - sent once on connect
+      emails.new       - {"items": [...]} inbox rows stored by a sync, same shape as /api/emails
+      meetings.changed - the calendar was modified; refetch /api/meetings
+      job              - {"job", "status", ...} background job progress
+      resync           - events were dropped; refetch everything
+    """
+    # Resolve here rather than via get_session so the stream does not pin a DB connection
+    def authenticate():
+        with Session(get_engine()) as session:
+            return get_current_user_token(token, session)
+    user_data = await run_in_threadpool(authenticate)
+    user_email = user_data['email']
+
+    async def event_stream():
+        sub = broker.subscribe(user_email)
+        try:
+            yield sse_event("ready", {"heartbeat": HEARTBEAT_SECONDS})
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(sub.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n" # Keeps proxies from closing an idle connection
+                    continue
+                if sub.overflowed:
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.overflowed = False
+                    yield sse_event("resync", {})
+                    continue
+                yield sse_event(event, data or {})
+        finally:
+            broker.unsubscribe(user_email, sub)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/api/agent/rewrite/stream")
+def rewrite_email_stream(req: RewriteRequest):
+    """
+    Same as /api/agent/rewrite but forwards tokens as they are generated.
+    Emits 'token' events ({"text": ...}) followed by one 'done' event ({"result": full_text}).
+    """
+    if not agent:
+        raise HTTPException(status_code=500, detail="Agent not initialized")
+
+    def event_stream():
+        parts = []
+        if req.text:
+            for chunk in agent.rewrite_email_stream(req.text, req.style):
+                parts.append(chunk)
+                yield sse_event("token", {"text": chunk})
+        yield sse_event("done", {"result": "".join(parts).strip()})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 class QueryInboxRequest(BaseModel):
     query: str
 
+def save_chat_turn(session: Session, user_email: str, question: str, answer: str, asked_at: datetime):
+    answered_at = datetime.utcnow()
+    session.add(ChatHistory(sender="user", text=question, timestamp=asked_at, user_email=user_email))
+    session.add(ChatHistory(sender="agent", text=answer, timestamp=answered_at, user_email=user_email))
+    session.commit()
+    remember_turns(user_email, [("user", question, asked_at), ("agent", answer, answered_at)])
+
 @app.post("/api/agent/query_inbox")
-async def query_inbox(req: QueryInboxRequest, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
+async def query_inbox(req: QueryInboxRequest, background_tasks: BackgroundTasks, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
     try:
         from .rag_agent import InboxRAGAgent
-        from .models import ChatHistory # Import here to avoid circulars if any
-        import datetime
         
+        user_email = user_data['email']
+        asked_at = datetime.utcnow()
         rag_agent = InboxRAGAgent(session)
-        answer = rag_agent.query_inbox(req.query)
+        answer = rag_agent.query_inbox(user_data['id'], req.query)
         
         # Save to DB
-        user_email = user_data.get('email')
-        user_msg = ChatHistory(sender="user", text=req.query, timestamp=datetime.utcnow(), user_email=user_email)
-        agent_msg = ChatHistory(sender="agent", text=answer, timestamp=datetime.utcnow(), user_email=user_email)
-        session.add(user_msg)
-        session.add(agent_msg)
-        session.commit()
+        save_chat_turn(session, user_email, req.query, answer, asked_at)
+        if should_compact(user_email):
+            background_tasks.add_task(compact_history_job, user_email)
         
         return {"result": answer}
+    except HTTPException:
+        raise
     except Exception as e:
-         print(f"Query Error: {e}")
+         logger.exception("Query Error: %s", e)
          raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/agent/query_inbox/stream")
+def query_inbox_stream(req: QueryInboxRequest, background_tasks: BackgroundTasks, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
+    """
+    Streaming variant of /api/agent/query_inbox ('token' events, then 'done').
+    The full answer is persisted to ChatHistory once generation finishes.
+    """
+    from .rag_agent import InboxRAGAgent
+
+    # Do the DB retrieval up front; only generation happens while streaming
+    asked_at = datetime.utcnow()
+    user_email = user_data['email']
+    rag_agent = InboxRAGAgent(session)
+    prompt = rag_agent.build_prompt(user_data['id'], req.query)
+
+    def event_stream():
+        parts = []
+        for chunk in rag_agent.stream_answer(prompt):
+            parts.append(chunk)
+            yield sse_event("token", {"text": chunk})
+        answer = "".join(parts)
+        # The request-scoped session may already be closed by the time the stream ends
+        try:
+            with Session(get_engine()) as write_session:
+                save_chat_turn(write_session, user_email, req.query, answer, asked_at)
+        except Exception as e:
+            logger.warning("Query Stream Save Error: %s", e)
+        yield sse_event("done", {"result": answer})
+
+    if should_compact(user_email):
+        background_tasks.add_task(compact_history_job, user_email)
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS, background=background_tasks)
+
 @app.post("/api/meeting-agent/chat")
-def chat_with_meeting_agent(request: ChatRequest, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
+def chat_with_meeting_agent(request: ChatRequest, background_tasks: BackgroundTasks, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
     user_email = user_data['email']
     meeting_agent = MeetingAgent(session, user_email)
-    return meeting_agent.process_message(request.message, request.conversation_history)
+    result = meeting_agent.process_message(request.message)
+    if should_fold(user_email):
+        background_tasks.add_task(fold_memory_job, user_email)
+    if should_compact(user_email):
+        background_tasks.add_task(compact_history_job, user_email)
+    return result
 
 @app.get("/api/meetings")
-def get_all_meetings(user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
+def get_all_meetings(request: Request, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
+    """
+    Without a window: stored meetings, one row per recurring series (its first occurrence).
+    With start and end: every occurrence starting in the window, recurring series expanded.
+    Conditional like /api/emails.
+    """
+    user_email = user_data['email']
+    if start or end:
+        if not (start and end):
+            raise HTTPException(status_code=400, detail="Pass both start and end")
+        start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+        if end <= start or end - start > timedelta(days=MAX_MEETING_WINDOW_DAYS):
+            raise HTTPException(status_code=400, detail=f"Window must be positive and at most {MAX_MEETING_WINDOW_DAYS} days")
+
+    etag = data_etag("meetings", user_email, f"{start}|{end}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    if start:
+        return json_response(request, [{
+            "id": o.meeting_id,
+            "title": o.title,
+            "start_time": o.start,
+            "end_time": o.end,
+            "participants": o.participants,
+            "status": "scheduled",
+            "recurring": o.original_start is not None,
+            "occurrence_start": o.original_start,
+        } for o in occurrences_between(session, user_email, start, end)], etag)
+
     try:
-        user_email = user_data['email']
         stmt = select(Meeting).where(Meeting.user_email == user_email).order_by(Meeting.start_time)
         meetings = session.exec(stmt).all()
-        return meetings
+        return json_response(request, meetings, etag)
     except Exception as e:
-        print(f"ERROR FETCHING MEETINGS: {e}")
+        logger.exception("Error fetching meetings: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/meetings/free-slots")
+def get_free_slots(duration_minutes: int = 30, count: int = 3, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
+    """
+    Next `count` free slots of `duration_minutes` between start (default now) and end (default +7 days), within working hours.
+    """
+    if duration_minutes <= 0 or count <= 0:
+        raise HTTPException(status_code=400, detail="duration_minutes and count must be positive")
+    now = datetime.now()
+    start = max(start.replace(tzinfo=None) if start else now, now)
+    end = end.replace(tzinfo=None) if end else start + timedelta(days=7)
+    if end - start > timedelta(days=MAX_MEETING_WINDOW_DAYS):
+        raise HTTPException(status_code=400, detail=f"Window must be at most {MAX_MEETING_WINDOW_DAYS} days")
+    index = get_calendar_index(session, user_data['email'], start, end)
+    slots = find_free_slots(index, start, end, timedelta(minutes=duration_minutes), min(count, MAX_FREE_SLOTS))
+    return [{"start_time": s, "end_time": e} for s, e in slots]
+
 @app.get("/api/chat/history")
-def get_chat_history(user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
+def get_chat_history(request: Request, cursor: Optional[str] = None, limit: int = 50, user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
+    """
+    Newest page of chat turns (chronological within the page). Pass next_cursor to load older turns.
+    'summary' is the rolling conversation memory (older turns, including those removed by retention).
+    Conditional like /api/emails.
+    """
     user_email = user_data['email']
-    stmt = select(ChatHistory).where(ChatHistory.user_email == user_email).order_by(ChatHistory.timestamp)
-    history = session.exec(stmt).all()
-    return history
+    etag = data_etag("chat", user_email, f"{cursor}|{limit}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    try:
+        return json_response(request, get_history_page(session, user_email, cursor, limit), etag)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/api/chat/history")
 def clear_chat_history(user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_meeting_session)):
     user_email = user_data['email']
-    stmt = select(ChatHistory).where(ChatHistory.user_email == user_email)
-    history = session.exec(stmt).all()
-    for h in history:
-        session.delete(h)
-    session.commit()
+    clear_history(session, user_email)
     return {"message": "Chat history cleared"}
 
 @app.delete("/api/meetings/{meeting_id}")
-def delete_meeting_endpoint(meeting_id: int, session: Session = Depends(get_meeting_session)):
+def delete_meeting_endpoint(meeting_id: int, date: Optional[str] = None, session: Session = Depends(get_meeting_session)):
+    """
+    Deletes a meeting (a whole series for recurring ones). With ?date=YYYY-MM-DD on a
+    recurring meeting only that day's occurrence is cancelled.
+    """
     meeting = session.get(Meeting, meeting_id)
     if not meeting:
         raise HTTPException(status_code=404, detail="Meeting not found")
+    if date and meeting.recurrence_rule:
+        try:
+            on_date = datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+        if not cancel_occurrence(session, meeting, on_date):
+            raise HTTPException(status_code=404, detail="No occurrence on that date")
+        session.commit()
+        invalidate_calendar(meeting.user_email)
+        return {"message": "Occurrence cancelled"}
+
+    session.exec(delete(MeetingException).where(MeetingException.meeting_id == meeting_id))
     session.delete(meeting)
     session.commit()
+    invalidate_calendar(meeting.user_email)
     return {"message": "Meeting deleted"}
 
     return {"message": "Meeting deleted"}
@@ -429,22 +669,52 @@ def delete_meeting_endpoint(meeting_id: int, session: Session = Depends(get_meet
 @app.post("/api/admin/reset-emails")
 def reset_emails_endpoint(user_data: dict = Depends(get_current_user_token), session: Session = Depends(get_session)):
     """
-    Emergency Endpoint to wipe emails and enforce clean slate + Schema Fix.
+    Emergency Endpoint to wipe emails and start from a clean slate.
+    Schema changes are handled by app/migrations, not here.
     """
     try:
         from sqlmodel import text
-        # 1. WIPE ALL EMAILS
+        # WIPE ALL EMAILS (and everything derived from them)
+        session.exec(text("DELETE FROM emailbody"))
         session.exec(text("DELETE FROM email"))
-        
-        # 2. FORCE SCHEMA MIGRATION (Add gmail_id if missing)
-        try:
-            session.exec(text("ALTER TABLE email ADD COLUMN gmail_id VARCHAR(255);"))
-            session.exec(text("CREATE UNIQUE INDEX ix_email_gmail_id ON email (gmail_id);"))
-            print("Reset: Added gmail_id column.")
-        except Exception as e:
-            print(f"Reset: Column might already exist ({e})")
+        session.exec(text("DELETE FROM emailthread"))
+        session.exec(text("DELETE FROM digest"))
 
         session.commit()
-        return {"message": "✅ Database Wiped & Schema Fixed. You can now Sync."}
+        bump_version("emails")
+        return {"message": "✅ Database Wiped. You can now Sync."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def require_metrics_token(request: Request):
+    """
+    Gate for the operator-only /api/internal endpoints: 'Authorization: Bearer <METRICS_TOKEN>'.
+    They 404 unless METRICS_TOKEN is set.
+    """
+    expected = get_safe_env("METRICS_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {expected}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+@app.get("/api/internal/db-stats", dependencies=[Depends(require_metrics_token)])
+def db_stats():
+    """
+    Connection pool utilization and checkout wait times for this worker process.
+    """
+    return get_pool_stats()
+
+@app.get("/api/internal/metrics", dependencies=[Depends(require_metrics_token)])
+def metrics_endpoint():
+    """
+    Prometheus scrape endpoint (all workers aggregated), behind the METRICS_TOKEN gate.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/api/internal/llm-stats", dependencies=[Depends(require_metrics_token)])
+def llm_stats():
+    """
+    Prompt-prefix cache hits, misses, refreshes and failures for this worker process.
+    """
+    return PROMPT_CACHE.stats()
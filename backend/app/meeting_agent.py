@@ -1,25 +1,38 @@
 import json
 import datetime
-import os
-from typing import Dict, Any, List, Optional
+import logging
+from typing import Dict, Any, Optional
+from sqlalchemy import delete
 from sqlmodel import Session, select
-from google import genai
-from .meeting_models import Meeting
+from .meeting_models import Meeting, MeetingException
 from .models import ChatHistory
+from .chat_history import get_memory, remember_turns
+from .calendar_index import get_index, invalidate, find_free_slots, MAX_FREE_SLOTS, MAX_MEETING_WINDOW_DAYS
+from .meeting_parser import parse_command
+from .llm import generate, get_client
+from .logs import sampled
+from .recurrence import Series, prepare_series, occurrences_between, cancel_occurrence, move_occurrence
+
+logger = logging.getLogger(__name__)
+
+# New recurring series are conflict-checked over this horizon instead of their whole span
+RECURRING_CONFLICT_HORIZON_DAYS = 90
+
+def like_pattern(text: str) -> str:
+    """
+    Case-insensitive "contains" pattern for ilike(..., escape="\\"): % and _ in the text match literally.
+    """
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
 
 class MeetingAgent:
     def __init__(self, session: Session, user_email: str):
         self.session = session
         self.user_email = user_email
         
-        # Configure Gemini Client
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            print("Error: GEMINI_API_KEY not found.")
-            self.client = None
-        else:
-            self.client = genai.Client(api_key=api_key)
-            
+        # Shared Gemini client (None without GEMINI_API_KEY)
+        self.client = get_client()
+
         # Model definitions should be used in generate_content, ensuring we use a supported model
         self.model_name = "gemini-2.5-flash"
 
@@ -27,21 +40,20 @@ class MeetingAgent:
         You are an intelligent AI Meeting Scheduling Agent that acts as a personal assistant.
         Your responsibility is to create, assign, check, update, and cancel meetings based strictly on natural language user input.
 
-        Current Date: {current_date}
-
         You must return a JSON object with the following structure:
-        {{
+        {
             "thought_process": "Short reasoning",
-            "intent": "CREATE_MEETING" | "CHECK_MEETING" | "UPDATE_MEETING" | "DELETE_MEETING" | "GENERAL_QUERY" | "EXIT_TASK" | "ASK_INFO",
+            "intent": "CREATE_MEETING" | "CHECK_MEETING" | "UPDATE_MEETING" | "DELETE_MEETING" | "FIND_SLOTS" | "GENERAL_QUERY" | "EXIT_TASK" | "ASK_INFO",
             "response_text": "Natural language response to the user",
-            "action_payload": {{ ... details for action ... }}
-        }}
+            "action_payload": { ... details for action ... }
+        }
 
         ACTION PAYLOADS:
-        - CREATE_MEETING: {{ "title": "...", "start_time": "YYYY-MM-DD HH:MM:SS", "end_time": "YYYY-MM-DD HH:MM:SS", "participants": "..." }}
-        - UPDATE_MEETING: {{ "original_meeting_id": null, "new_end_time": "...", "new_start_time": "..." }} 
-        - CHECK_MEETING: {{ "date": "YYYY-MM-DD" }}
-        - DELETE_MEETING: {{ "meeting_titles": ["Title1", "Title2"] }} 
+        - CREATE_MEETING: { "title": "...", "start_time": "YYYY-MM-DD HH:MM:SS", "end_time": "YYYY-MM-DD HH:MM:SS", "participants": "...", "recurrence": null }
+        - UPDATE_MEETING: { "original_meeting_id": null, "new_end_time": "...", "new_start_time": "...", "occurrence_date": null } 
+        - CHECK_MEETING: { "date": "YYYY-MM-DD" }
+        - DELETE_MEETING: { "meeting_titles": ["Title1", "Title2"], "date": null } 
+        - FIND_SLOTS: { "duration_minutes": 30, "range_start": "YYYY-MM-DD HH:MM:SS", "range_end": "YYYY-MM-DD HH:MM:SS", "count": 3 }
 
         RULES:
         1. If missing info for creation (date, time), intent = ASK_INFO.
@@ -49,21 +61,97 @@ class MeetingAgent:
         3. For DELETE_MEETING, provide the titles of the meetings to cancel in 'meeting_titles'. If user says "delete all" or "both", list them or try to identify them from context.
         4. If the user wants to perform TWO actions (e.g. "Delete X and Schedule Y"), prioritize the DELETE action first, and in your response ask for confirmation to proceed with creation. DO NOT attempt to do both.
         5. Be professional and helpful.
+        6. If the user asks when they are free or for available times, intent = FIND_SLOTS. Default count 3, default range the next 7 days.
+        7. For repeating meetings ("every Monday", "daily standup"), set "recurrence" to an iCalendar RRULE such as "FREQ=WEEKLY;BYDAY=MO" or "FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR;COUNT=20". start_time/end_time are the first occurrence. Only DAILY, WEEKLY, MONTHLY and YEARLY are supported.
+        8. To cancel or move a single occurrence of a repeating meeting, set "date" (DELETE_MEETING) or "occurrence_date" (UPDATE_MEETING) to that occurrence's date "YYYY-MM-DD". Leave them null to change the whole series.
+        """
+
+    def process_message(self, user_message: str) -> Dict[str, Any]:
+        """
+        Processes the user message and returns a response and action. Unambiguous
+        schedule checks and cancellations are parsed locally; everything else goes to Gemini
+        with the server-side conversation memory.
+        """
+        data = self._fast_path(user_message)
+        if data is None:
+            data = self._ask_llm(user_message)
+            if data.get("action") == "ERROR":
+                return data
+
+        intent = data.get("intent")
+        response_text = data.get("response_text")
+        payload = data.get("action_payload", {})
+        
+        # Execute Action
+        if intent == "CREATE_MEETING":
+            result = self._create_meeting(payload)
+            if result: response_text = result 
+            
+        elif intent == "CHECK_MEETING":
+            check_date = payload.get("date")
+            result_text = self._check_meetings(check_date)
+            response_text = result_text 
+            
+        elif intent == "UPDATE_MEETING":
+            result = self._update_last_meeting(payload)
+            if result: response_text = result
+
+        elif intent == "DELETE_MEETING":
+            result = self._delete_meetings(payload)
+            if result: response_text = result
+
+        elif intent == "FIND_SLOTS":
+            result = self._find_slots(payload)
+            if result: response_text = result
+
+        # Persist Chat History
+        turns = [ChatHistory(sender="user", text=user_message, user_email=self.user_email),
+                 ChatHistory(sender="agent", text=response_text, user_email=self.user_email)]
+        remembered = [(t.sender, t.text, t.timestamp) for t in turns]
+        self.session.add_all(turns)
+        self.session.commit()
+        remember_turns(self.user_email, remembered)
+
+        return {"response": response_text, "action": intent}
+
+    def _fast_path(self, user_message: str) -> Optional[Dict[str, Any]]:
         """
+        Local parse of high-frequency commands. Cancellations only take the fast path when the
+        title matches exactly one scheduled meeting (one dated occurrence, for a series); anything
+        that would delete several meetings or a whole series goes to the LLM.
+        """
+        parsed = parse_command(user_message)
+        if parsed is None:
+            return None
+        if parsed["intent"] == "DELETE_MEETING":
+            payload = parsed["action_payload"]
+            stmt = select(Meeting).where(
+                Meeting.user_email == self.user_email,
+                Meeting.status == "scheduled",
+                Meeting.title.ilike(like_pattern(payload["meeting_titles"][0]), escape="\\")
+            ).limit(2)
+            matches = self.session.exec(stmt).all()
+            if len(matches) != 1:
+                return None
+            meeting, on_date = matches[0], payload.get("date")
+            if meeting.recurrence_rule:
+                if not on_date:
+                    return None
+            elif on_date and meeting.start_time.date().isoformat() != on_date:
+                return None
+        logger.debug("⚡ MeetingAgent fast path: %s %s", parsed['intent'], parsed['action_payload'])
+        return {"thought_process": "Parsed locally", "response_text": None, **parsed}
 
-    def process_message(self, user_message: str, conversation_history: List[Dict[str, str]] = []) -> Dict[str, Any]:
+    def _ask_llm(self, user_message: str) -> Dict[str, Any]:
         """
-        Processes the user message using Gemini and returns a response and action.
+        Gemini round trip. Returns the parsed JSON decision, or an {"response", "action": "ERROR"} result.
         """
         current_date_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # Construct Prompt
-        full_prompt = f"System: {self.system_prompt.format(current_date=current_date_str)}\n\n"
-        
-        for msg in conversation_history[-6:]:
-            role = "User" if msg.get("sender") == "user" else "Assistant"
-            full_prompt += f"{role}: {msg.get('text')}\n"
-            
+        # self.system_prompt is static and served from the prompt cache; the date and memory vary per call
+        full_prompt = f"Current Date: {current_date_str}\n\n"
+        full_prompt += get_memory(self.session, self.user_email).render()
         full_prompt += f"User: {user_message}\nAssistant:"
 
         import time
@@ -81,19 +169,18 @@ class MeetingAgent:
                 ]
                 
                 if self.client:
-                    response = self.client.models.generate_content(
-                        model=self.model_name,
-                        contents=full_prompt,
+                    response = generate(
+                        self.client, self.model_name, self.system_prompt, full_prompt,
                         config={
                             'response_mime_type': 'application/json',
                             'safety_settings': safety_settings
-                        }
+                        },
+                        agent="meeting"
                     )
                 else:
                     raise Exception("Gemini Client not initialized")
                 
-                # Debug: Print raw response
-                print(f"DEBUG LLM Raw Response: {response.text}")
+                logger.debug("LLM raw response: %s", response.text, extra=sampled())
                 
                 content = response.text
                 content = content.replace("```json", "").replace("```", "").strip()
@@ -107,52 +194,25 @@ class MeetingAgent:
                     break # Success, exit retry loop
                     
                 except json.JSONDecodeError:
-                    print("JSON Decode Failed. Raw content:", content)
+                    logger.warning("JSON Decode Failed. Raw content: %s", content)
                     return {"response": "I understood, but I'm having trouble processing the details internally. Could you say that again?", "action": "ERROR"}
 
             except Exception as e:
                  error_str = str(e)
                  if "429" in error_str or "quota" in error_str.lower():
-                     print(f"⚠️ MeetingAgent Quota Handler: Hit 429. Waiting {delay}s (Attempt {attempt+1}/{retries})...")
+                     logger.warning("⚠️ MeetingAgent Quota Handler: Hit 429. Waiting %ss (Attempt %d/%d)...", delay, attempt + 1, retries)
                      time.sleep(delay)
                      delay *= 2 
                  else:
-                     print(f"LLM Error: {e}")
+                     logger.error("LLM Error: %s", e)
                      return {"response": "I'm having trouble connecting to my brain right now. Please try again.", "action": "ERROR"}
         
         else:
              # Loop completed without break = failed all retries
-             print("❌ MeetingAgent Quota Retries Exhausted.")
+             logger.error("❌ MeetingAgent Quota Retries Exhausted.")
              return {"response": "I'm currently overwhelmed with requests. Please try again in a minute.", "action": "ERROR"}
-            
-        intent = data.get("intent")
-        response_text = data.get("response_text")
-        payload = data.get("action_payload", {})
-        
-        # Execute Action
-        if intent == "CREATE_MEETING":
-            result = self._create_meeting(payload)
-            if result: response_text = result 
-            
-        elif intent == "CHECK_MEETING":
-            check_date = payload.get("date")
-            result_text = self._check_meetings(check_date)
-            response_text = result_text 
-            
-        elif intent == "UPDATE_MEETING":
-            result = self._update_last_meeting(payload)
-            if result: response_text = result
-
-        elif intent == "DELETE_MEETING":
-            result = self._delete_meetings(payload)
-            if result: response_text = result
-
-        # Persist Chat History
-        self.session.add(ChatHistory(sender="user", text=user_message, user_email=self.user_email))
-        self.session.add(ChatHistory(sender="agent", text=response_text, user_email=self.user_email))
-        self.session.commit()
 
-        return {"response": response_text, "action": intent}
+        return data
 
 
 
@@ -165,20 +225,33 @@ class MeetingAgent:
             
             start_dt = datetime.datetime.strptime(start_str, "%Y-%m-%d %H:%M:%S")
             end_dt = datetime.datetime.strptime(end_str, "%Y-%m-%d %H:%M:%S") if end_str else start_dt + datetime.timedelta(hours=1)
-            
-            # Check for conflicts
-            # Overlap if: (StartA < EndB) and (EndA > StartB)
-            stmt = select(Meeting).where(
-                Meeting.user_email == self.user_email,
-                Meeting.status == "scheduled",
-                Meeting.start_time < end_dt,
-                Meeting.end_time > start_dt
-            )
-            conflicts = self.session.exec(stmt).all()
-            
-            if conflicts:
-                conflict_titles = [m.title for m in conflicts]
-                return f"⚠️ Conflict detected! You already have {len(conflicts)} meeting(s) scheduled at that time: {', '.join(conflict_titles)}. Please choose a different time."
+
+            recurrence = payload.get("recurrence")
+            recurrence_end = None
+            if recurrence:
+                try:
+                    recurrence, start_dt, end_dt, recurrence_end = prepare_series(recurrence, start_dt, end_dt)
+                except ValueError as e:
+                    return f"I couldn't set up that repeating meeting: {e}."
+
+                # Expand only the new series' near-term occurrences and probe the index with each
+                series = Series(None, title, participants, start_dt, end_dt, recurrence, recurrence_end)
+                horizon = start_dt + datetime.timedelta(days=RECURRING_CONFLICT_HORIZON_DAYS)
+                index = get_index(self.session, self.user_email, start_dt, horizon)
+                clashes = []
+                for occ in series.occurrences(start_dt, horizon):
+                    clashes.extend((occ.start, m.title) for m in index.overlapping(occ.start, occ.end))
+                if clashes:
+                    listed = ", ".join(f"{t} ({d.strftime('%b %d')})" for d, t in clashes[:5])
+                    more = f" and {len(clashes) - 5} more" if len(clashes) > 5 else ""
+                    return f"⚠️ Conflict detected! This series overlaps {len(clashes)} existing meeting(s): {listed}{more}. Please choose a different time."
+            else:
+                # Check for conflicts against the cached per-user interval index
+                conflicts = get_index(self.session, self.user_email, start_dt, end_dt).overlapping(start_dt, end_dt)
+
+                if conflicts:
+                    conflict_titles = [m.title for m in conflicts]
+                    return f"⚠️ Conflict detected! You already have {len(conflicts)} meeting(s) scheduled at that time: {', '.join(conflict_titles)}. Please choose a different time."
 
             new_meeting = Meeting(
                 title=title,
@@ -186,33 +259,38 @@ class MeetingAgent:
                 end_time=end_dt,
                 participants=participants,
                 status="scheduled",
-                user_email=self.user_email
+                user_email=self.user_email,
+                recurrence_rule=recurrence or None,
+                recurrence_end=recurrence_end
             )
             self.session.add(new_meeting)
             self.session.commit()
+            invalidate(self.user_email)
             start_fmt = start_dt.strftime('%I:%M %p')
+            if recurrence:
+                return f"Scheduled recurring meeting: {title} ({recurrence}), starting {start_dt.date()} at {start_fmt}."
             return f"Scheduled: {title} on {start_dt.date()} at {start_fmt}."
         except Exception as e:
-            print(f"Create Error: {e}")
+            logger.error("Create Error: %s", e)
             return None 
 
     def _check_meetings(self, date_str):
         try:
             if not date_str: date_str = datetime.date.today().isoformat()
             target_date = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+            day_start = datetime.datetime.combine(target_date, datetime.time.min)
             
-            stmt = select(Meeting).where(Meeting.user_email == self.user_email, Meeting.status == "scheduled")
-            all_meetings = self.session.exec(stmt).all()
-            day_meetings = [m for m in all_meetings if m.start_time.date() == target_date]
+            day_meetings = occurrences_between(self.session, self.user_email, day_start, day_start + datetime.timedelta(days=1))
             
             if not day_meetings:
                  return f"Your schedule looks clear for {target_date.strftime('%A, %B %d')}."
             
             resp = f"Here is your schedule for {target_date.strftime('%A, %B %d')}:\n"
             for m in day_meetings:
-                start_str = m.start_time.strftime("%I:%M %p")
-                end_str = m.end_time.strftime("%I:%M %p")
-                resp += f"• {m.title} ({start_str} - {end_str})\n"
+                start_str = m.start.strftime("%I:%M %p")
+                end_str = m.end.strftime("%I:%M %p")
+                repeat = " 🔁" if m.original_start else ""
+                resp += f"• {m.title} ({start_str} - {end_str}){repeat}\n"
             return resp
         except Exception as e:
             return "I couldn't check the calendar."
@@ -222,14 +300,22 @@ class MeetingAgent:
             stmt = select(Meeting).where(Meeting.user_email == self.user_email).order_by(Meeting.created_at.desc()).limit(1)
             last_meeting = self.session.exec(stmt).first()
             if not last_meeting: return "No meeting found to update."
+
+            if last_meeting.recurrence_rule and payload.get("occurrence_date"):
+                return self._move_occurrence(last_meeting, payload)
             
             if payload.get("new_end_time"):
                  last_meeting.end_time = datetime.datetime.strptime(payload.get("new_end_time"), "%Y-%m-%d %H:%M:%S")
             if payload.get("new_start_time"):
                  last_meeting.start_time = datetime.datetime.strptime(payload.get("new_start_time"), "%Y-%m-%d %H:%M:%S")
-                 
+            if last_meeting.recurrence_rule:
+                 # Re-anchor the whole series on its new first occurrence
+                 _, last_meeting.start_time, last_meeting.end_time, last_meeting.recurrence_end = prepare_series(
+                     last_meeting.recurrence_rule, last_meeting.start_time, last_meeting.end_time)
+
             self.session.add(last_meeting)
             self.session.commit()
+            invalidate(self.user_email)
             return f"Updated {last_meeting.title}."
         except:
             return None
@@ -241,6 +327,7 @@ class MeetingAgent:
         """
         try:
             titles = payload.get("meeting_titles", [])
+            on_date = datetime.datetime.strptime(payload["date"], "%Y-%m-%d").date() if payload.get("date") else None
             
             # Handle string input just in case
             if isinstance(titles, str):
@@ -254,16 +341,24 @@ class MeetingAgent:
                     # Case-insensitive partial match
                     stmt = select(Meeting).where(
                         Meeting.user_email == self.user_email, 
-                        Meeting.title.ilike(f"%{title_query}%"), 
+                        Meeting.title.ilike(like_pattern(title_query), escape="\\"),
                         Meeting.status == "scheduled"
                     )
                     matches = self.session.exec(stmt).all()
                     
                     for m in matches:
-                        self.session.delete(m)
-                        deleted_names.append(m.title)
+                        if on_date and m.recurrence_rule:
+                            # Cancel just that occurrence; the series stays
+                            if cancel_occurrence(self.session, m, on_date):
+                                deleted_names.append(f"{m.title} on {on_date.strftime('%b %d')}")
+                        elif on_date and m.start_time.date() != on_date:
+                            continue
+                        else:
+                            self._delete_meeting(m)
+                            deleted_names.append(m.title)
                 
                 self.session.commit()
+                invalidate(self.user_email)
                 if deleted_names:
                     return f"Successfully cancelled: {', '.join(deleted_names)}."
                 else:
@@ -273,12 +368,59 @@ class MeetingAgent:
                 stmt = select(Meeting).where(Meeting.user_email == self.user_email, Meeting.status == "scheduled").order_by(Meeting.created_at.desc()).limit(1)
                 last = self.session.exec(stmt).first()
                 if last:
-                    self.session.delete(last)
+                    self._delete_meeting(last)
                     self.session.commit()
+                    invalidate(self.user_email)
                     return f"Cancelled your last scheduled meeting: {last.title}."
                 else:
                     return "You have no scheduled meetings to cancel."
 
         except Exception as e:
-            print(f"Delete Error: {e}")
+            logger.error("Delete Error: %s", e)
             return "Failed to cancel the meeting(s) due to an error."
+
+    def _delete_meeting(self, meeting: Meeting):
+        if meeting.recurrence_rule:
+            self.session.exec(delete(MeetingException).where(MeetingException.meeting_id == meeting.id))
+        self.session.delete(meeting)
+
+    def _move_occurrence(self, meeting: Meeting, payload) -> Optional[str]:
+        on_date = datetime.datetime.strptime(payload["occurrence_date"], "%Y-%m-%d").date()
+        day_start = datetime.datetime.combine(on_date, datetime.time.min)
+        occurrences = Series.from_meeting(meeting).occurrences(day_start, day_start + datetime.timedelta(days=1))
+        if not occurrences:
+            return f"{meeting.title} doesn't occur on {on_date.strftime('%A, %B %d')}."
+
+        occ = occurrences[0]
+        new_start = datetime.datetime.strptime(payload["new_start_time"], "%Y-%m-%d %H:%M:%S") if payload.get("new_start_time") else occ.start
+        new_end = datetime.datetime.strptime(payload["new_end_time"], "%Y-%m-%d %H:%M:%S") if payload.get("new_end_time") else new_start + (occ.end - occ.start)
+        move_occurrence(self.session, meeting, occ.original_start, new_start, new_end)
+        self.session.commit()
+        invalidate(self.user_email)
+        return f"Moved the {on_date.strftime('%b %d')} occurrence of {meeting.title} to {new_start.strftime('%b %d %I:%M %p')}."
+
+    def free_slots(self, start: datetime.datetime, end: datetime.datetime, duration_minutes: int = 30, count: int = 3):
+        index = get_index(self.session, self.user_email, start, end)
+        return find_free_slots(index, start, end, datetime.timedelta(minutes=duration_minutes), count)
+
+    def _find_slots(self, payload) -> str:
+        try:
+            duration = int(payload.get("duration_minutes") or 30)
+            count = min(int(payload.get("count") or 3), MAX_FREE_SLOTS)
+            now = datetime.datetime.now()
+            start = datetime.datetime.strptime(payload["range_start"], "%Y-%m-%d %H:%M:%S") if payload.get("range_start") else now
+            end = datetime.datetime.strptime(payload["range_end"], "%Y-%m-%d %H:%M:%S") if payload.get("range_end") else start + datetime.timedelta(days=7)
+            start = max(start, now)
+            end = min(end, start + datetime.timedelta(days=MAX_MEETING_WINDOW_DAYS))
+
+            slots = self.free_slots(start, end, duration, count)
+            if not slots:
+                return f"I couldn't find a free {duration}-minute slot between {start.strftime('%b %d %I:%M %p')} and {end.strftime('%b %d %I:%M %p')}."
+
+            resp = f"Here are your next free {duration}-minute slots:\n"
+            for s_start, s_end in slots:
+                resp += f"• {s_start.strftime('%A, %B %d')} {s_start.strftime('%I:%M %p')} - {s_end.strftime('%I:%M %p')}\n"
+            return resp
+        except Exception as e:
+            logger.error("Find Slots Error: %s", e)
+            return None
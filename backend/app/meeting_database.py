@@ -1,37 +1,9 @@
-from sqlmodel import SQLModel, create_engine, Session
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-from sqlmodel import SQLModel, create_engine, Session
-
-# Default to SQLite if DB_HOST not set, but prefer MySQL
-db_host = os.getenv("DB_HOST", "localhost")
-db_port = os.getenv("DB_PORT", "3306")
-db_user = os.getenv("DB_USER", "root")
-db_password = os.getenv("DB_PASSWORD", "")
-db_name = os.getenv("DB_NAME", "agent_db") # Using same DB for now/simplicity
-
-mysql_url = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-
-# SSL Configuration
-connect_args = {"use_pure": True}
-ssl_ca = os.getenv("SSL_CA")
-
-if ssl_ca and not os.path.exists(ssl_ca):
-    candidate = os.path.join(os.path.dirname(__file__), "..", os.path.basename(ssl_ca))
-    if os.path.exists(candidate):
-        ssl_ca = candidate
-
-if ssl_ca:
-    connect_args["ssl_ca"] = ssl_ca
-    connect_args["ssl_verify_cert"] = True
-
-engine = create_engine(mysql_url, echo=True, connect_args=connect_args)
+# Meetings live in the same MySQL database as everything else, so they share
+# the single engine (and connection pool) defined in database.py.
+from .database import create_db_and_tables, get_session
 
 def create_meeting_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    create_db_and_tables()
 
 def get_meeting_session():
-    with Session(engine) as session:
-        yield session
+    yield from get_session()
@@ -1,8 +1,12 @@
 from typing import Optional
 from sqlmodel import Field, SQLModel
+from sqlalchemy import Index, UniqueConstraint
 from datetime import datetime
 
 class Meeting(SQLModel, table=True):
+    # Backs date-range schedule queries: WHERE user_email = ? AND status = 'scheduled' AND start_time BETWEEN ...
+    __table_args__ = (Index("ix_meeting_user_status_start", "user_email", "status", "start_time"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str = Field(description="Purpose or title of the meeting")
     start_time: datetime = Field(description="Start time of the meeting")
@@ -11,5 +15,20 @@ class Meeting(SQLModel, table=True):
     status: str = Field(default="scheduled", description="Status: scheduled, cancelled")
     user_email: str = Field(index=True, default=None, nullable=True) # Data isolation
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Recurring series are stored once: start_time/end_time hold the first occurrence
+    recurrence_rule: Optional[str] = Field(default=None, max_length=255, description="iCalendar RRULE, e.g. FREQ=WEEKLY;BYDAY=MO")
+    recurrence_end: Optional[datetime] = Field(default=None, description="Start of the last occurrence; None if open-ended")
+
+class MeetingException(SQLModel, table=True):
+    """
+    One occurrence of a recurring meeting that was cancelled (new_start is None) or moved.
+    """
+    __table_args__ = (UniqueConstraint("meeting_id", "original_start"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    meeting_id: int = Field(foreign_key="meeting.id", index=True)
+    original_start: datetime = Field(description="Start the occurrence would have had")
+    new_start: Optional[datetime] = Field(default=None)
+    new_end: Optional[datetime] = Field(default=None)
 
 
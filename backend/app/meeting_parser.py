@@ -0,0 +1,220 @@
+import re
+import datetime
+from typing import Any, Dict, Optional
+
+# Rule-based parser for the high-frequency meeting commands ("what's on tomorrow?",
+# "cancel standup"). Anything it is not sure about returns None and goes to the LLM.
+
+MAX_WORDS = 12
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+MONTH_PATTERN = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*"
+
+# Sentinel for "there is a date expression but we can't resolve it confidently"
+AMBIGUOUS = object()
+
+DATE_EXPRESSIONS = [
+    r"\bday after tomorrow\b",
+    r"\b(?:today|tonight|tomorrow|tmrw|yesterday)\b",
+    r"\bin \d{1,2} days?\b",
+    r"\b(?:(?:this|next|last|on)\s+)?(?:" + "|".join(WEEKDAYS) + r")\b",
+    r"\b\d{4}-\d{2}-\d{2}\b",
+    r"\b" + MONTH_PATTERN + r"\s+\d{1,2}(?:st|nd|rd|th)?\b",
+    r"\b\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?" + MONTH_PATTERN + r"\b",
+]
+DATE_RE = re.compile("|".join(f"(?:{p})" for p in DATE_EXPRESSIONS))
+
+# Date-like text left over once the expressions above are removed: the message names a date
+# the parser can't read ("10/23", "the 23rd", "in two days", "christmas"), so it must not
+# default to today
+NUMBER_WORDS = [
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve",
+    "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen", "twenty", "thirty",
+    "first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth",
+    "eleventh", "twelfth", "thirteenth", "fourteenth", "fifteenth", "sixteenth", "seventeenth",
+    "eighteenth", "nineteenth", "twentieth", "thirtieth", "couple", "few", "several",
+]
+UNREAD_DATE_RE = re.compile(
+    r"\d"
+    r"|\b(?:" + "|".join(NUMBER_WORDS) + r")\b"
+    r"|\b(?:mon|tues?|wed|thu|thurs?|fri|sat|sun)(?:day)?s?\b"
+    r"|\b(?:" + "|".join(MONTHS) + r"|jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec)\b"
+    r"|\b(?:ago|last|past|previous|coming|upcoming|later|earlier|eve|holidays?|christmas|xmas|easter|"
+    r"thanksgiving|halloween|new year'?s?|birthday|anniversary|date)\b"
+)
+
+# Ranges, times and multi-day spans are left to the LLM
+RANGE_RE = re.compile(r"\b(?:week|weekend|month|year|until|between|from|after|before|next few|at)\b|\d\s*(?:am|pm)\b|\d:\d{2}")
+SCHEDULE_RE = re.compile(r"\b(?:meetings?|schedule|calendar|agenda|plans?|events?|appointments?)\b|\bwhat(?:'s| is) on\b|\bwhat do i have\b|\banything on\b|\bam i busy\b")
+NOT_A_CHECK_RE = re.compile(
+    r"\b(?:book|set up|setup|create|add|arrange|organi[sz]e|move|reschedule|postpone|push|cancel|delete|remove|"
+    r"update|change|extend|shorten|free|available|availability|slots?|invite|every|repeat|weekly|daily|who|why|how)\b"
+    r"|\bschedule\s+(?:a|an|me|it|one|another|the|my)\b"
+)
+DELETE_RE = re.compile(r"^(?:cancel|delete|remove|drop|call off)\s+(?P<rest>.+)$")
+POLITE_PREFIX_RE = re.compile(r"^(?:(?:hey|hi|ok|okay|please|pls|kindly|can you|could you|would you|go ahead and)[\s,]+)+")
+DELETE_ARTICLE_RE = re.compile(r"^(?:my|the|our|today's|tomorrow's)\s+")
+DELETE_SUFFIX_RE = re.compile(r"\s+(?:meetings?|call|please)$")
+VAGUE_TITLES = {"it", "that", "this", "them", "all", "both", "everything", "those", "these", "one",
+                "last one", "the last one", "meeting", "meetings", "everything today", "all meetings"}
+
+def normalize(message: str) -> str:
+    text = message.strip().lower()
+    text = text.replace("\u2019", "'")
+    text = re.sub(r"\s+", " ", text)
+    text = text.rstrip("?!. ")
+    return POLITE_PREFIX_RE.sub("", text)
+
+def _next_weekday(today: datetime.date, weekday: int, strictly_after: bool) -> datetime.date:
+    days = (weekday - today.weekday()) % 7
+    if days == 0 and strictly_after:
+        days = 7
+    return today + datetime.timedelta(days=days)
+
+def _last_weekday(today: datetime.date, weekday: int) -> datetime.date:
+    return today - datetime.timedelta(days=(today.weekday() - weekday) % 7 or 7)
+
+def _month_day(month_token: str, day: int, today: datetime.date):
+    month = next((i + 1 for i, m in enumerate(MONTHS) if m.startswith(month_token[:3])), None)
+    try:
+        return datetime.date(today.year, month, day)
+    except (TypeError, ValueError):
+        return AMBIGUOUS
+
+def resolve_date(expr: str, today: datetime.date):
+    """
+    Resolves one date expression matched by DATE_RE. Returns a date or AMBIGUOUS.
+    """
+    if expr == "day after tomorrow":
+        return today + datetime.timedelta(days=2)
+    if expr in ("today", "tonight"):
+        return today
+    if expr in ("tomorrow", "tmrw"):
+        return today + datetime.timedelta(days=1)
+    if expr == "yesterday":
+        return today - datetime.timedelta(days=1)
+
+    m = re.fullmatch(r"in (\d{1,2}) days?", expr)
+    if m:
+        return today + datetime.timedelta(days=int(m.group(1)))
+
+    m = re.fullmatch(r"(?:(this|next|last|on)\s+)?(\w+day)", expr)
+    if m and m.group(2) in WEEKDAYS:
+        if m.group(1) == "last":
+            return _last_weekday(today, WEEKDAYS.index(m.group(2)))
+        return _next_weekday(today, WEEKDAYS.index(m.group(2)), strictly_after=m.group(1) == "next")
+
+    m = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", expr)
+    if m:
+        try:
+            return datetime.date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        except ValueError:
+            return AMBIGUOUS
+
+    m = re.fullmatch(MONTH_PATTERN + r"\s+(\d{1,2})(?:st|nd|rd|th)?", expr)
+    if m:
+        return _month_day(expr.split()[0], int(m.group(2)), today)
+    m = re.fullmatch(r"(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(" + MONTH_PATTERN + ")", expr)
+    if m:
+        return _month_day(m.group(2), int(m.group(1)), today)
+    return AMBIGUOUS
+
+def find_date(text: str, today: datetime.date):
+    """
+    The single date mentioned in text, None if there is none, AMBIGUOUS if it can't be pinned down
+    (including date-like text DATE_RE doesn't cover).
+    """
+    if UNREAD_DATE_RE.search(DATE_RE.sub(" ", text)):
+        return AMBIGUOUS
+    dates = {resolve_date(m.group(0), today) for m in DATE_RE.finditer(text)}
+    if not dates:
+        return None
+    if len(dates) > 1 or AMBIGUOUS in dates:
+        return AMBIGUOUS
+    return dates.pop()
+
+def _check_meeting(text: str, today: datetime.date) -> Optional[Dict[str, Any]]:
+    if not SCHEDULE_RE.search(text) or NOT_A_CHECK_RE.search(text) or RANGE_RE.search(text):
+        return None
+    date = find_date(text, today)
+    if date is AMBIGUOUS:
+        return None
+    # Same default as the LLM prompt: no date means today
+    return {"intent": "CHECK_MEETING", "action_payload": {"date": (date or today).isoformat()}}
+
+def _delete_meeting(text: str, today: datetime.date) -> Optional[Dict[str, Any]]:
+    m = DELETE_RE.match(text)
+    if not m:
+        return None
+    rest = m.group("rest")
+
+    date = None
+    d = re.search(r"(?:\s+(?:on|for))?\s+(" + DATE_RE.pattern + r")$", rest)
+    if d:
+        date = resolve_date(d.group(1), today)
+        if date is AMBIGUOUS:
+            return None
+        rest = rest[:d.start()]
+    elif DATE_RE.search(rest):
+        return None # Date in the middle ("cancel tomorrow's 3pm") - let the LLM read it
+
+    title = DELETE_SUFFIX_RE.sub("", DELETE_ARTICLE_RE.sub("", rest.strip())).strip()
+    if (not title or title in VAGUE_TITLES or RANGE_RE.search(title)
+            or re.search(r",|&|\band\b|\bor\b|\ball\b", title)):
+        return None
+
+    payload = {"meeting_titles": [title], "date": date.isoformat() if date else None}
+    return {"intent": "DELETE_MEETING", "action_payload": payload}
+
+def parse_command(message: str, now: Optional[datetime.datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    Returns {"intent", "action_payload"} in the same shape as the LLM response for
+    unambiguous CHECK_MEETING / DELETE_MEETING commands, else None.
+    """
+    text = normalize(message)
+    if not text or len(text.split()) > MAX_WORDS:
+        return None
+    today = (now or datetime.datetime.now()).date()
+    return _delete_meeting(text, today) or _check_meeting(text, today)
+
+# Self-check: python -m app.meeting_parser
+# (message, expected (intent, date) with "today" = Monday 2026-10-19, or None for "ask the LLM")
+CASES = [
+    ("what's on today", ("CHECK_MEETING", "2026-10-19")),
+    ("what's on my calendar?", ("CHECK_MEETING", "2026-10-19")),
+    ("what's on tomorrow", ("CHECK_MEETING", "2026-10-20")),
+    ("what's on friday", ("CHECK_MEETING", "2026-10-23")),
+    ("meetings next monday", ("CHECK_MEETING", "2026-10-26")),
+    ("meetings last friday", ("CHECK_MEETING", "2026-10-16")),
+    ("meetings last monday", ("CHECK_MEETING", "2026-10-12")),
+    ("meetings in 3 days", ("CHECK_MEETING", "2026-10-22")),
+    ("what's on oct 23", ("CHECK_MEETING", "2026-10-23")),
+    ("what's on 2026-10-23", ("CHECK_MEETING", "2026-10-23")),
+    ("what's on 10/23", None),
+    ("what's on the 23rd", None),
+    ("what's on 23/10/2026", None),
+    ("meetings on 23.10", None),
+    ("what's on in two days", None),
+    ("what's on christmas", None),
+    ("meetings friday the 13th", None),
+    ("meetings this past friday", None),
+    ("cancel standup", ("DELETE_MEETING", None)),
+    ("cancel standup last friday", ("DELETE_MEETING", "2026-10-16")),
+]
+
+if __name__ == "__main__":
+    now = datetime.datetime(2026, 10, 19, 9, 0)
+    failed = 0
+    for message, expected in CASES:
+        parsed = parse_command(message, now)
+        got = None
+        if parsed:
+            payload = parsed["action_payload"]
+            got = (parsed["intent"], payload.get("date"))
+        if got != expected:
+            failed += 1
+            print(f"FAIL {message!r}: expected {expected}, got {got}")
+    print(f"{len(CASES) - failed}/{len(CASES)} cases passed")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,212 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess, REGISTRY,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Prometheus metrics. Under gunicorn every worker writes to PROMETHEUS_MULTIPROC_DIR (set by
+# gunicorn.conf.py) and a scrape of any worker aggregates all of them; a single uvicorn process
+# just serves its own registry.
+#
+# Besides the global histograms, each request accumulates the time it spent per stage
+# (db, gmail, classifier, gemini, rate_limit), exported as http_request_stage_seconds{route,stage},
+# so a slow /api/sync can be broken down directly.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route template",
+                            ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+REQUEST_STAGE = Histogram("http_request_stage_seconds", "Time a request spent in each stage",
+                          ["route", "stage"], buckets=LATENCY_BUCKETS)
+REQUEST_DB_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request",
+                               ["route"], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement execution time", buckets=FAST_BUCKETS)
+GMAIL_LATENCY = Histogram("gmail_api_duration_seconds", "Gmail API call latency", ["call"], buckets=LATENCY_BUCKETS)
+CLASSIFIER_LATENCY = Histogram("local_classifier_duration_seconds", "Local scikit-learn inference time",
+                               ["model"], buckets=FAST_BUCKETS)
+LLM_LATENCY = Histogram("llm_call_duration_seconds", "Gemini call latency", ["agent", "outcome"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens", "Gemini tokens by kind (prompt, cached, output)", ["agent", "kind"])
+LLM_RATE_LIMITED = Counter("llm_rate_limited", "Gemini calls rejected with 429 / quota errors", ["agent"])
+SYNC_EMAILS = Counter("sync_emails", "Emails stored by /api/sync")
+SYNC_DURATION = Histogram("sync_duration_seconds", "Wall time of a Gmail sync", buckets=LATENCY_BUCKETS)
+SYNC_THROUGHPUT = Histogram("sync_throughput_emails_per_second", "Emails stored per second of sync (syncs with new mail)",
+                            buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1, 2, 5, 10, 25))
+
+# Long-lived or self-referential routes that would only distort the latency histograms
+UNTIMED_ROUTES = {"/api/events", "/api/internal/metrics"}
+
+class RequestStats:
+    __slots__ = ("stages", "db_queries")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.db_queries = 0
+
+# Set per request by MetricsMiddleware; threadpool endpoints see it through the copied context
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def add_stage(stage: str, seconds: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.stages[stage] = stats.stages.get(stage, 0.0) + seconds
+
+@contextmanager
+def timed(histogram: Histogram, stage: Optional[str] = None, **labels):
+    """
+    Observes the block's duration in histogram (with labels) and charges it to the request's stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        if stage:
+            add_stage(stage, elapsed)
+
+def is_rate_limit_error(e: Exception) -> bool:
+    text = str(e)
+    return "429" in text or "quota" in text.lower() or "RESOURCE_EXHAUSTED" in text
+
+class LLMCall:
+    def __init__(self, agent: str):
+        self.agent = agent
+
+    def usage(self, response: Any):
+        """
+        Counts tokens from a response (or the last chunk of a stream) carrying usage_metadata.
+        """
+        meta = getattr(response, "usage_metadata", None)
+        if not meta:
+            return
+        cached = getattr(meta, "cached_content_token_count", None) or 0
+        prompt = (getattr(meta, "prompt_token_count", None) or 0) - cached
+        output = getattr(meta, "candidates_token_count", None) or 0
+        for kind, count in (("prompt", prompt), ("cached", cached), ("output", output)):
+            if count > 0:
+                LLM_TOKENS.labels(agent=self.agent, kind=kind).inc(count)
+
+@contextmanager
+def llm_call(agent: str):
+    """
+    Wraps one Gemini call: latency by outcome, 429 counting and the request's 'gemini' stage.
+    Call .usage(response) on the yielded object to count tokens.
+    """
+    call = LLMCall(agent)
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield call
+    except Exception as e:
+        if is_rate_limit_error(e):
+            outcome = "rate_limited"
+            LLM_RATE_LIMITED.labels(agent=agent).inc()
+        else:
+            outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_LATENCY.labels(agent=agent, outcome=outcome).observe(elapsed)
+        add_stage("gemini", elapsed)
+
+def record_sync(count: int, seconds: float):
+    SYNC_DURATION.observe(seconds)
+    if count:
+        SYNC_EMAILS.inc(count)
+        if seconds > 0:
+            SYNC_THROUGHPUT.observe(count / seconds)
+
+def instrument_sql():
+    """
+    Times every SQL statement and counts it against the current request. Registered on the
+    Engine class, so it also covers the lazily created shared engine.
+    """
+    # The start time lives on the statement's execution context, so a statement that fails
+    # (no after_cursor_execute) leaves nothing behind to be matched with a later one
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_query_start = time.perf_counter()
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_query_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        DB_QUERY_LATENCY.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.stages["db"] = stats.stages.get("db", 0.0) + elapsed
+
+def _route_template(scope) -> str:
+    # Label by template (/api/emails/{email_id}), never the raw path, to bound cardinality
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    app = scope.get("app")
+    if app is not None:
+        from starlette.routing import Match
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: latency until the last body chunk is sent (background tasks excluded),
+    plus per-request DB query count and stage breakdown.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = {"code": 500, "recorded": False}
+
+        def record():
+            status["recorded"] = True
+            route = _route_template(scope)
+            if route in UNTIMED_ROUTES:
+                return
+            REQUEST_LATENCY.labels(method=scope["method"], route=route, status=str(status["code"])).observe(time.perf_counter() - start)
+            REQUEST_DB_QUERIES.labels(route=route).observe(stats.db_queries)
+            for stage, seconds in stats.stages.items():
+                REQUEST_STAGE.labels(route=route, stage=stage).observe(seconds)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body") and not status["recorded"]:
+                record()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not status["recorded"]:
+                record()
+            _request_stats.reset(token)
+
+def render_metrics():
+    """
+    (body, content_type) for the scrape endpoint.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,139 @@
+"""
+Versioned schema migrations.
+
+Each module named mNNNN_<name>.py defines:
+    DESCRIPTION: str
+    HEAVY: bool          (optional, default False) data backfills that must not run during app startup
+    upgrade(conn)        idempotent; conn is a SQLAlchemy Connection
+
+App startup only calls ensure_schema(), which costs one SELECT when the schema is current.
+Heavy migrations run out of band:  python -m app.migrations upgrade   (or python update_schema.py)
+"""
+import importlib
+import logging
+import pkgutil
+import re
+import datetime
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Set
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, text, select
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "schema_migrations"
+LOCK_TIMEOUT = 60
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    description: str
+    heavy: bool
+    upgrade: Callable
+
+def load_migrations() -> List[Migration]:
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        m = re.match(r"m(\d{4})_(\w+)$", info.name)
+        if not m:
+            continue
+        module = importlib.import_module(f"{__name__}.{info.name}")
+        migrations.append(Migration(
+            version=int(m.group(1)),
+            name=m.group(2),
+            description=getattr(module, "DESCRIPTION", ""),
+            heavy=getattr(module, "HEAVY", False),
+            upgrade=module.upgrade,
+        ))
+    migrations.sort(key=lambda mig: mig.version)
+    return migrations
+
+MIGRATIONS = load_migrations()
+LATEST_VERSION = MIGRATIONS[-1].version if MIGRATIONS else 0
+
+# --- Idempotency helpers for migration modules ---
+
+def has_table(conn, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+def has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+def has_index(conn, table: str, index: str) -> bool:
+    insp = inspect(conn)
+    names = {i["name"] for i in insp.get_indexes(table)}
+    names |= {u["name"] for u in insp.get_unique_constraints(table)}
+    return index in names
+
+def is_mysql(conn) -> bool:
+    return conn.dialect.name == "mysql"
+
+# --- Runner ---
+
+def applied_versions(conn) -> Set[int]:
+    try:
+        return set(conn.execute(select(schema_version.c.version)).scalars())
+    except Exception:
+        # schema_version does not exist yet
+        conn.rollback()
+        return set()
+
+def pending(applied: Set[int], include_heavy: bool = True) -> List[Migration]:
+    return [m for m in MIGRATIONS if m.version not in applied and (include_heavy or not m.heavy)]
+
+def _acquire_lock(conn) -> bool:
+    if not is_mysql(conn):
+        return True
+    return bool(conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT}).scalar())
+
+def _release_lock(conn):
+    if is_mysql(conn):
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+def upgrade(engine, include_heavy: bool = True, target: Optional[int] = None) -> List[int]:
+    """
+    Applies pending migrations in version order. Without include_heavy, heavy migrations are
+    skipped (left pending) and later light ones still run. Returns the versions applied.
+    """
+    target = target or LATEST_VERSION
+    done = []
+    with engine.connect() as conn:
+        if not _acquire_lock(conn):
+            raise RuntimeError("Timed out waiting for another process to finish migrating")
+        try:
+            schema_version.create(conn, checkfirst=True)
+            conn.commit()
+            # Re-read under the lock: another worker may have migrated while we waited
+            for mig in pending(applied_versions(conn), include_heavy):
+                if mig.version > target:
+                    break
+                logger.info("Schema: applying %04d %s - %s", mig.version, mig.name, mig.description)
+                mig.upgrade(conn)
+                conn.execute(schema_version.insert().values(version=mig.version, name=mig.name, applied_at=datetime.datetime.utcnow()))
+                conn.commit()
+                done.append(mig.version)
+            return done
+        finally:
+            _release_lock(conn)
+
+def ensure_schema(engine):
+    """
+    Startup check: a single SELECT when the schema is current, otherwise applies light migrations only.
+    """
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    if pending(applied, include_heavy=False):
+        upgrade(engine, include_heavy=False)
+    heavy = pending(applied, include_heavy=True)
+    if heavy:
+        names = ", ".join(f"{m.version:04d} {m.name}" for m in heavy if m.heavy)
+        if names:
+            logger.warning("⚠️ Schema: heavy migrations pending (%s). Run `python -m app.migrations upgrade` out of band.", names)
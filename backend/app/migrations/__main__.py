@@ -0,0 +1,29 @@
+import argparse
+import logging
+from . import MIGRATIONS, applied_versions, upgrade
+from ..database import engine
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema migrations")
+    parser.add_argument("command", choices=["status", "upgrade"])
+    parser.add_argument("--light-only", action="store_true", help="Skip heavy (data backfill) migrations")
+    parser.add_argument("--target", type=int, default=None, help="Migrate up to this version only")
+    args = parser.parse_args()
+    # Migration progress is logged; show it on the console
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+
+    if args.command == "status":
+        for mig in MIGRATIONS:
+            state = "applied" if mig.version in applied else "pending"
+            kind = " [heavy]" if mig.heavy else ""
+            print(f"  {mig.version:04d} {mig.name}{kind}: {state} - {mig.description}")
+        return
+
+    done = upgrade(engine, include_heavy=not args.light_only, target=args.target)
+    print(f"Applied {len(done)} migration(s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+from sqlmodel import SQLModel
+
+DESCRIPTION = "Create any missing tables from the current models"
+
+def upgrade(conn):
+    # Importing the model modules registers every table on SQLModel.metadata
+    from .. import models, meeting_models  # noqa: F401
+    SQLModel.metadata.create_all(conn)
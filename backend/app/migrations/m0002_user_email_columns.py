@@ -0,0 +1,12 @@
+from sqlalchemy import text
+from . import has_column, has_index
+
+DESCRIPTION = "Per-user data isolation columns on meeting and chathistory (was update_schema.py)"
+
+def upgrade(conn):
+    for table in ("meeting", "chathistory"):
+        if not has_column(conn, table, "user_email"):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN user_email VARCHAR(255)"))
+        index = f"ix_{table}_user_email"
+        if not has_index(conn, table, index):
+            conn.execute(text(f"CREATE INDEX {index} ON {table} (user_email)"))
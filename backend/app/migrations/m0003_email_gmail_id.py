@@ -0,0 +1,10 @@
+from sqlalchemy import text
+from . import has_column, has_index
+
+DESCRIPTION = "gmail_id column with unique index for sync deduplication"
+
+def upgrade(conn):
+    if not has_column(conn, "email", "gmail_id"):
+        conn.execute(text("ALTER TABLE email ADD COLUMN gmail_id VARCHAR(255)"))
+    if not has_index(conn, "email", "ix_email_gmail_id"):
+        conn.execute(text("CREATE UNIQUE INDEX ix_email_gmail_id ON email (gmail_id)"))
@@ -0,0 +1,13 @@
+from sqlalchemy import text
+from . import has_column, is_mysql
+
+DESCRIPTION = "Widen snippet / suggested_reply to TEXT (AI replies exceed 255 chars)"
+
+def upgrade(conn):
+    if not is_mysql(conn):
+        return
+    conn.execute(text("ALTER TABLE email MODIFY COLUMN snippet TEXT"))
+    conn.execute(text("ALTER TABLE email MODIFY COLUMN suggested_reply TEXT"))
+    # Legacy inline body column (moved to emailbody by migration 0007)
+    if has_column(conn, "email", "body"):
+        conn.execute(text("ALTER TABLE email MODIFY COLUMN body LONGTEXT"))
@@ -0,0 +1,10 @@
+from sqlalchemy import text
+from . import has_column, has_index
+
+DESCRIPTION = "Gmail threadId on email"
+
+def upgrade(conn):
+    if not has_column(conn, "email", "thread_id"):
+        conn.execute(text("ALTER TABLE email ADD COLUMN thread_id VARCHAR(255)"))
+    if not has_index(conn, "email", "ix_email_thread_id"):
+        conn.execute(text("CREATE INDEX ix_email_thread_id ON email (thread_id)"))
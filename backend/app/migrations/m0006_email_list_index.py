@@ -0,0 +1,8 @@
+from sqlalchemy import text
+from . import has_index
+
+DESCRIPTION = "Composite (user_id, received_time) index for keyset-paginated inbox listing"
+
+def upgrade(conn):
+    if not has_index(conn, "email", "ix_email_user_received"):
+        conn.execute(text("CREATE INDEX ix_email_user_received ON email (user_id, received_time)"))
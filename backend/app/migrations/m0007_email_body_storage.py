@@ -0,0 +1,47 @@
+from sqlalchemy import text, bindparam
+from . import has_column
+
+DESCRIPTION = "Backfill inline email.body into compressed emailbody rows"
+HEAVY = True
+
+BATCH_SIZE = 500
+
+def upgrade(conn):
+    """
+    Copies bodies in batches and NULLs the inline column in the same transaction,
+    so an interrupted run resumes where it stopped. The email.body column itself is
+    left in place; drop it manually once every deployed worker runs the new code.
+    """
+    from ..models import compress_text
+
+    if not has_column(conn, "email", "body"):
+        return
+
+    select_batch = text("SELECT id, body FROM email WHERE body IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit")
+    existing = text("SELECT email_id FROM emailbody WHERE email_id IN :ids").bindparams(bindparam("ids", expanding=True))
+    insert_body = text("INSERT INTO emailbody (email_id, codec, data) VALUES (:email_id, :codec, :data)")
+    clear_inline = text("UPDATE email SET body = NULL WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+    last_id = 0
+    moved = 0
+    while True:
+        rows = conn.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        ids = [r.id for r in rows]
+        already = {r.email_id for r in conn.execute(existing, {"ids": ids})}
+
+        values = []
+        for row in rows:
+            if row.id in already:
+                continue
+            codec, data = compress_text(row.body)
+            values.append({"email_id": row.id, "codec": codec, "data": data})
+        if values:
+            conn.execute(insert_body, values)
+        conn.execute(clear_inline, {"ids": ids})
+        conn.commit()
+
+        last_id = ids[-1]
+        moved += len(values)
+        print(f"Moved {moved} bodies (up to email id {last_id})...")
@@ -0,0 +1,11 @@
+from sqlalchemy import text
+from sqlmodel import SQLModel
+from . import has_index
+
+DESCRIPTION = "Composite (user_email, timestamp) chat index and chatsummary table"
+
+def upgrade(conn):
+    from ..models import ChatSummary
+    SQLModel.metadata.create_all(conn, tables=[ChatSummary.__table__])
+    if not has_index(conn, "chathistory", "ix_chathistory_user_ts"):
+        conn.execute(text("CREATE INDEX ix_chathistory_user_ts ON chathistory (user_email, timestamp)"))
@@ -0,0 +1,8 @@
+from sqlalchemy import text
+from . import has_index
+
+DESCRIPTION = "Composite (user_email, status, start_time) index for calendar range queries"
+
+def upgrade(conn):
+    if not has_index(conn, "meeting", "ix_meeting_user_status_start"):
+        conn.execute(text("CREATE INDEX ix_meeting_user_status_start ON meeting (user_email, status, start_time)"))
@@ -0,0 +1,13 @@
+from sqlalchemy import text
+from sqlmodel import SQLModel
+from . import has_column
+
+DESCRIPTION = "Recurrence rule columns on meeting and meetingexception table"
+
+def upgrade(conn):
+    from ..meeting_models import MeetingException
+    if not has_column(conn, "meeting", "recurrence_rule"):
+        conn.execute(text("ALTER TABLE meeting ADD COLUMN recurrence_rule VARCHAR(255)"))
+    if not has_column(conn, "meeting", "recurrence_end"):
+        conn.execute(text("ALTER TABLE meeting ADD COLUMN recurrence_end DATETIME"))
+    SQLModel.metadata.create_all(conn, tables=[MeetingException.__table__])
@@ -0,0 +1,7 @@
+from sqlmodel import SQLModel
+
+DESCRIPTION = "googlecredential table for server-side Google OAuth tokens"
+
+def upgrade(conn):
+    from ..models import GoogleCredential
+    SQLModel.metadata.create_all(conn, tables=[GoogleCredential.__table__])
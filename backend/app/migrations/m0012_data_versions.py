@@ -0,0 +1,7 @@
+from sqlmodel import SQLModel
+
+DESCRIPTION = "dataversion table backing ETags of the read endpoints"
+
+def upgrade(conn):
+    from ..models import DataVersion
+    SQLModel.metadata.create_all(conn, tables=[DataVersion.__table__])
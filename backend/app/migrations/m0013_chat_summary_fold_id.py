@@ -0,0 +1,8 @@
+from sqlalchemy import text
+from . import has_column
+
+DESCRIPTION = "Id of the last folded turn on chatsummary"
+
+def upgrade(conn):
+    if not has_column(conn, "chatsummary", "compacted_through_id"):
+        conn.execute(text("ALTER TABLE chatsummary ADD COLUMN compacted_through_id INTEGER"))
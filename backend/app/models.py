@@ -1,6 +1,14 @@
 from typing import Optional
-from sqlmodel import Field, SQLModel
+from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import Column, Text, UniqueConstraint, Index, LargeBinary
+from sqlalchemy.dialects.mysql import LONGBLOB
 from datetime import datetime
+import zlib
+
+try:
+    import zstandard
+except ImportError: # Optional: fall back to zlib when zstandard is not installed
+    zstandard = None
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -11,13 +19,16 @@ class User(SQLModel, table=True):
     provider: str = "google" 
 
 class Email(SQLModel, table=True):
+    # Backs the keyset-paginated inbox listing: WHERE user_id = ? ORDER BY received_time DESC, id DESC
+    __table_args__ = (Index("ix_email_user_received", "user_id", "received_time"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     gmail_id: str = Field(index=True, unique=True) # New Field for Deduplication
+    thread_id: Optional[str] = Field(default=None, index=True) # Gmail threadId
     user_id: int = Field(foreign_key="user.id")
     subject: str
     sender: str
     snippet: str
-    body: Optional[str] = Field(default=None)
     received_time: datetime
     # Analysis Fields
     summary: Optional[str] = Field(default=None)
@@ -31,6 +42,82 @@ class Email(SQLModel, table=True):
     suggested_reply: Optional[str] = Field(default=None)
     sentiment: Optional[str] = Field(default=None)
     tone: Optional[str] = Field(default=None)
+    # Body lives compressed in EmailBody so list/RAG/analytics scans stay on small rows
+    body_record: Optional["EmailBody"] = Relationship(sa_relationship_kwargs={"uselist": False, "cascade": "all, delete-orphan"})
+
+    @property
+    def body(self) -> Optional[str]:
+        return self.body_record.text if self.body_record else None
+
+    def set_body(self, text: Optional[str]):
+        self.body_record = EmailBody.from_text(text) if text else None
+
+def compress_text(text: str):
+    """
+    Returns (codec, data). zstd when available, zlib otherwise.
+    """
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+def decompress_text(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Email body is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    return data.decode("utf-8") # 'raw'
+
+class EmailBody(SQLModel, table=True):
+    """
+    Compressed email body, one row per Email. Decompressed transparently via Email.body.
+    """
+    email_id: int = Field(foreign_key="email.id", primary_key=True)
+    codec: str = "zlib"
+    data: bytes = Field(sa_column=Column(LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=False))
+
+    @classmethod
+    def from_text(cls, text: str) -> "EmailBody":
+        codec, data = compress_text(text)
+        return cls(codec=codec, data=data)
+
+    @property
+    def text(self) -> str:
+        return decompress_text(self.codec, self.data)
+
+class EmailThread(SQLModel, table=True):
+    """
+    One row per Gmail thread. The summary is a rolling one, folded forward
+    each time a new message arrives instead of being recomputed from all bodies.
+    """
+    __table_args__ = (UniqueConstraint("user_id", "thread_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    thread_id: str = Field(index=True)
+    subject: str
+    message_count: int = 0
+    last_email_id: Optional[int] = Field(default=None) # Newest message, used as the list/RAG representative
+    last_received_time: datetime
+    summary: Optional[str] = Field(default=None, sa_column=Column(Text))
+
+class Digest(SQLModel, table=True):
+    """
+    Precomputed summary of a user's mail for one day, ISO week or calendar month.
+    Daily digests are built from Email.summary, weekly and monthly ones from the daily digests.
+    """
+    __table_args__ = (UniqueConstraint("user_id", "period", "period_start"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    period: str # 'day', 'week' or 'month'
+    period_start: datetime # Midnight of the day / Monday of the week / 1st of the month
+    email_count: int = 0
+    summary: Optional[str] = Field(default=None, sa_column=Column(Text))
+    stale: bool = True # Set when new mail lands in the period, cleared by the rollup
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class UserRead(SQLModel):
     id: int
@@ -39,8 +126,49 @@ class UserRead(SQLModel):
     avatar_url: Optional[str]
 
 class ChatHistory(SQLModel, table=True):
+    # Backs per-user history pages and retention scans: WHERE user_email = ? ORDER BY timestamp
+    __table_args__ = (Index("ix_chathistory_user_ts", "user_email", "timestamp"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     sender: str # 'user' or 'agent'
     text: str # stored as plain text
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     user_email: str = Field(index=True, default=None, nullable=True) # Data isolation
+
+class ChatSummary(SQLModel, table=True):
+    """
+    Rolling summary of a user's chat turns up to compacted_through. Turns outside the recent
+    memory window are folded in as the conversation grows; turns older than the retention
+    window are then deleted.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_email: str = Field(index=True, unique=True)
+    summary: Optional[str] = Field(default=None, sa_column=Column(Text))
+    compacted_through: Optional[datetime] = None
+    # Id of the last folded turn: timestamps are second-precision, so (compacted_through,
+    # compacted_through_id) is the boundary, in the same (timestamp, id) order the turns are read
+    compacted_through_id: Optional[int] = None
+    turn_count: int = 0 # Number of turns folded into the summary
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class GoogleCredential(SQLModel, table=True):
+    """
+    Google OAuth tokens kept server-side (JWTs only carry the user id).
+    The refresh token is Fernet-encrypted; see app/auth.py.
+    """
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    access_token: Optional[str] = Field(default=None, sa_column=Column(Text))
+    access_token_expires_at: Optional[datetime] = None
+    refresh_token_encrypted: Optional[str] = Field(default=None, sa_column=Column(Text))
+    scope: Optional[str] = Field(default=None, sa_column=Column(Text))
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class DataVersion(SQLModel, table=True):
+    """
+    Per-user change counter for a family of read endpoints ("emails", "meetings", "chat").
+    Bumped after every write; read endpoints derive their ETag from it. user_email "*" is a
+    scope-wide counter for writes that affect every user.
+    """
+    scope: str = Field(primary_key=True, max_length=32)
+    user_email: str = Field(primary_key=True, max_length=255)
+    version: int = 0
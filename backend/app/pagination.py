@@ -0,0 +1,39 @@
+import base64
+import datetime
+from typing import Optional, Tuple
+from sqlalchemy import and_, or_
+
+# Keyset (cursor) pagination over (timestamp, id). Cursors are opaque to clients.
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(ts: datetime.datetime, row_id: int) -> str:
+    raw = f"{ts.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """
+    Raises ValueError on malformed cursors.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_str, id_str = base64.urlsafe_b64decode(padded.encode()).decode().rsplit("|", 1)
+        return datetime.datetime.fromisoformat(ts_str), int(id_str)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def before_cursor(ts_col, id_col, cursor: Optional[str]):
+    """
+    WHERE clause selecting rows strictly after the cursor in (ts DESC, id DESC) order.
+    """
+    ts, row_id = decode_cursor(cursor)
+    return or_(ts_col < ts, and_(ts_col == ts, id_col < row_id))
+
+def after_cursor(ts_col, id_col, cursor: Optional[str]):
+    """
+    WHERE clause selecting rows strictly after the cursor in (ts ASC, id ASC) order.
+    """
+    ts, row_id = decode_cursor(cursor)
+    return or_(ts_col > ts, and_(ts_col == ts, id_col > row_id))
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
@@ -0,0 +1,281 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+A request is profiled when it carries a valid X-Profile header (see sign()) or is picked by
+PROFILE_SAMPLE_RATE. A sampler thread then snapshots the stacks of the threads running the
+endpoint every PROFILE_INTERVAL_MS and writes, to PROFILE_DIR:
+    <stamp>-<route>.folded   collapsed stacks ("frame;frame;frame count"), loadable by
+                             flamegraph.pl, inferno or speedscope
+    <stamp>-<route>.json     route, duration and the share of samples in GmailService,
+                             MailAgent, SQL and Gemini
+
+Sign a header for one path (valid PROFILE_SIGNATURE_TTL seconds):
+    python -m app.profiling sign /api/sync
+"""
+import os
+import sys
+import hmac
+import json
+import logging
+import time
+import random
+import hashlib
+import asyncio
+import functools
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+from .database import get_safe_env, env_int
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SECRET = get_safe_env("PROFILE_SECRET") # Header trigger is disabled without it
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0")) # Fraction of requests, e.g. 0.001
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = env_int("PROFILE_INTERVAL_MS", 5)
+PROFILE_MAX_FILES = env_int("PROFILE_MAX_FILES", 200) # Oldest profiles are pruned beyond this
+PROFILE_SIGNATURE_TTL = 600
+PROFILE_HEADER_BYTES = b"x-profile" # ASGI header names arrive lowercased
+MAX_CONCURRENT_PROFILES = 2 # Bounds the overhead of sampling when many requests qualify
+ENABLED = bool(PROFILE_SECRET) or PROFILE_SAMPLE_RATE > 0
+
+# Share of samples whose stack passes through each component (matched on file paths)
+COMPONENTS = {
+    "GmailService": (os.path.join("app", "services.py"), "googleapiclient"),
+    "MailAgent": (os.path.join("app", "agent.py"),),
+    "SQL": ("sqlalchemy", "mysql"),
+    "Gemini": (os.path.join("google", "genai"),),
+}
+
+def sign(path: str, expires: Optional[int] = None, secret: Optional[str] = None) -> str:
+    """
+    X-Profile header value authorising a profile of `path` until `expires` (unix time).
+    """
+    expires = expires or int(time.time()) + PROFILE_SIGNATURE_TTL
+    key = (secret or PROFILE_SECRET or "").encode()
+    digest = hmac.new(key, f"{expires}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{digest}"
+
+def verify(header: str, path: str) -> bool:
+    if not PROFILE_SECRET:
+        return False
+    expires, _, _ = header.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(header, sign(path, int(expires)))
+
+def _frame_label(code) -> str:
+    # Same function -> same frame, whatever line it is on, so flame graphs merge properly
+    filename = code.co_filename
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker >= 0:
+        filename = filename[marker + len("site-packages") + 1:]
+    elif filename.startswith(os.getcwd() + os.sep):
+        filename = os.path.relpath(filename)
+    else:
+        filename = os.sep.join(filename.split(os.sep)[-2:]) # Stdlib: python3.x/module.py
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+class ProfileSession:
+    def __init__(self, route: str, interval: float):
+        self.route = route
+        self.interval = interval
+        self.threads: Dict[int, int] = {} # thread ident -> nesting depth
+        self.lock = threading.Lock()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.component_samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.started = time.perf_counter()
+
+    def attach(self):
+        ident = threading.get_ident()
+        with self.lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+
+    def detach(self):
+        ident = threading.get_ident()
+        with self.lock:
+            depth = self.threads.get(ident, 0) - 1
+            if depth > 0:
+                self.threads[ident] = depth
+            else:
+                self.threads.pop(ident, None)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._sampler.join()
+        return time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.lock:
+                idents = list(self.threads)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.reverse()
+                self.stacks[";".join(labels)] += 1
+                self.samples += 1
+                for component, markers in COMPONENTS.items():
+                    if any(m in label for label in labels for m in markers):
+                        self.component_samples[component] += 1
+
+    def write(self, duration: float, meta: dict):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}-{int(duration * 1000)}ms"
+        name = f"{stamp}-{self.route.strip('/').replace('/', '_').replace('{', '').replace('}', '') or 'root'}"
+        base = os.path.join(PROFILE_DIR, name)
+        with open(base + ".folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        summary = {
+            **meta,
+            "route": self.route,
+            "duration_ms": round(duration * 1000, 1),
+            "interval_ms": round(self.interval * 1000, 2),
+            "samples": self.samples,
+            "components": {
+                c: round(n / self.samples, 3) for c, n in self.component_samples.most_common()
+            } if self.samples else {},
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        _prune()
+        logger.info("🔬 Profile written: %s.folded (%d samples, %sms)", base, self.samples, summary['duration_ms'])
+
+def _prune():
+    try:
+        files = sorted(
+            (os.path.join(PROFILE_DIR, f) for f in os.listdir(PROFILE_DIR) if f.endswith(".folded")),
+            key=os.path.getmtime,
+        )
+        for path in files[:-PROFILE_MAX_FILES] if PROFILE_MAX_FILES > 0 else []:
+            for ext in (".folded", ".json"):
+                try:
+                    os.remove(path[: -len(".folded")] + ext)
+                except FileNotFoundError:
+                    pass
+    except OSError as e:
+        logger.warning("⚠️ Profile pruning failed: %s", e)
+
+_active: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT_PROFILES)
+
+def _wrap_endpoint(call):
+    # Threads only count while they run the endpoint, so other requests sharing the
+    # threadpool or event loop stay out of the profile
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            session = _active.get()
+            if session is None:
+                return await call(*args, **kwargs)
+            session.attach()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                session.detach()
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        session = _active.get()
+        if session is None:
+            return call(*args, **kwargs)
+        session.attach()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            session.detach()
+    return wrapper
+
+def install(app):
+    """
+    Wraps every endpoint so profiled requests can find their threads. Call once all routes exist.
+    """
+    if not ENABLED:
+        return
+    from fastapi.routing import APIRoute
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not getattr(route.dependant.call, "__profiled__", False):
+            route.dependant.call = _wrap_endpoint(route.dependant.call)
+            route.dependant.call.__profiled__ = True
+
+class ProfilingMiddleware:
+    """
+    Pass-through unless profiling is configured; then one header lookup (and one random draw
+    when sampling) per request.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        header = None
+        for key, value in scope["headers"]:
+            if key == PROFILE_HEADER_BYTES:
+                header = value.decode("latin-1")
+                break
+        if header is not None:
+            trigger = "header" if verify(header, scope["path"]) else None
+        else:
+            trigger = "sample" if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE else None
+        if not trigger or not _slots.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        session = ProfileSession(scope["path"], PROFILE_INTERVAL_MS / 1000)
+        token = _active.set(session)
+        status = {"code": 500, "done": False}
+
+        def finish():
+            status["done"] = True
+            duration = session.stop()
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                session.route = route.path
+            try:
+                session.write(duration, {"method": scope["method"], "path": scope["path"],
+                                         "status": status["code"], "trigger": trigger})
+            except OSError as e:
+                logger.warning("⚠️ Could not write profile: %s", e)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body") and not status["done"]:
+                finish()
+
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not status["done"]:
+                finish()
+            _active.reset(token)
+            _slots.release()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "sign":
+        print("usage: python -m app.profiling sign <path>")
+        sys.exit(1)
+    if not PROFILE_SECRET:
+        print("PROFILE_SECRET is not set")
+        sys.exit(1)
+    print(f"X-Profile: {sign(sys.argv[2])}")
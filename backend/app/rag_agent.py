@@ -1,65 +1,131 @@
-from google import genai
 import json
-import os
-from typing import List, Dict, Any
+import logging
+import datetime
+from typing import List, Dict, Any, Iterator, Optional
 from .models import Email
-from sqlmodel import Session, select
+from .threads import latest_per_thread, strip_quoted_text
+from .digests import DigestBuilder, parse_time_range
+from .metrics import llm_call
+from .llm import get_client
+from sqlmodel import Session
+from sqlalchemy.orm import selectinload
+
+logger = logging.getLogger(__name__)
+
+NO_EMAILS_ANSWER = "I couldn't find any recent emails in your inbox."
+QUOTA_ANSWER = "⚠️ I'm currently offline due to high traffic (Quota Exceeded). But don't worry, your emails are safe! (Mock: I found 3 emails about that topic...)"
 
 class InboxRAGAgent:
     def __init__(self, session: Session):
         self.session = session
-        # Configure Gemini Client
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            self.client = None
-        else:
-            self.client = genai.Client(api_key=api_key)
-            
+        # Shared Gemini client (None without GEMINI_API_KEY)
+        self.client = get_client()
+
         self.model_name = 'gemini-2.5-flash'
         self.embedding_model = 'models/text-embedding-004' # or appropriate model
 
-    def query_inbox(self, user_id: int, query: str, history: List[Dict] = []) -> str:
+    def build_prompt(self, user_id: int, query: str) -> Optional[str]:
         """
-        Retrieves recent emails and answers the query using Gemini.
+        Retrieves recent emails and builds the Q&A prompt. Returns None if the inbox is empty.
+        Questions spanning more than a day are answered from precomputed digests when available.
         """
-        # Fetch last 30 emails
-        stmt = select(Email).where(Email.user_id == user_id).order_by(Email.received_time.desc()).limit(30)
-        emails = self.session.exec(stmt).all()
+        time_range = parse_time_range(query, datetime.datetime.now())
+        if time_range and time_range[1] - time_range[0] > datetime.timedelta(days=1):
+            digest_context = DigestBuilder(self.session).context_for_range(user_id, query, *time_range)
+            if digest_context:
+                return self._prompt(query, digest_context, "digests and emails")
+
+        # Fetch the 30 most recently active threads (newest message of each)
+        stmt = latest_per_thread(user_id).order_by(Email.received_time.desc()).limit(30).options(selectinload(Email.body_record))
+        rows = self.session.exec(stmt).all()
         
-        if not emails:
-            return "I couldn't find any recent emails in your inbox."
+        if not rows:
+            return None
 
-        # Prepare Context
+        # Prepare Context: one block per thread, earlier messages represented by the rolling summary
         email_context = ""
-        for e in emails:
-            email_context += f"--- EMAIL ID {e.id} ---\nFrom: {e.sender}\nDate: {e.received_time}\nSubject: {e.subject}\nBody: {e.body or e.snippet}\n\n"
+        for e, count, thread_summary in rows:
+            email_context += f"--- EMAIL ID {e.id} ---\nFrom: {e.sender}\nDate: {e.received_time}\nSubject: {e.subject}\n"
+            if count and count > 1 and thread_summary:
+                email_context += f"Thread ({count} messages) so far: {thread_summary}\n"
+            email_context += f"Body: {strip_quoted_text(e.body) or e.snippet}\n\n"
+
+        return self._prompt(query, email_context, "emails")
 
-        prompt = f"""
-        You are an intelligent Inbox Assistant. Answer the user's question based on the provided emails.
+    def _prompt(self, query: str, context: str, source: str) -> str:
+        return f"""
+        You are an intelligent Inbox Assistant. Answer the user's question based on the provided {source}.
         
         USER QUESTION: "{query}"
         
         INBOX CONTEXT:
-        {email_context}
+        {context}
         
         INSTRUCTIONS:
-        - Answer directly based on the emails.
+        - Answer directly based on the {source}.
         - Cite the sender or subject if relevant.
-        - If the answer is not in the emails, say "I couldn't find that information in your recent emails."
+        - If the answer is not in the {source}, say "I couldn't find that information in your recent emails."
         - Be concise and helpful.
         """
+
+    def query_inbox(self, user_id: int, query: str, history: List[Dict] = []) -> str:
+        """
+        Retrieves recent emails and answers the query using Gemini.
+        """
+        prompt = self.build_prompt(user_id, query)
+        if prompt is None:
+            return NO_EMAILS_ANSWER
         
         try:
             if self.client:
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
-                )
+                with llm_call("rag") as call:
+                    response = self.client.models.generate_content(
+                        model=self.model_name,
+                        contents=prompt
+                    )
+                    call.usage(response)
                 return response.text
             else:
                  return "AI Client not initialized."
         except Exception as e:
             error_msg = str(e)
             if "429" in error_msg or "quota" in error_msg.lower():
-                 return "⚠️ I'm currently offline due to high traffic (Quota Exceeded). But don't worry, your emails are safe! (Mock: I found 3 emails about that topic...)"
+                 return QUOTA_ANSWER
             return f"I encountered an error analyzing your inbox: {e}"
+
+    def stream_answer(self, prompt: Optional[str]) -> Iterator[str]:
+        """
+        Streams the answer for a prompt built by build_prompt, chunk by chunk.
+        Kept separate from prompt building so the DB work can happen before the response starts.
+        """
+        if prompt is None:
+            yield NO_EMAILS_ANSWER
+            return
+        if not self.client:
+            yield "AI Client not initialized."
+            return
+
+        emitted = False
+        try:
+            with llm_call("rag") as call:
+                stream = self.client.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=prompt
+                )
+                chunk = None
+                for chunk in stream:
+                    if chunk.text:
+                        emitted = True
+                        yield chunk.text
+                if chunk is not None:
+                    call.usage(chunk)
+        except Exception as e:
+            if emitted:
+                logger.error("RAG Stream Error: %s", e)
+                yield "\n[Answer interrupted]"
+                return
+            error_msg = str(e)
+            if "429" in error_msg or "quota" in error_msg.lower():
+                 yield QUOTA_ANSWER
+                 return
+            yield f"I encountered an error analyzing your inbox: {e}"
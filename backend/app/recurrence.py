@@ -0,0 +1,209 @@
+import re
+import bisect
+import logging
+import datetime
+import itertools
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from dateutil.rrule import rrule, rrulestr
+from sqlalchemy import or_
+from sqlmodel import Session, select
+from .meeting_models import Meeting, MeetingException
+
+logger = logging.getLogger(__name__)
+
+# Sub-daily frequencies would let a single series flood every window it touches
+ALLOWED_FREQS = {"DAILY", "WEEKLY", "MONTHLY", "YEARLY"}
+# Series longer than this are stored as open-ended (recurrence_end = None)
+MAX_BOUNDED_OCCURRENCES = 1000
+MAX_OCCURRENCE_DURATION = datetime.timedelta(days=1)
+
+class Occurrence(NamedTuple):
+    meeting_id: int
+    title: str
+    start: datetime.datetime
+    end: datetime.datetime
+    participants: str
+    original_start: Optional[datetime.datetime] # Occurrence key within a series; None for one-off meetings
+
+def normalize_rule(rule: str) -> str:
+    rule = rule.strip().upper()
+    if rule.startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    # Meeting times are naive, so a UTC "Z" UNTIL would be rejected by dateutil
+    return re.sub(r"(UNTIL=\d{8}(?:T\d{6})?)Z", r"\1", rule)
+
+def parse_rule(rule: str, dtstart: datetime.datetime) -> rrule:
+    """
+    Parses an iCalendar RRULE ("FREQ=WEEKLY;BYDAY=MO,WE") anchored at the series' first start.
+    Raises ValueError on malformed rules or unsupported frequencies.
+    """
+    rule = normalize_rule(rule)
+    m = re.search(r"(?:^|;)FREQ=(\w+)", rule)
+    if not m or m.group(1) not in ALLOWED_FREQS:
+        raise ValueError(f"Unsupported recurrence rule: {rule}")
+    try:
+        return rrulestr(rule, dtstart=dtstart)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule: {rule} ({e})")
+
+def prepare_series(rule: str, start: datetime.datetime, end: datetime.datetime) -> Tuple[str, datetime.datetime, datetime.datetime, Optional[datetime.datetime]]:
+    """
+    Validates a new series and snaps it to its first real occurrence (e.g. "every Monday"
+    requested on a Wednesday). Returns (rule, first_start, first_end, recurrence_end).
+    """
+    duration = end - start
+    if duration <= datetime.timedelta(0) or duration > MAX_OCCURRENCE_DURATION:
+        raise ValueError("Recurring meetings must last between 1 minute and 1 day")
+
+    rule = normalize_rule(rule)
+    first = parse_rule(rule, start).after(start, inc=True)
+    if first is None:
+        raise ValueError(f"Recurrence rule {rule} has no occurrences after {start}")
+
+    # Only this one-off scan at creation walks the series; bounded by MAX_BOUNDED_OCCURRENCES
+    head = list(itertools.islice(parse_rule(rule, first), MAX_BOUNDED_OCCURRENCES + 1))
+    last = head[-1] if len(head) <= MAX_BOUNDED_OCCURRENCES else None
+    return rule, first, first + duration, last
+
+class Series:
+    """
+    A recurring meeting plus its exceptions. Occurrences are generated on demand for a
+    window and never stored in the database. The rule is walked once per Series: starts are
+    kept as a sorted list, extended only as far as the latest window asked for, so repeated
+    queries (a cached index probed day by day) bisect instead of re-iterating from the first
+    occurrence.
+    """
+    def __init__(self, meeting_id: int, title: str, participants: str, first_start: datetime.datetime,
+                 first_end: datetime.datetime, rule: str, last_start: Optional[datetime.datetime] = None,
+                 exceptions: Iterable[MeetingException] = ()):
+        self.meeting_id = meeting_id
+        self.title = title
+        self.participants = participants
+        self.first_start = first_start
+        self.last_start = last_start
+        self.duration = first_end - first_start
+        self.rule = parse_rule(rule, first_start)
+        self._starts: List[datetime.datetime] = []
+        self._pending = iter(self.rule)
+        self._exhausted = False
+        self._lock = threading.Lock() # Cached indexes share a Series across request threads
+
+        exceptions = list(exceptions)
+        # Cancelled and moved occurrences both drop out of the regular schedule
+        self.skipped = {e.original_start for e in exceptions}
+        self.moved = [(e.new_start, e.new_end, e.original_start) for e in exceptions if e.new_start and e.new_end]
+        self.max_duration = max([self.duration] + [e - s for s, e, _ in self.moved])
+
+    @classmethod
+    def from_meeting(cls, meeting: Meeting, exceptions: Iterable[MeetingException] = ()) -> "Series":
+        return cls(meeting.id, meeting.title, meeting.participants, meeting.start_time, meeting.end_time,
+                   meeting.recurrence_rule, meeting.recurrence_end, exceptions)
+
+    def _regular_starts(self, starts_from: datetime.datetime, starts_before: datetime.datetime) -> List[datetime.datetime]:
+        with self._lock:
+            while not self._exhausted and (not self._starts or self._starts[-1] < starts_before):
+                start = next(self._pending, None)
+                if start is None:
+                    self._exhausted = True
+                else:
+                    self._starts.append(start)
+            lo = bisect.bisect_left(self._starts, starts_from)
+            hi = bisect.bisect_left(self._starts, starts_before)
+            return self._starts[lo:hi]
+
+    def occurrences(self, starts_from: datetime.datetime, starts_before: datetime.datetime) -> List[Occurrence]:
+        """
+        Occurrences starting in [starts_from, starts_before), exceptions applied.
+        """
+        found = []
+        if self.first_start < starts_before and (self.last_start is None or self.last_start >= starts_from):
+            for s in self._regular_starts(starts_from, starts_before):
+                if s not in self.skipped:
+                    found.append(Occurrence(self.meeting_id, self.title, s, s + self.duration, self.participants, s))
+        for s, e, original in self.moved:
+            if starts_from <= s < starts_before:
+                found.append(Occurrence(self.meeting_id, self.title, s, e, self.participants, original))
+        return sorted(found, key=lambda o: o.start)
+
+    def overlapping(self, start: datetime.datetime, end: datetime.datetime) -> List[Occurrence]:
+        return [o for o in self.occurrences(start - self.max_duration, end) if o.end > start]
+
+def load_series(session: Session, user_email: str, starts_from: Optional[datetime.datetime] = None,
+                starts_before: Optional[datetime.datetime] = None) -> List[Series]:
+    """
+    Scheduled series of a user, optionally only those that can have occurrences in the window.
+    Two queries regardless of how many occurrences the series span.
+    """
+    stmt = select(Meeting).where(
+        Meeting.user_email == user_email,
+        Meeting.status == "scheduled",
+        Meeting.recurrence_rule != None
+    )
+    if starts_before is not None:
+        stmt = stmt.where(Meeting.start_time < starts_before)
+    if starts_from is not None:
+        stmt = stmt.where(or_(Meeting.recurrence_end == None, Meeting.recurrence_end >= starts_from - MAX_OCCURRENCE_DURATION))
+    meetings = session.exec(stmt).all()
+    if not meetings:
+        return []
+
+    exceptions: Dict[int, List[MeetingException]] = {}
+    stmt = select(MeetingException).where(MeetingException.meeting_id.in_([m.id for m in meetings]))
+    for e in session.exec(stmt).all():
+        exceptions.setdefault(e.meeting_id, []).append(e)
+
+    series = []
+    for m in meetings:
+        try:
+            series.append(Series.from_meeting(m, exceptions.get(m.id, ())))
+        except ValueError as e:
+            logger.warning("⚠️ Skipping meeting %s with bad recurrence rule: %s", m.id, e)
+    return series
+
+def occurrences_between(session: Session, user_email: str, start: datetime.datetime, end: datetime.datetime) -> List[Occurrence]:
+    """
+    One-off meetings and expanded series occurrences starting in [start, end), by start time.
+    """
+    stmt = select(Meeting).where(
+        Meeting.user_email == user_email,
+        Meeting.status == "scheduled",
+        Meeting.recurrence_rule == None,
+        Meeting.start_time >= start,
+        Meeting.start_time < end
+    )
+    found = [Occurrence(m.id, m.title, m.start_time, m.end_time, m.participants, None) for m in session.exec(stmt).all()]
+    for series in load_series(session, user_email, start, end):
+        found.extend(series.occurrences(start, end))
+    return sorted(found, key=lambda o: o.start)
+
+def cancel_occurrence(session: Session, meeting: Meeting, on_date: datetime.date) -> Optional[datetime.datetime]:
+    """
+    Records a cancellation exception for the occurrence of `meeting` on `on_date`.
+    Returns its original start, or None if the series has no occurrence that day.
+    Does not commit.
+    """
+    day_start = datetime.datetime.combine(on_date, datetime.time.min)
+    existing = session.exec(select(MeetingException).where(MeetingException.meeting_id == meeting.id)).all()
+    day = Series.from_meeting(meeting, existing).occurrences(day_start, day_start + datetime.timedelta(days=1))
+    if not day:
+        return None
+
+    occurrence = day[0]
+    exception = next((e for e in existing if e.original_start == occurrence.original_start), None)
+    if exception is None:
+        exception = MeetingException(meeting_id=meeting.id, original_start=occurrence.original_start)
+    exception.new_start = exception.new_end = None
+    session.add(exception)
+    return occurrence.original_start
+
+def move_occurrence(session: Session, meeting: Meeting, original_start: datetime.datetime,
+                    new_start: datetime.datetime, new_end: datetime.datetime):
+    """
+    Moves a single occurrence of a series. Does not commit.
+    """
+    stmt = select(MeetingException).where(MeetingException.meeting_id == meeting.id, MeetingException.original_start == original_start)
+    exception = session.exec(stmt).first() or MeetingException(meeting_id=meeting.id, original_start=original_start)
+    exception.new_start = new_start
+    exception.new_end = new_end
+    session.add(exception)
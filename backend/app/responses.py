@@ -0,0 +1,74 @@
+import gzip
+import json
+from typing import Any, Optional
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+from .database import env_int
+
+try:
+    import orjson
+except ImportError: # Optional: fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+# Response layer for the polled list endpoints: conditional GETs, a fast encoder and compression.
+COMPRESS_MIN_BYTES = env_int("RESPONSE_COMPRESS_MIN_BYTES", 1024)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Browsers revalidate every time (If-None-Match), and the cache entry is per user
+CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization, Accept-Encoding"}
+
+def _default(obj: Any):
+    # SQLModel rows and anything else orjson does not know natively
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return jsonable_encoder(obj)
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode("utf-8")
+
+def _accepted_encodings(request: Request) -> set:
+    header = request.headers.get("accept-encoding", "")
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    304 response when the client already holds `etag`, else None.
+    """
+    candidates = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
+    return None
+
+def json_response(request: Request, payload: Any, etag: Optional[str] = None) -> Response:
+    """
+    JSON response encoded with orjson when available and compressed above COMPRESS_MIN_BYTES.
+    """
+    body = dumps(payload)
+    headers = dict(CACHE_HEADERS)
+    if etag:
+        headers["ETag"] = etag
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = _accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,14 +1,25 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 import base64
 from email.utils import parsedate_to_datetime
 from email.mime.text import MIMEText
 import datetime
 from .models import Email, User
 from .agent import MailAgent, Email as AgentEmail
+from .threads import get_thread, record_message, strip_quoted_text
+from .digests import DigestBuilder
+from .auth import store_google_token
 from sqlmodel import Session, select
+from sqlalchemy import inspect
+from .metrics import timed, add_stage, GMAIL_LATENCY
+from .logs import sampled
 import os
 import time
+import logging
+from typing import TYPE_CHECKING
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 
 def get_email_body(payload):
@@ -36,27 +47,52 @@ def get_email_body(payload):
             body = base64.urlsafe_b64decode(data).decode()
     return body
 
+def gmail_client(creds: "Credentials"):
+    from googleapiclient.discovery import build
+    return build('gmail', 'v1', credentials=creds)
+
 class GmailService:
     def __init__(self, session: Session, agent: MailAgent):
         self.session = session
         self.agent = agent
+        self.new_email_ids = [] # Ids stored by the last fetch_recent_emails call
+
+    def _credentials(self, token: dict) -> "Credentials":
+        # Google client libraries are slow to import; only Gmail calls need them
+        from google.oauth2.credentials import Credentials
+        expires_at = token.get('expires_at')
+        return Credentials(
+            token=token['access_token'],
+            refresh_token=token.get('refresh_token'),
+            # Known expiry lets google-auth refresh up front instead of after a 401
+            expiry=datetime.datetime.utcfromtimestamp(expires_at) if expires_at else None,
+            token_uri="https://oauth2.googleapis.com/token",
+            client_id=os.getenv("GOOGLE_CLIENT_ID"),
+            client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+            scopes=['https://www.googleapis.com/auth/gmail.readonly', 'https://www.googleapis.com/auth/gmail.send']
+        )
+
+    def _save_refreshed_token(self, user: User, token: dict, creds: "Credentials"):
+        """
+        Persists an access token google-auth refreshed during the call, so the next one reuses it.
+        """
+        if creds.token and creds.token != token['access_token']:
+            try:
+                expires_at = (creds.expiry - datetime.datetime(1970, 1, 1)).total_seconds() if creds.expiry else None
+                store_google_token(self.session, user.id, {"access_token": creds.token, "expires_at": expires_at})
+            except Exception as e:
+                logger.warning("⚠️ Failed to store refreshed Google token: %s", e)
+                self.session.rollback()
 
     def send_email(self, user: User, token: dict, to: str, subject: str, body: str):
         try:
             # Ensure we have a refresh token
             if not token.get('refresh_token'):
-                print("WARNING: No refresh token found. Token expiration will fail.")
+                logger.warning("No refresh token found. Token expiration will fail.")
 
-            creds = Credentials(
-                token=token['access_token'],
-                refresh_token=token.get('refresh_token'),
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=os.getenv("GOOGLE_CLIENT_ID"),
-                client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-                scopes=['https://www.googleapis.com/auth/gmail.readonly', 'https://www.googleapis.com/auth/gmail.send']
-            )
+            creds = self._credentials(token)
 
-            service = build('gmail', 'v1', credentials=creds)
+            service = gmail_client(creds)
 
             message = MIMEText(body)
             message['to'] = to
@@ -64,38 +100,43 @@ class GmailService:
             raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
             body = {'raw': raw}
 
-            sent_message = service.users().messages().send(userId='me', body=body).execute()
+            with timed(GMAIL_LATENCY, stage="gmail", call="send"):
+                sent_message = service.users().messages().send(userId='me', body=body).execute()
+            self._save_refreshed_token(user, token, creds)
             return sent_message
         except Exception as e:
-            print(f"Error sending email: {e}")
+            logger.error("Error sending email: %s", e)
             raise e
 
     def fetch_recent_emails(self, user: User, token: dict):
         try:
-            creds = Credentials(
-                token=token['access_token'],
-                refresh_token=token.get('refresh_token'),
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=os.getenv("GOOGLE_CLIENT_ID"),
-                client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-                scopes=['https://www.googleapis.com/auth/gmail.readonly', 'https://www.googleapis.com/auth/gmail.send']
-            )
-
-            service = build('gmail', 'v1', credentials=creds)
+            creds = self._credentials(token)
+
+            service = gmail_client(creds)
             
             # List messages
-            results = service.users().messages().list(userId='me', maxResults=50).execute()
+            with timed(GMAIL_LATENCY, stage="gmail", call="list"):
+                results = service.users().messages().list(userId='me', maxResults=50).execute()
             messages = results.get('messages', [])
 
             new_emails = []
+            new_times = []
             
-            for msg_meta in messages:
+            # Oldest first, so thread summaries are folded forward in conversation order
+            for msg_meta in reversed(messages):
                 msg_id = msg_meta['id']
                 
-                # Check if already exists (naive check by subject/sender/time combo usually better, but for now ID)
-                # Ideally store msg_id in DB. For MVP skipping "already exists" check complex logic.
+                # EXTRACT GMAIL ID
+                gmail_id = msg_id # 'id' field from message meta
+
+                # DEDUPLICATION CHECK (before fetching the full message)
+                existing_email = self.session.exec(select(Email).where(Email.gmail_id == gmail_id)).first()
+                if existing_email:
+                    logger.debug("Skipping duplicate email: %s", gmail_id, extra=sampled())
+                    continue
                 
-                msg = service.users().messages().get(userId='me', id=msg_id).execute()
+                with timed(GMAIL_LATENCY, stage="gmail", call="get"):
+                    msg = service.users().messages().get(userId='me', id=msg_id).execute()
                 
                 payload = msg['payload']
                 headers = payload.get('headers', [])
@@ -107,37 +148,36 @@ class GmailService:
                 received_time = parsedate_to_datetime(date_str) if date_str else datetime.datetime.utcnow()
                 
                 snippet = msg.get('snippet', '')
+                thread_id = msg.get('threadId') or msg_meta.get('threadId')
                 
                 # Extract Body
                 body = get_email_body(payload)
+
+                # Known thread: earlier messages are already stored, so the quoted chain is redundant.
+                # Analyze only the new content against the rolling thread summary.
+                thread = get_thread(self.session, user.id, thread_id)
+                if thread:
+                    body = strip_quoted_text(body)
                 
                 # Analyze
                 agent_email = AgentEmail(subject, sender, received_time.isoformat(), snippet, body)
-                
-                # EXTRACT GMAIL ID
-                gmail_id = msg_id # 'id' field from message meta
-
-                # DEDUPLICATION CHECK
-                existing_email = self.session.exec(select(Email).where(Email.gmail_id == gmail_id)).first()
-                if existing_email:
-                    print(f"Skipping duplicate email: {gmail_id}")
-                    continue
 
                 # Analyze (Only if new)
                 
                 # Rate limit: Sleep to avoid hitting 15 RPM
                 time.sleep(2) # Reduced from 4s since we skip duplicates now
+                add_stage("rate_limit", 2)
 
-                analysis = self.agent.analyze_email(agent_email)
+                analysis = self.agent.analyze_email(agent_email, thread_summary=thread.summary if thread else None)
                 
                 # Save to DB
                 email_db = Email(
                     gmail_id=gmail_id, # Save ID
+                    thread_id=thread_id,
                     user_id=user.id,
                     subject=subject,
                     sender=sender,
                     snippet=snippet,
-                    body=body,
                     received_time=received_time,
                     intent=analysis.get('intent', 'Unknown'),
                     summary=analysis.get('summary', snippet), 
@@ -149,17 +189,38 @@ class GmailService:
                     sentiment=analysis.get('sentiment'),
                     tone=analysis.get('tone')
                 )
+                email_db.set_body(body)
                 self.session.add(email_db)
                 try:
                     self.session.commit()
                     new_emails.append(email_db)
-                    print(f"✅ Saved Email: {gmail_id}")
+                    new_times.append(received_time)
+                    logger.debug("✅ Saved Email: %s", gmail_id, extra=sampled())
                 except Exception as e:
-                    print(f"⚠️ Failed to save email {gmail_id}: {e}")
+                    logger.warning("⚠️ Failed to save email %s: %s", gmail_id, e)
+                    self.session.rollback()
+                    continue
+
+                try:
+                    record_message(self.session, thread, email_db, analysis)
+                    self.session.commit()
+                except Exception as e:
+                    logger.warning("⚠️ Failed to update thread %s: %s", thread_id, e)
                     self.session.rollback()
             
+            # Flag the day/week digests that received mail; the rollup rebuilds only those
+            if new_times:
+                try:
+                    DigestBuilder(self.session).mark_stale(user.id, new_times)
+                except Exception as e:
+                    logger.warning("⚠️ Failed to flag digests: %s", e)
+                    self.session.rollback()
+
+            self._save_refreshed_token(user, token, creds)
+            # identity reads the primary key without reloading the expired instances
+            self.new_email_ids = [inspect(e).identity[0] for e in new_emails]
             return len(new_emails)
 
         except Exception as e:
-            print(f"Error fetching Gmail: {e}")
+            logger.exception("Error fetching Gmail: %s", e)
             return 0
@@ -0,0 +1,91 @@
+import re
+from typing import Optional, Dict, Any
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select
+from .models import Email, EmailThread
+
+# Rolling summaries are capped so a 200-message thread costs the same prompt tokens as a 2-message one
+MAX_THREAD_SUMMARY_CHARS = 600
+
+# "On Mon, 3 Nov 2025 at 10:00, Jane <jane@x.com> wrote:" (Gmail) and Outlook-style separators
+_QUOTE_HEADER = re.compile(r"^\s*(On\s.+wrote:|-{2,}\s*Original Message\s*-{2,}|From:\s.+)\s*$", re.IGNORECASE)
+
+def strip_quoted_text(body: Optional[str]) -> Optional[str]:
+    """
+    Drops the quoted reply chain from a message body, keeping only the new content.
+    Falls back to the original body if stripping would leave nothing.
+    """
+    if not body:
+        return body
+    kept = []
+    for line in body.splitlines():
+        if _QUOTE_HEADER.match(line):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        kept.append(line)
+    stripped = "\n".join(kept).strip()
+    return stripped or body
+
+def fold_summary(previous: Optional[str], latest: Optional[str]) -> Optional[str]:
+    """
+    Cheap local fold used when the LLM did not return an updated thread summary.
+    Appends the newest message summary and trims the oldest text first.
+    """
+    if not previous:
+        return latest
+    if not latest or latest in previous:
+        return previous
+    folded = f"{previous} → {latest}"
+    if len(folded) > MAX_THREAD_SUMMARY_CHARS:
+        folded = "…" + folded[-(MAX_THREAD_SUMMARY_CHARS - 1):]
+    return folded
+
+def get_thread(session: Session, user_id: int, thread_id: Optional[str]) -> Optional[EmailThread]:
+    if not thread_id:
+        return None
+    stmt = select(EmailThread).where(EmailThread.user_id == user_id, EmailThread.thread_id == thread_id)
+    return session.exec(stmt).first()
+
+def record_message(session: Session, thread: Optional[EmailThread], email: Email, analysis: Dict[str, Any]) -> Optional[EmailThread]:
+    """
+    Adds a freshly stored email to its thread, creating the thread on first sight.
+    Only the new message is folded into the summary. Caller commits.
+    """
+    if not email.thread_id:
+        return None
+
+    received = email.received_time.replace(tzinfo=None)
+    if thread is None:
+        thread = EmailThread(
+            user_id=email.user_id,
+            thread_id=email.thread_id,
+            subject=email.subject,
+            message_count=0,
+            last_email_id=email.id,
+            last_received_time=received,
+            summary=None
+        )
+
+    thread.message_count += 1
+    thread.summary = analysis.get("thread_summary") or fold_summary(thread.summary, email.summary)
+    if thread.summary and len(thread.summary) > MAX_THREAD_SUMMARY_CHARS:
+        thread.summary = thread.summary[:MAX_THREAD_SUMMARY_CHARS]
+    if thread.last_email_id is None or received >= thread.last_received_time.replace(tzinfo=None):
+        thread.last_email_id = email.id
+        thread.last_received_time = received
+    session.add(thread)
+    return thread
+
+def latest_per_thread(user_id: int, *columns):
+    """
+    Statement yielding (*columns, thread_count, thread_summary) for the newest message of
+    each thread, plus legacy emails synced before threads were tracked.
+    Columns default to the full Email entity.
+    """
+    columns = columns or (Email,)
+    return (
+        select(*columns, EmailThread.message_count.label("thread_count"), EmailThread.summary.label("thread_summary"))
+        .outerjoin(EmailThread, and_(EmailThread.user_id == Email.user_id, EmailThread.thread_id == Email.thread_id))
+        .where(Email.user_id == user_id, or_(EmailThread.id == None, EmailThread.last_email_id == Email.id))
+    )
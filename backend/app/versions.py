@@ -0,0 +1,69 @@
+import time
+import logging
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+from .database import get_engine, env_int
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+# Change counters behind the ETags of /api/emails, /api/meetings and /api/chat/history.
+# Writers bump after committing; readers compare counters instead of querying the data tables.
+# Counters are cached per process: local bumps drop the entry at once, and VERSION_CACHE_TTL
+# bounds how long a bump made by another worker can go unseen (a stale 304 at worst).
+VERSION_CACHE_TTL = env_int("VERSION_CACHE_TTL", 5)
+ALL_USERS = "*"
+
+_cache: Dict[Tuple[str, str], Tuple[float, int]] = {}
+_cache_lock = threading.Lock()
+
+def get_version(scope: str, user_email: str, fresh: bool = False) -> int:
+    """
+    Current counter. fresh skips the per-process cache, for callers that must see bumps
+    made by other workers at once.
+    """
+    now = time.monotonic()
+    key = (scope, user_email)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and not fresh and now - cached[0] < VERSION_CACHE_TTL:
+            return cached[1]
+
+    with get_engine().connect() as conn:
+        version = conn.execute(
+            select(DataVersion.version).where(DataVersion.scope == scope, DataVersion.user_email == user_email)
+        ).scalar() or 0
+    with _cache_lock:
+        _cache[key] = (now, version)
+    return version
+
+def bump_version(scope: str, user_email: Optional[str] = ALL_USERS):
+    """
+    Marks the scope as changed for one user (or every user with ALL_USERS). Never raises:
+    a failed bump only costs clients a stale 304 until the next successful one.
+    """
+    if not user_email:
+        return
+    try:
+        with get_engine().begin() as conn:
+            stmt = insert(DataVersion).values(scope=scope, user_email=user_email, version=1)
+            conn.execute(stmt.on_duplicate_key_update(version=DataVersion.version + 1))
+    except Exception as e:
+        logger.warning("⚠️ Version bump failed (%s, %s): %s", scope, user_email, e)
+    with _cache_lock:
+        if user_email == ALL_USERS:
+            for key in [k for k in _cache if k[0] == scope]:
+                del _cache[key]
+        else:
+            _cache.pop((scope, user_email), None)
+
+def data_etag(scope: str, user_email: str, variant: str = "") -> str:
+    """
+    Weak ETag for a user's view of a scope; variant distinguishes pages/windows of the same data.
+    """
+    versions = f"{get_version(scope, ALL_USERS)}.{get_version(scope, user_email)}"
+    digest = hashlib.sha1(f"{scope}|{user_email}|{variant}".encode()).hexdigest()[:12]
+    return f'W/"{scope}-{versions}-{digest}"'
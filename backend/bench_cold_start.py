@@ -0,0 +1,147 @@
+"""
+Cold-start cost of the API: how long a fresh process takes to import app.main, and how long
+until a new uvicorn process answers GET /. Run from the backend directory with the usual .env
+(startup creates/migrates tables, so the database must be reachable):
+
+    python bench_cold_start.py                       # 5 runs of each
+    python bench_cold_start.py --runs 10 --top 15
+    python bench_cold_start.py --record cold_start.jsonl
+
+Every run is a new interpreter, so nothing is cached in-process between runs (the OS page cache
+still is; the first run is usually the slowest). --record appends one JSON line per invocation
+with the current git commit, so results can be compared across commits.
+"""
+import re
+import sys
+import json
+import time
+import socket
+import signal
+import argparse
+import datetime
+import subprocess
+import statistics
+import httpx
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start)"
+)
+# -X importtime lines: "import time:  self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_import() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def top_imports(limit: int) -> list:
+    """
+    Slowest packages imported (directly or not) by app.main, by cumulative time of their
+    outermost import.
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                         capture_output=True, text=True, check=True)
+    totals = {}
+    for line in out.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        package = name.split(".")[0]
+        # The shallowest entry of a package already includes its submodules
+        depth = len(indent)
+        best = totals.get(package)
+        if best is None or depth < best[0] or (depth == best[0] and int(cumulative) > best[1]):
+            totals[package] = (depth, int(cumulative))
+    ranked = sorted(((p, us / 1e6) for p, (_, us) in totals.items() if p != "app"), key=lambda r: -r[1])
+    return ranked[:limit]
+
+def measure_first_response(timeout: float) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup; run it by hand to see the error")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"uvicorn did not answer / within {timeout:.0f}s")
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "min_ms": round(ordered[0] * 1000, 1),
+        "median_ms": round(statistics.median(ordered) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imported packages to list")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the first response")
+    parser.add_argument("--skip-server", action="store_true", help="Only measure the import")
+    parser.add_argument("--record", metavar="FILE", help="Append the results as a JSON line")
+    args = parser.parse_args()
+
+    print(f"⏱️ import app.main x{args.runs}...")
+    imports = [measure_import() for _ in range(args.runs)]
+    result = {"import": summarize(imports)}
+
+    if not args.skip_server:
+        print(f"⏱️ uvicorn start -> first GET / x{args.runs}...")
+        result["first_response"] = summarize([measure_first_response(args.timeout) for _ in range(args.runs)])
+
+    slowest = top_imports(args.top)
+    result["top_imports_ms"] = {name: round(seconds * 1000, 1) for name, seconds in slowest}
+
+    print(f"\n{'':<16} {'min ms':>8} {'median ms':>10} {'max ms':>8}")
+    for label, key in (("import app.main", "import"), ("first response", "first_response")):
+        if key in result:
+            r = result[key]
+            print(f"{label:<16} {r['min_ms']:>8.1f} {r['median_ms']:>10.1f} {r['max_ms']:>8.1f}")
+    print("\nSlowest imports (cumulative):")
+    for name, seconds in slowest:
+        print(f"  {name:<28} {seconds * 1000:>8.1f} ms")
+
+    if args.record:
+        entry = {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            **result,
+        }
+        with open(args.record, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"\n📝 Recorded to {args.record} ({entry['commit']})")
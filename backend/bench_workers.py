@@ -0,0 +1,121 @@
+"""
+Throughput vs. worker count for the prefork server (gunicorn.conf.py).
+Run from the backend directory with the usual .env (the app needs its database to start):
+
+    python bench_workers.py                      # 1, 2, 4 workers
+    python bench_workers.py --workers 1 2 4 8 --duration 20 --clients 16
+
+Each round starts gunicorn with N workers and GEMINI_API_KEY unset, so POST /api/analyze
+exercises only the local scikit-learn models (CPU-bound, no external calls), then drives it
+from client processes with keep-alive connections and reports requests/s and latency.
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import subprocess
+import statistics
+import multiprocessing
+import httpx
+
+SAMPLE_EMAIL = {
+    "subject": "Quarterly review meeting moved to Thursday",
+    "sender": "manager@example.com",
+    "received_time": "2024-05-02T09:30:00",
+    "body_preview": "Hi team, the quarterly review has moved to Thursday at 3pm.",
+    "body": "Hi team,\n\nThe quarterly review has moved to Thursday at 3pm in room 4B. "
+            "Please bring your updated numbers and send me your slides by Wednesday noon.\n\nThanks",
+}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}", GEMINI_API_KEY="")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app", "--access-logfile", "/dev/null"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup; run it by hand to see the error")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not become ready within 60s")
+
+def client(url: str, duration: float, results):
+    latencies = []
+    errors = 0
+    with httpx.Client(timeout=30) as http:
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            try:
+                if http.post(url, json=SAMPLE_EMAIL).status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+    results.put((latencies, errors))
+
+def run_round(workers: int, clients: int, duration: float, warmup: float) -> dict:
+    port = free_port()
+    proc = start_server(workers, port)
+    url = f"http://127.0.0.1:{port}/api/analyze"
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        # Warm-up pass so every worker has imported and touched the models
+        for phase, seconds in (("warmup", warmup), ("measure", duration)):
+            results = ctx.Queue()
+            procs = [ctx.Process(target=client, args=(url, seconds, results)) for _ in range(clients)]
+            for p in procs:
+                p.start()
+            collected = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+    latencies = sorted(l for lats, _ in collected for l in lats)
+    errors = sum(e for _, e in collected)
+    if not latencies:
+        return {"workers": workers, "rps": 0.0, "p50": None, "p95": None, "errors": errors}
+    return {
+        "workers": workers,
+        "rps": len(latencies) / duration,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds measured per round")
+    parser.add_argument("--warmup", type=float, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.workers:
+        print(f"⏱️ {n} worker(s)...")
+        rows.append(run_round(n, args.clients, args.duration, args.warmup))
+
+    base = rows[0]["rps"] or 1
+    print(f"\n{'workers':>7} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for r in rows:
+        p50 = f"{r['p50']:.1f}" if r["p50"] is not None else "-"
+        p95 = f"{r['p95']:.1f}" if r["p95"] is not None else "-"
+        print(f"{r['workers']:>7} {r['rps']:>9.1f} {r['rps'] / base:>7.2f}x {p50:>8} {p95:>8} {r['errors']:>7}")
@@ -0,0 +1,86 @@
+# Production serving: gunicorn master + uvicorn workers.
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# The app (including MailAgent's scikit-learn models) is imported once in the master and the
+# workers fork from it, sharing those pages copy-on-write.
+#
+# Reloads:
+#   kill -HUP <master>    graceful worker restart with the same code (config is re-read)
+#   kill -USR2 <master>   start a new master with new code, then kill -QUIT the old one;
+#                         needed for code changes because the app is preloaded
+import gc
+import os
+import tempfile
+
+def available_cores() -> int:
+    """
+    CPUs this container may actually use: the cgroup CPU quota when set, else the affinity mask.
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError: # Not available on macOS
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f: # cgroup v2
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+def default_workers() -> int:
+    # Inference is CPU-bound and Gemini calls block in each worker's threadpool, so one worker per
+    # core plus one. Capped because every worker holds its own DB pool.
+    return max(2, min(available_cores() + 1, int(os.getenv("WEB_MAX_WORKERS", "8"))))
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Worker heartbeat timeout (uvicorn workers stay responsive during long requests),
+# and how long in-flight requests get to finish on reload/shutdown. SSE clients reconnect.
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth (0 disables)
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+# Workers write metrics here and any worker's scrape aggregates them (app/metrics.py).
+# Must be set before the app is imported, i.e. at config load rather than in a hook.
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="aiagent-metrics-")
+
+def on_starting(server):
+    # Workers relay push events to each other through this directory (see app/events.py)
+    if not os.getenv("EVENT_RELAY_DIR"):
+        os.environ["EVENT_RELAY_DIR"] = tempfile.mkdtemp(prefix="aiagent-events-")
+
+def when_ready(server):
+    # Runs after the preloaded import, before the first fork. The app defers its heavy imports and
+    # models to first use, so load them here once for all workers to share copy-on-write.
+    from app.main import warm_up
+    warm_up()
+    # Then move everything allocated so far out of the GC's reach so collections in workers
+    # don't touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Serving with {server.num_workers} workers ({available_cores()} cores available)")
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def post_fork(server, worker):
+    # Connections and HTTP clients opened in the master (warm-up) must not be shared
+    from app.database import engine_created, get_engine
+    from app.llm import reset_client
+    if engine_created():
+        get_engine().dispose(close=False)
+    reset_client()
@@ -8,13 +8,15 @@ import os
 
 def train_spam_filter():
     # 1. Load Data
-    data_path = "backend/training_data/unified_spam_data.csv"
-    if not os.path.exists(data_path):
+    # unify_data.py writes Parquet when pyarrow is installed, CSV otherwise
+    candidates = ["backend/training_data/unified_spam_data.parquet", "backend/training_data/unified_spam_data.csv"]
+    data_path = next((p for p in candidates if os.path.exists(p)), None)
+    if not data_path:
         print("❌ Unified data not found. Run unify_data.py first.")
         return
 
     print("📊 Loading dataset...")
-    df = pd.read_csv(data_path)
+    df = pd.read_parquet(data_path) if data_path.endswith(".parquet") else pd.read_csv(data_path)
     
     # Handle missing values just in case
     df['text'] = df['text'].fillna('')
@@ -1,74 +1,226 @@
-import pandas as pd
-import glob
+"""
+Merges the spam corpora in backend/training_data/*.csv into one (text, label) dataset,
+1 = spam, 0 = ham, without holding any corpus in memory. Run from the repo root:
+
+    python backend/unify_data.py
+    python backend/unify_data.py --workers 4 --chunk-size 50000
+
+Each input file is read in chunks by its own worker process (column mapping, label cleanup,
+64-bit text digests) and spilled to a temporary file. The parent then streams the spills in
+file order, drops texts it has already seen (by digest; 8 bytes per unique text), and appends
+the rest to the output, so memory stays bounded by the chunk size plus the digest set.
+Output is Parquet when pyarrow is installed, CSV otherwise.
+"""
 import os
+import glob
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
 
-def unify_datasets():
-    all_files = glob.glob("backend/training_data/*.csv")
-    print(f"Found {len(all_files)} files.")
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Optional: fall back to CSV output
+    pa = pq = None
 
-    unified_data = []
+DATA_DIR = "backend/training_data"
+OUTPUT_BASE = os.path.join(DATA_DIR, "unified_spam_data")
+CHUNK_SIZE = 50_000
 
-    for file in all_files:
-        try:
-            df = pd.read_csv(file, encoding='latin-1') # encoding fallback often needed for spam data
-            print(f"Processing {os.path.basename(file)} | Columns: {list(df.columns)}")
-            
-            # Map columns
-            # Standard: 'text' and 'label' (1=Spam, 0=Ham)
-            
-            # 1. SMS_train.csv / SMS_test.csv: 'Message_body', 'Label' ('Spam'/'Non-Spam')
-            if 'Message_body' in df.columns:
-                df = df.rename(columns={'Message_body': 'text', 'Label': 'label'})
-                df['label'] = df['label'].map({'Spam': 1, 'Non-Spam': 0})
-            
-            # 2. Enron.csv: 'body', 'label' ('Spam'/'Ham' ?) or 1/0
-            elif 'body' in df.columns and 'label' in df.columns:
-                df = df.rename(columns={'body': 'text'})
-                # Check label type
-                if df['label'].dtype == 'object':
-                     df['label'] = df['label'].map({'Spam': 1, 'Ham': 0, 'spam': 1, 'ham': 0})
-            
-            # 3. Phishing: 'text_combined', 'label'
-            elif 'text_combined' in df.columns:
-                 df = df.rename(columns={'text_combined': 'text'})
-                 # Likely already 1/0 but just in case
-            
-            # 4. Fallback for generic 'text'/'label' if exist
-            elif 'text' in df.columns and 'label' in df.columns:
-                pass # Good
-            
-            else:
-                print(f"⚠️ Skipping {file}: Could not map columns.")
-                continue
-
-            # Clean and Select
-            df = df[['text', 'label']]
-            df['label'] = pd.to_numeric(df['label'], errors='coerce')
-            df = df.dropna()
-
-            unified_data.append(df)
-            print(f"✅ Added {len(df)} rows from {os.path.basename(file)}")
-
-        except Exception as e:
-            print(f"❌ Error processing {file}: {e}")
-
-    if not unified_data:
+class ChunkWriter:
+    """
+    Appends DataFrames with a fixed set of columns to one Parquet (row group per chunk) or CSV file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self._parquet = None
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        if pq is not None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self._parquet.write_table(table)
+        else:
+            df.to_csv(self.path, mode="a", header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+class DigestSet:
+    """
+    Set of uint64 digests kept as a few sorted arrays (8 bytes per entry), merged as they
+    accumulate so lookups stay a handful of binary searches.
+    """
+    MAX_LEVELS = 8
+
+    def __init__(self):
+        self.levels = []
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def add_new(self, digests: np.ndarray) -> np.ndarray:
+        """
+        Adds the digests and returns a mask of the positions seen for the first time
+        (the first occurrence within this batch counts as new).
+        """
+        mask = np.zeros(len(digests), dtype=bool)
+        if not len(digests):
+            return mask
+        unique, first = np.unique(digests, return_index=True)
+        fresh = np.ones(len(unique), dtype=bool)
+        for level in self.levels:
+            pos = np.searchsorted(level, unique)
+            pos[pos == len(level)] = 0
+            fresh &= level[pos] != unique
+        mask[first[fresh]] = True
+        if fresh.any():
+            self.levels.append(unique[fresh]) # np.unique output is already sorted
+            if len(self.levels) > self.MAX_LEVELS:
+                self.levels = [np.sort(np.concatenate(self.levels))]
+        return mask
+
+def normalize_chunk(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Maps one chunk of a known corpus layout to (text, label); None if the columns aren't recognised.
+    """
+    # Map columns
+    # Standard: 'text' and 'label' (1=Spam, 0=Ham)
+
+    # 1. SMS_train.csv / SMS_test.csv: 'Message_body', 'Label' ('Spam'/'Non-Spam')
+    if 'Message_body' in df.columns:
+        df = df.rename(columns={'Message_body': 'text', 'Label': 'label'})
+        df['label'] = df['label'].map({'Spam': 1, 'Non-Spam': 0})
+
+    # 2. Enron.csv: 'body', 'label' ('Spam'/'Ham' ?) or 1/0
+    elif 'body' in df.columns and 'label' in df.columns:
+        df = df.rename(columns={'body': 'text'})
+        # Check label type (string labels are 'object' or, on pandas 3, 'str')
+        if not pd.api.types.is_numeric_dtype(df['label']):
+            df['label'] = df['label'].map({'Spam': 1, 'Ham': 0, 'spam': 1, 'ham': 0})
+
+    # 3. Phishing: 'text_combined', 'label' (likely already 1/0)
+    elif 'text_combined' in df.columns:
+        df = df.rename(columns={'text_combined': 'text'})
+
+    # 4. Fallback for generic 'text'/'label' if exist
+    elif 'text' in df.columns and 'label' in df.columns:
+        pass # Good
+
+    else:
+        return None
+
+    # Clean and Select
+    df = df[['text', 'label']].copy()
+    df['label'] = pd.to_numeric(df['label'], errors='coerce')
+    df = df.dropna()
+    df['text'] = df['text'].astype(str)
+    df['label'] = df['label'].astype('int8')
+    return df
+
+def process_file(path: str, spill_dir: str, chunk_size: int) -> dict:
+    """
+    Worker: normalizes one corpus chunk by chunk into a spill file with a digest column.
+    """
+    name = os.path.basename(path)
+    ext = ".parquet" if pq is not None else ".csv"
+    writer = ChunkWriter(os.path.join(spill_dir, name + ext))
+    columns = None
+    try:
+        # encoding fallback often needed for spam data
+        for chunk in pd.read_csv(path, encoding='latin-1', chunksize=chunk_size):
+            columns = columns or list(chunk.columns)
+            df = normalize_chunk(chunk)
+            if df is None:
+                return {"file": name, "columns": columns, "skipped": "Could not map columns"}
+            df['digest'] = pd.util.hash_pandas_object(df['text'], index=False).to_numpy(dtype=np.uint64).view(np.int64)
+            writer.write(df)
+    except Exception as e:
+        return {"file": name, "columns": columns, "error": str(e)}
+    finally:
+        writer.close()
+    return {"file": name, "columns": columns, "rows": writer.rows, "spill": writer.path if writer.rows else None}
+
+def unify_datasets(workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE):
+    all_files = sorted(glob.glob(os.path.join(DATA_DIR, "*.csv")))
+    # Our own output (CSV fallback) must not be read back as an input
+    all_files = [f for f in all_files if not os.path.basename(f).startswith("unified_")]
+    print(f"Found {len(all_files)} files.")
+    if not all_files:
         print("No data loaded!")
         return
 
-    # Merge
-    master_df = pd.concat(unified_data, ignore_index=True)
-    
-    # Final cleanup
-    master_df['label'] = master_df['label'].astype(int)
-    master_df = master_df.drop_duplicates(subset=['text'])
-    
-    output_path = "backend/training_data/unified_spam_data.csv"
-    master_df.to_csv(output_path, index=False)
+    output_path = OUTPUT_BASE + (".parquet" if pq is not None else ".csv")
+    if pq is None:
+        print("⚠️ pyarrow not installed; writing CSV instead of Parquet")
+    spill_dir = tempfile.mkdtemp(prefix="unify-", dir=DATA_DIR)
+    try:
+        # Independent files are normalized in parallel
+        with ProcessPoolExecutor(max_workers=workers or min(len(all_files), os.cpu_count() or 1)) as pool:
+            results = list(pool.map(process_file, all_files, [spill_dir] * len(all_files), [chunk_size] * len(all_files)))
+
+        # Merge in file order, so the first occurrence of a text wins as before
+        tmp_output = output_path + ".tmp"
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        writer = ChunkWriter(tmp_output)
+        seen = DigestSet()
+        spam = ham = 0
+        try:
+            for result in results:
+                print(f"Processing {result['file']} | Columns: {result['columns']}")
+                if "error" in result:
+                    print(f"❌ Error processing {result['file']}: {result['error']}")
+                    continue
+                if "skipped" in result:
+                    print(f"⚠️ Skipping {result['file']}: {result['skipped']}")
+                    continue
+                added = 0
+                if result["spill"]:
+                    for df in read_chunks(result["spill"], chunk_size):
+                        df = df[seen.add_new(df['digest'].to_numpy(dtype=np.int64).view(np.uint64))]
+                        writer.write(df[['text', 'label']])
+                        added += len(df)
+                        spam += int((df['label'] == 1).sum())
+                        ham += int((df['label'] == 0).sum())
+                print(f"✅ Added {added} of {result['rows']} rows from {result['file']}")
+        finally:
+            writer.close()
+
+        if not writer.rows:
+            print("No data loaded!")
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            return
+        os.replace(tmp_output, output_path)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
     print(f"\n🎉 Success! Unified dataset saved to {output_path}")
-    print(f"Total Samples: {len(master_df)}")
-    print(f"Spam Count: {len(master_df[master_df['label']==1])}")
-    print(f"Ham Count: {len(master_df[master_df['label']==0])}")
+    print(f"Total Samples: {writer.rows}")
+    print(f"Spam Count: {spam}")
+    print(f"Ham Count: {ham}")
 
 if __name__ == "__main__":
-    unify_datasets()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, help="Files processed in parallel (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per chunk")
+    args = parser.parse_args()
+    unify_datasets(args.workers, args.chunk_size)
@@ -1,124 +1,178 @@
-import pandas as pd
+"""
+Merges the intent corpora in backend/training_data/intent_raw/*.csv into
+backend/training_data/unified_intent_data.csv (text, comma-separated labels). Run from the repo root:
+
+    python backend/unify_intent.py [--workers N]
+
+Files are read and relabeled in parallel, one per worker process. Labels are normalized once
+per distinct raw label and fragment, with a single compiled matcher for all VALID_CATEGORIES
+keys instead of a substring check per key, and the results are mapped back to the rows in bulk.
+"""
+import argparse
 import glob
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+
+# Standard Categories to map towards
+# A label fragment containing one of these keys maps to its category; when several keys
+# occur, the one listed first wins
+VALID_CATEGORIES = {
+    'urgent': 'Urgent',
+    'action': 'Urgent',
+    'critical': 'Urgent',
+    'finance': 'Finance',
+    'invoice': 'Finance',
+    'payment': 'Finance',
+    'bill': 'Finance',
+    'bank': 'Finance',
+    'meeting': 'Meeting',
+    'calendar': 'Meeting',
+    'schedule': 'Meeting',
+    'work': 'Work',
+    'project': 'Work',
+    'job': 'Work',
+    'spam': 'Spam',
+    'junk': 'Spam',
+    'phishing': 'Phishing',
+    'security': 'Phishing',
+    'newsletter': 'Newsletter',
+    'marketing': 'Newsletter',
+    'promotion': 'Newsletter',
+    'personal': 'Personal',
+    'family': 'Personal',
+    'social': 'Personal',
+    'notification': 'Notification',
+    'alert': 'Notification',
+    'system': 'Notification',
+    'receipt': 'Receipts',
+    'order': 'Receipts',
+    'purchase': 'Receipts',
+    'shipping': 'Receipts'
+}
+
+TEXT_COLUMNS = ['body', 'text', 'message', 'content', 'email_text', 'subject']
+# Some files might have 'label', 'lable', 'category', 'new_category'
+LABEL_COLUMNS = ['label', 'lable', 'labels', 'category', 'new_category', 'type', 'class']
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex alternation factored by common prefixes ("b(?:ank|ill)"), so each position in the
+    input is tested against the keys in one pass rather than key by key.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {} # End of a word
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+# Zero-width lookahead so overlapping keys are all found; the category is then picked by key order
+KEY_RE = re.compile(f"(?=({trie_pattern(VALID_CATEGORIES)}))")
+KEY_PRIORITY = {key: i for i, key in enumerate(VALID_CATEGORIES)}
+SEPARATORS = re.compile(r"[|,;]")
+
+def normalize_labels(raw: pd.Series) -> pd.Series:
+    """
+    Standardize Labels (Multi-Label Logic): splits each raw label on | , ; and maps every fragment
+    to a standard category, or keeps it title-cased if it is longer than two characters.
+    Returns the sorted, comma-joined categories per row ("" when nothing is left;
+    "Uncategorized" for non-string labels).
+    """
+    # Each distinct label (and fragment) is normalized once, then scattered back to the rows
+    codes, values = pd.factorize(raw) # Missing labels get code -1
+    matched: Dict[str, str] = {}
+
+    def category(fragment: str) -> Optional[str]:
+        lowered = fragment.strip().lower()
+        found = matched.get(lowered)
+        if found is None:
+            keys = KEY_RE.findall(lowered)
+            found = matched[lowered] = VALID_CATEGORIES[min(keys, key=KEY_PRIORITY.__getitem__)] if keys else ""
+        # Keep original if no map found, but capitalized
+        return found or (fragment.title() if len(fragment) > 2 else None)
 
-def unify_intent_datasets():
+    cleaned = []
+    for value in values:
+        if not isinstance(value, str):
+            cleaned.append("Uncategorized")
+            continue
+        categories = {category(fragment) for fragment in SEPARATORS.split(value)}
+        categories.discard(None)
+        cleaned.append(",".join(sorted(categories)))
+    cleaned.append("Uncategorized") # Code -1
+    return pd.Series(np.array(cleaned, dtype=object)[codes], index=raw.index, name=raw.name)
+
+def find_column(columns, candidates) -> Optional[str]:
+    lowered = [c.lower() for c in columns]
+    for candidate in candidates:
+        if candidate in lowered:
+            return columns[lowered.index(candidate)]
+    return None
+
+def process_file(file: str) -> dict:
+    """
+    Worker: loads and relabels one file. Log lines are returned and printed by the parent, in order.
+    """
+    log = [f"Processing {os.path.basename(file)}..."]
+    try:
+        df = pd.read_csv(file, encoding='latin-1')
+
+        # 1. Fuzzy Column Matching
+        text_col = find_column(list(df.columns), TEXT_COLUMNS)
+        label_col = find_column(list(df.columns), LABEL_COLUMNS)
+        if not text_col or not label_col:
+            log.append(f"⚠️ Skipping {file}: Could not find text/label columns. (Found: {df.columns.tolist()})")
+            return {"log": log, "df": None}
+
+        # 2. Rename and Select
+        df = df.rename(columns={text_col: 'text', label_col: 'raw_label'})
+        df = df[['text', 'raw_label']]
+
+        # 3. Clean Blank Rows
+        initial_count = len(df)
+        df = df.dropna(subset=['text', 'raw_label'])
+        df = df[df['text'].str.strip() != '']
+        df = df[df['raw_label'].str.strip() != '']
+        log.append(f"   🧹 Removed {initial_count - len(df)} blank rows.")
+
+        # 4. Standardize Labels
+        df = df.assign(label=normalize_labels(df['raw_label']))
+
+        # Drop Uncategorized if training data implies it
+        df = df[df['label'] != '']
+        log.append(f"   ✅ Added {len(df)} rows.")
+        return {"log": log, "df": df[['text', 'label']]}
+
+    except Exception as e:
+        log.append(f"❌ Error processing {file}: {e}")
+        return {"log": log, "df": None}
+
+def unify_intent_datasets(workers: Optional[int] = None):
     # Folder containing the new intent CSVs
     raw_folder = "backend/training_data/intent_raw"
-    all_files = glob.glob(f"{raw_folder}/*.csv")
+    all_files = sorted(glob.glob(f"{raw_folder}/*.csv"))
     print(f"📂 Found {len(all_files)} files in {raw_folder}")
 
     unified_data = []
-
-    # Standard Categories to map towards
-    # We will try to fuzzy matches to these
-    VALID_CATEGORIES = {
-        'urgent': 'Urgent',
-        'action': 'Urgent',
-        'critical': 'Urgent',
-        'finance': 'Finance',
-        'invoice': 'Finance',
-        'payment': 'Finance',
-        'bill': 'Finance',
-        'bank': 'Finance',
-        'meeting': 'Meeting',
-        'calendar': 'Meeting',
-        'schedule': 'Meeting',
-        'work': 'Work',
-        'project': 'Work',
-        'job': 'Work',
-        'spam': 'Spam',
-        'junk': 'Spam',
-        'phishing': 'Phishing',
-        'security': 'Phishing',
-        'newsletter': 'Newsletter',
-        'marketing': 'Newsletter',
-        'promotion': 'Newsletter',
-        'personal': 'Personal',
-        'family': 'Personal',
-        'social': 'Personal',
-        'notification': 'Notification',
-        'alert': 'Notification',
-        'system': 'Notification',
-        'receipt': 'Receipts',
-        'order': 'Receipts',
-        'purchase': 'Receipts',
-        'shipping': 'Receipts'
-    }
-
-    for file in all_files:
-        try:
-            print(f"Processing {os.path.basename(file)}...")
-            df = pd.read_csv(file, encoding='latin-1')
-            
-            # 1. Fuzzy Column Matching
-            text_col = None
-            label_col = None
-            
-            cols = [c.lower() for c in df.columns]
-            
-            # Find Text Column
-            for candidate in ['body', 'text', 'message', 'content', 'email_text', 'subject']:
-                if candidate in cols:
-                    text_col = df.columns[cols.index(candidate)]
-                    break
-            
-            # Find Label Column
-            # Some files might have 'label', 'lable', 'category', 'new_category'
-            for candidate in ['label', 'lable', 'labels', 'category', 'new_category', 'type', 'class']:
-                # Exact match first
-                if candidate in cols:
-                     label_col = df.columns[cols.index(candidate)]
-                     break
-            
-            if not text_col or not label_col:
-                print(f"⚠️ Skipping {file}: Could not find text/label columns. (Found: {df.columns.tolist()})")
-                continue
-
-            # 2. Rename and Select
-            df = df.rename(columns={text_col: 'text', label_col: 'raw_label'})
-            df = df[['text', 'raw_label']]
-
-            # 3. Clean Blank Rows
-            initial_count = len(df)
-            df = df.dropna(subset=['text', 'raw_label'])
-            df = df[df['text'].str.strip() != '']
-            df = df[df['raw_label'].str.strip() != '']
-            print(f"   🧹 Removed {initial_count - len(df)} blank rows.")
-
-            # 4. Standardize Labels (Multi-Label Logic)
-            def clean_labels(raw):
-                if not isinstance(raw, str): return "Uncategorized"
-                
-                # Split by common delimiters
-                parts = re.split(r'[|,;]', raw)
-                cleaned = set()
-                
-                for p in parts:
-                    p_lower = p.strip().lower()
-                    # Try to map to standard category
-                    for key, standard in VALID_CATEGORIES.items():
-                        if key in p_lower:
-                            cleaned.add(standard)
-                            break
-                    else:
-                        # Keep original if no map found, but capitalized
-                        if len(p) > 2:
-                             cleaned.add(p.title())
-                
-                return ",".join(list(cleaned))
-
-            df['label'] = df['raw_label'].apply(clean_labels)
-            
-            # Drop Uncategorized if training data implies it
-            df = df[df['label'] != '']
-            
-            unified_data.append(df[['text', 'label']])
-            print(f"   ✅ Added {len(df)} rows.")
-
-        except Exception as e:
-            print(f"❌ Error processing {file}: {e}")
+    if all_files:
+        with ProcessPoolExecutor(max_workers=workers or min(len(all_files), os.cpu_count() or 1)) as pool:
+            for result in pool.map(process_file, all_files):
+                print("\n".join(result["log"]))
+                if result["df"] is not None:
+                    unified_data.append(result["df"])
 
     # Merge
     if not unified_data:
@@ -127,11 +181,14 @@ def unify_intent_datasets():
 
     master_df = pd.concat(unified_data, ignore_index=True)
     master_df = master_df.drop_duplicates(subset=['text'])
-    
+
     # Save
     master_df.to_csv("backend/training_data/unified_intent_data.csv", index=False)
     print(f"\n🎉 Unified Intent Data Saved! Total Samples: {len(master_df)}")
     print("Top Categories:\n", master_df['label'].value_counts().head(10))
 
 if __name__ == "__main__":
-    unify_intent_datasets()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, help="Files processed in parallel (default: CPU count)")
+    args = parser.parse_args()
+    unify_intent_datasets(args.workers)
@@ -1,12 +1,13 @@
 import { toast, Toaster } from 'react-hot-toast'
 
 
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { PriorityChart, CategoryChart } from './components/Charts'
 import MeetingAgentChat from './MeetingAgentChat'
 import MeetingDashboard from './components/MeetingDashboard'
 import ComposeModal from './components/ComposeModal'
 import Tutorial from './components/Tutorial'
+import useEventStream from './useEventStream'
 
 function App() {
   const [view, setView] = useState('landing') // landing, dashboard
@@ -14,6 +15,7 @@ function App() {
   const [category, setCategory] = useState('All') // Filter state
   const [user, setUser] = useState(null)
   const [emails, setEmails] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [syncing, setSyncing] = useState(false)
   const [expandedEmailId, setExpandedEmailId] = useState(null)
 
@@ -24,6 +26,10 @@ function App() {
   // Chat Widget State
   const [showChat, setShowChat] = useState(false)
 
+  // Meetings in the reminder window; refetched when the server says the calendar changed
+  const [meetingsVersion, setMeetingsVersion] = useState(0)
+  const upcomingMeetings = useRef({ items: [], fetchedAt: 0 })
+
   const openCompose = (data = {}) => {
     setComposeData(data)
     setIsComposeOpen(true)
@@ -70,66 +76,134 @@ function App() {
     }
   }, [])
 
-  // Poll for upcoming meetings for notifications
+  const fetchUpcomingMeetings = async () => {
+    const token = localStorage.getItem('token');
+    if (!token) return;
+
+    try {
+      // Only the next ~day matters for reminders; the window also expands recurring meetings.
+      // Aligned to the hour so repeated fetches share a URL and revalidate with a 304.
+      const hour = new Date();
+      hour.setMinutes(0, 0, 0);
+      const windowStart = new Date(hour.getTime() - 60 * 60 * 1000).toISOString();
+      const windowEnd = new Date(hour.getTime() + 26 * 60 * 60 * 1000).toISOString();
+      const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/meetings?start=${encodeURIComponent(windowStart)}&end=${encodeURIComponent(windowEnd)}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (res.ok) {
+        upcomingMeetings.current = { items: await res.json(), fetchedAt: Date.now() };
+      }
+    } catch (e) { console.error(e) }
+  };
+
+  // Server push: merge new mail, refetch meetings on change, surface background job progress
+  const handleServerEvent = (event, payload) => {
+    if (event === 'emails.new') {
+      setEmails(prev => {
+        const threads = new Set(payload.items.map(e => e.thread_id));
+        const rest = prev.filter(e => !e.thread_id || !threads.has(e.thread_id));
+        return [...payload.items, ...rest].sort((a, b) => new Date(b.received_time) - new Date(a.received_time));
+      });
+    } else if (event === 'meetings.changed') {
+      setMeetingsVersion(v => v + 1);
+      fetchUpcomingMeetings();
+    } else if (event === 'job' && payload.status === 'failed') {
+      toast.error(`Background ${payload.job} job failed.`);
+    } else if (event === 'job' && payload.job === 'digests' && payload.status === 'finished') {
+      toast(`Inbox digests updated.`, { icon: '🗂️' });
+    } else if (event === 'resync') {
+      fetchEmails();
+      setMeetingsVersion(v => v + 1);
+      fetchUpcomingMeetings();
+    }
+  };
+
+  const streamConnected = useEventStream(!!user, handleServerEvent);
+
+  // Meeting reminders, checked every minute against the cached window
   useEffect(() => {
     const checkMeetings = async () => {
-      const token = localStorage.getItem('token');
-      if (!token) return;
-
-      try {
-        const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/meetings`, {
-          headers: { 'Authorization': `Bearer ${token}` }
-        });
-        if (res.ok) {
-          const meetings = await res.json();
-          const now = new Date();
-
-          meetings.forEach(m => {
-            const start = new Date(m.start_time);
-            const diffMs = start - now;
-            const diffMins = diffMs / (1000 * 60);
-
-            // Notification logic: 1 day (around 1440 mins), 2 hours (120 mins), 0 mins
-            // We use a small window (e.g., 0-1 min) to avoid duplicate alerts.
-
-            // 24 hours before (1439-1441 mins)
-            if (diffMins >= 1439 && diffMins <= 1441) {
-              toast(`Upcoming Meeting Tomorrow: ${m.title} at ${start.toLocaleTimeString()}`, { icon: '📅' });
-            }
-            // 2 hours before (119-121 mins)
-            if (diffMins >= 119 && diffMins <= 121) {
-              toast(`Meeting in 2 Hours: ${m.title}`, { icon: '⏳' });
-            }
-            // Starting now (0-2 mins)
-            if (diffMins >= 0 && diffMins <= 2) {
-              toast(`Meeting Starting Now: ${m.title}`, { icon: '🚀', duration: 10000 });
-            }
-          });
+      // Pushes keep the cache current while the stream is up; otherwise fall back to polling.
+      // The window itself slides, so it is refreshed hourly either way.
+      const stale = Date.now() - upcomingMeetings.current.fetchedAt > 60 * 60 * 1000;
+      if (!streamConnected || stale) await fetchUpcomingMeetings();
+
+      const now = new Date();
+      upcomingMeetings.current.items.forEach(m => {
+        const start = new Date(m.start_time);
+        const diffMs = start - now;
+        const diffMins = diffMs / (1000 * 60);
+
+        // Notification logic: 1 day (around 1440 mins), 2 hours (120 mins), 0 mins
+        // We use a small window (e.g., 0-1 min) to avoid duplicate alerts.
+
+        // 24 hours before (1439-1441 mins)
+        if (diffMins >= 1439 && diffMins <= 1441) {
+          toast(`Upcoming Meeting Tomorrow: ${m.title} at ${start.toLocaleTimeString()}`, { icon: '📅' });
+        }
+        // 2 hours before (119-121 mins)
+        if (diffMins >= 119 && diffMins <= 121) {
+          toast(`Meeting in 2 Hours: ${m.title}`, { icon: '⏳' });
         }
-      } catch (e) { console.error(e) }
+        // Starting now (0-2 mins)
+        if (diffMins >= 0 && diffMins <= 2) {
+          toast(`Meeting Starting Now: ${m.title}`, { icon: '🚀', duration: 10000 });
+        }
+      });
     };
 
     // Check every minute
     const interval = setInterval(checkMeetings, 60000);
     checkMeetings(); // Initial check
     return () => clearInterval(interval);
-  }, []);
+  }, [streamConnected]);
 
-  const fetchEmails = async () => {
+  // Pass a cursor to append the next page, omit it to reload the first page
+  const fetchEmails = async (cursor = null) => {
     const token = localStorage.getItem('token');
     if (!token) return;
 
     try {
-      const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/emails`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/emails${query}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (res.ok) {
         const data = await res.json()
-        setEmails(data)
+        setEmails(prev => cursor ? [...prev, ...data.items] : data.items)
+        setNextCursor(data.next_cursor)
       }
     } catch (e) { console.error(e) }
   }
 
+  // The list only carries a slim projection; body and suggested reply are loaded on demand
+  const loadEmailDetail = async (id) => {
+    const loaded = emails.find(e => e.id === id);
+    if (loaded && loaded.body !== undefined) return loaded;
+
+    const token = localStorage.getItem('token');
+    try {
+      const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/emails/${id}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      })
+      if (res.ok) {
+        const detail = await res.json()
+        setEmails(prev => prev.map(e => e.id === id ? { ...e, ...detail } : e))
+        return { ...loaded, ...detail }
+      }
+    } catch (e) { console.error(e) }
+    return loaded;
+  }
+
+  const toggleEmail = (id) => {
+    if (id === expandedEmailId) {
+      setExpandedEmailId(null);
+      return;
+    }
+    setExpandedEmailId(id);
+    loadEmailDetail(id);
+  }
+
   const handleSync = async () => {
     setSyncing(true)
     const token = localStorage.getItem('token');
@@ -158,7 +232,8 @@ function App() {
       const data = await res.json()
       if (data.count && data.count > 0) {
         toast.success(`${data.count} new emails analyzed.`, { id: toastId });
-        fetchEmails()
+        // With the stream open the new rows already arrived as an emails.new event
+        if (!streamConnected) fetchEmails()
       } else {
         toast.success("No new emails found.", { id: toastId });
       }
@@ -181,7 +256,7 @@ function App() {
         headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
       });
       if (res.ok) {
-        toast.success("Database Reset & Schema Fixed!", { id: toastId });
+        toast.success("Database Reset!", { id: toastId });
         setEmails([]);
       } else {
         const err = await res.json();
@@ -463,7 +538,7 @@ function App() {
                   .map(email => (
                     <div
                       key={email.id}
-                      onClick={() => setExpandedEmailId(email.id === expandedEmailId ? null : email.id)}
+                      onClick={() => toggleEmail(email.id)}
                       className={`relative group p-6 rounded-2xl bg-white/5 border border-white/10 hover:bg-white/10 hover:border-primary/50 transition-all duration-300 shadow-lg hover:shadow-primary/20 backdrop-blur-md overflow-hidden cursor-pointer ${email.id === expandedEmailId ? 'ring-2 ring-primary' : ''}`}
                     >
                       {/* Decorative Gradient Line */}
@@ -485,6 +560,7 @@ function App() {
                             </div>
                           </div>
                           <div className="flex items-center gap-2">
+                            {email.thread_count > 1 && <span className="px-2 py-0.5 rounded text-[10px] font-bold bg-white/10 text-gray-300 border border-white/10 uppercase tracking-wider">{email.thread_count} msgs</span>}
                             {email.priority === 'P1' && <span className="px-2 py-0.5 rounded text-[10px] font-bold bg-red-500/20 text-red-400 border border-red-500/20 uppercase tracking-wider">Urgent</span>}
                             {email.requires_action && <span className="px-2 py-0.5 rounded text-[10px] font-bold bg-green-500/20 text-green-400 border border-green-500/20 uppercase tracking-wider">Action</span>}
                           </div>
@@ -510,6 +586,9 @@ function App() {
                               <p className="text-sm font-medium text-blue-200">
                                 {email.summary || email.snippet.substring(0, 100) + "..."}
                               </p>
+                              {email.thread_count > 1 && email.thread_summary && (
+                                <p className="text-xs text-gray-400 mt-1">🧵 {email.thread_summary}</p>
+                              )}
                               {/* Tags */}
                               <div className="flex flex-wrap gap-2 mt-2">
                                 <span className="text-[10px] uppercase tracking-wide text-gray-400 bg-white/5 px-2 py-1 rounded border border-white/5">{email.intent}</span>
@@ -546,14 +625,15 @@ function App() {
 
 
                           {/* AI Suggested Reply Button - Only show if AI actually generated one */}
-                          {email.suggested_reply && (
+                          {email.has_suggested_reply && (
                             <button
-                              onClick={(e) => {
+                              onClick={async (e) => {
                                 e.stopPropagation();
+                                const detail = await loadEmailDetail(email.id);
                                 openCompose({
                                   to: email.sender,
                                   subject: `Re: ${email.subject}`,
-                                  body: email.suggested_reply
+                                  body: detail?.suggested_reply || ''
                                 });
                               }}
                               className="btn-primary text-xs px-4 py-2 bg-gradient-to-r from-indigo-500 to-purple-500 hover:from-indigo-400 hover:to-purple-400 border-none flex items-center gap-2 rounded-lg shadow-lg shadow-purple-500/20"
@@ -574,6 +654,16 @@ function App() {
                       </div>
                     </div>
                   ))}
+                {nextCursor && (
+                  <div className="flex justify-center pt-2">
+                    <button
+                      onClick={() => fetchEmails(nextCursor)}
+                      className="px-4 py-2 rounded-lg text-sm font-bold text-gray-300 bg-white/5 hover:bg-white/10 border border-white/10 transition-colors"
+                    >
+                      Load more
+                    </button>
+                  </div>
+                )}
                 {emails.length === 0 && (
                   <div className="flex flex-col items-center justify-center py-20 text-gray-500 opacity-50">
                     <svg className="w-16 h-16 mb-4" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path strokeLinecap="round" strokeLinejoin="round" strokeWidth={1} d="M20 13V6a2 2 0 00-2-2H6a2 2 0 00-2 2v7m16 0v5a2 2 0 01-2 2H6a2 2 0 01-2-2v-5m16 0h-2.586a1 1 0 00-.707.293l-2.414 2.414a1 1 0 01-.707.293h-3.172a1 1 0 01-.707-.293l-2.414-2.414A1 1 0 006.586 13H4" /></svg>
@@ -587,7 +677,7 @@ function App() {
             {/* CALENDAR TAB */}
             {tab === 'calendar' && (
               <div className="animate-fade-in">
-                <MeetingDashboard />
+                <MeetingDashboard refreshKey={meetingsVersion} />
               </div>
             )}
           </div>
@@ -3,28 +3,33 @@ import React, { useState, useEffect } from 'react';
 function MeetingAgentChat({ isWidget, onClose }) {
     const [input, setInput] = useState('');
     const [messages, setMessages] = useState([]);
+    const [olderCursor, setOlderCursor] = useState(null);
 
-    useEffect(() => {
-        const fetchHistory = async () => {
-            const token = localStorage.getItem('token');
-            if (!token) return;
-            try {
-                const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/chat/history`, {
-                    headers: { 'Authorization': `Bearer ${token}` }
-                });
-                if (res.ok) {
-                    const history = await res.json();
-                    // Convert DB history to UI messages
-                    const uiMessages = history.map(h => ({
-                        sender: h.sender,
-                        text: h.text
-                    }));
-                    setMessages(uiMessages);
-                }
-            } catch (e) {
-                console.error("Failed to load history", e);
+    // History is paged newest-first; a cursor loads the page of older turns
+    const fetchHistory = async (cursor = null) => {
+        const token = localStorage.getItem('token');
+        if (!token) return;
+        try {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/chat/history${query}`, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            if (res.ok) {
+                const history = await res.json();
+                // Convert DB history to UI messages
+                const uiMessages = history.items.map(h => ({
+                    sender: h.sender,
+                    text: h.text
+                }));
+                setMessages(prev => cursor ? [...uiMessages, ...prev] : uiMessages);
+                setOlderCursor(history.next_cursor);
             }
-        };
+        } catch (e) {
+            console.error("Failed to load history", e);
+        }
+    };
+
+    useEffect(() => {
         fetchHistory();
     }, []);
 
@@ -43,10 +48,8 @@ function MeetingAgentChat({ isWidget, onClose }) {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${token}`
                 },
-                body: JSON.stringify({
-                    message: input,
-                    conversation_history: messages
-                }),
+                // Context lives server-side; only the new message is sent
+                body: JSON.stringify({ message: input }),
             });
             const data = await response.json();
             setMessages([...newMessages, { sender: 'agent', text: data.response }]);
@@ -73,6 +76,7 @@ function MeetingAgentChat({ isWidget, onClose }) {
                                     headers: { 'Authorization': `Bearer ${token}` }
                                 });
                                 setMessages([]);
+                                setOlderCursor(null);
                             }
                         }}
                         className="text-white/50 hover:text-white hover:bg-white/10 p-2 rounded-lg transition-colors"
@@ -92,6 +96,16 @@ function MeetingAgentChat({ isWidget, onClose }) {
             </div>
 
             <div className="flex-1 overflow-y-auto p-4 space-y-4">
+                {olderCursor && (
+                    <div className="text-center">
+                        <button
+                            onClick={() => fetchHistory(olderCursor)}
+                            className="text-xs text-gray-400 hover:text-white bg-white/5 hover:bg-white/10 px-3 py-1 rounded-full border border-white/10 transition-colors"
+                        >
+                            Load earlier messages
+                        </button>
+                    </div>
+                )}
                 {messages.length === 0 && (
                     <div className="text-center text-gray-500 mt-20">
                         <p>I have read your recent emails. Ask me anything!</p>
@@ -22,18 +22,41 @@ const ComposeModal = ({ isOpen, onClose, initialData = {} }) => {
         setRewriting(true);
         const toastId = toast.loading('Rewriting...');
         try {
-            const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/agent/rewrite`, {
+            const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/agent/rewrite/stream`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ text: body, style })
             });
-            if (res.ok) {
-                const data = await res.json();
-                setBody(data.result);
-                toast.success('Rewrite complete!', { id: toastId });
-            } else {
+            if (!res.ok || !res.body) {
                 toast.error("Rewrite failed.", { id: toastId });
+                return;
+            }
+
+            // Read Server-Sent Events: show tokens as they arrive, then the final text on 'done'
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let streamed = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const raw of events) {
+                    const event = raw.match(/^event: (.*)$/m)?.[1];
+                    const data = raw.match(/^data: (.*)$/m)?.[1];
+                    if (!data) continue;
+                    const payload = JSON.parse(data);
+                    if (event === 'token') {
+                        streamed += payload.text;
+                        setBody(streamed);
+                    } else if (event === 'done') {
+                        setBody(payload.result);
+                    }
+                }
             }
+            toast.success('Rewrite complete!', { id: toastId });
         } catch (e) {
             console.error(e);
             toast.error("Error rewriting.", { id: toastId });
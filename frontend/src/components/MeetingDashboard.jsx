@@ -1,12 +1,13 @@
 import React, { useEffect, useState } from 'react';
 
-const MeetingDashboard = () => {
+// refreshKey changes whenever the server pushes a meetings.changed event
+const MeetingDashboard = ({ refreshKey = 0 }) => {
     const [meetings, setMeetings] = useState([]);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
         fetchMeetings();
-    }, []);
+    }, [refreshKey]);
 
     const fetchMeetings = async () => {
         try {
@@ -25,8 +26,12 @@ const MeetingDashboard = () => {
         }
     };
 
-    const deleteMeeting = async (id) => {
-        if (!confirm("Are you sure you want to cancel this meeting?")) return;
+    const deleteMeeting = async (meeting) => {
+        const prompt = meeting.recurrence_rule
+            ? "This is a recurring meeting. Cancel the whole series?"
+            : "Are you sure you want to cancel this meeting?";
+        if (!confirm(prompt)) return;
+        const id = meeting.id;
         try {
             const token = localStorage.getItem('token');
             const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/meetings/${id}`, {
@@ -44,8 +49,12 @@ const MeetingDashboard = () => {
     };
 
     const now = new Date();
-    const upcoming = meetings.filter(m => new Date(m.end_time) >= now);
-    const past = meetings.filter(m => new Date(m.end_time) < now);
+    // A recurring series stays upcoming until its last occurrence has passed
+    const isUpcoming = m => m.recurrence_rule
+        ? !m.recurrence_end || new Date(m.recurrence_end) >= now
+        : new Date(m.end_time) >= now;
+    const upcoming = meetings.filter(isUpcoming);
+    const past = meetings.filter(m => !isUpcoming(m));
 
     const renderMeetingGroup = (list, title, isPast = false) => {
         if (list.length === 0) return null;
@@ -86,9 +95,12 @@ const MeetingDashboard = () => {
                                             <div>
                                                 <div className="flex items-center gap-2">
                                                     <h4 className="font-bold text-lg text-white">{meeting.title}</h4>
+                                                    {meeting.recurrence_rule && (
+                                                        <span className="text-xs text-blue-300" title={meeting.recurrence_rule}>🔁 Repeats</span>
+                                                    )}
                                                     {!isPast && (
                                                         <button
-                                                            onClick={() => deleteMeeting(meeting.id)}
+                                                            onClick={() => deleteMeeting(meeting)}
                                                             className="text-gray-500 hover:text-red-500 transition-colors"
                                                             title="Cancel Meeting"
                                                         >
@@ -0,0 +1,73 @@
+import { useEffect, useRef, useState } from 'react'
+
+// Subscribes to /api/events and calls onEvent(event, payload) for every pushed event.
+// Uses fetch rather than EventSource so the bearer token can be sent as a header.
+// Reconnects with exponential backoff; returns whether the stream is currently open.
+export default function useEventStream(enabled, onEvent) {
+  const [connected, setConnected] = useState(false)
+  const handlerRef = useRef(onEvent)
+  handlerRef.current = onEvent
+
+  useEffect(() => {
+    if (!enabled) return;
+    const controller = new AbortController();
+    let retryDelay = 1000;
+    let retryTimer = null;
+    let everConnected = false;
+
+    const connect = async () => {
+      const token = localStorage.getItem('token');
+      if (!token) return;
+
+      try {
+        const res = await fetch(`${import.meta.env.VITE_API_URL || 'https://aiagent-cygyd5eaejbbegcg.japanwest-01.azurewebsites.net'}/api/events`, {
+          headers: { 'Authorization': `Bearer ${token}` },
+          signal: controller.signal
+        });
+        if (res.status === 401) return; // Session expired: the next login remounts the hook
+        if (!res.ok || !res.body) throw new Error(`Event stream failed: ${res.status}`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const events = buffer.split('\n\n');
+          buffer = events.pop();
+          for (const raw of events) {
+            const event = raw.match(/^event: (.*)$/m)?.[1];
+            const data = raw.match(/^data: (.*)$/m)?.[1];
+            if (!event || !data) continue; // Heartbeat comments carry neither
+            if (event === 'ready') {
+              setConnected(true);
+              retryDelay = 1000;
+              // Anything published while we were disconnected is lost
+              if (everConnected) handlerRef.current('resync', {});
+              everConnected = true;
+            }
+            handlerRef.current(event, JSON.parse(data));
+          }
+        }
+      } catch (e) {
+        if (controller.signal.aborted) return;
+        console.error(e);
+      }
+
+      setConnected(false);
+      if (controller.signal.aborted) return;
+      retryTimer = setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+
+    connect();
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+      setConnected(false);
+    };
+  }, [enabled]);
+
+  return connected;
+}